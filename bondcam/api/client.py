@@ -1,37 +1,133 @@
-"""API client for backend communication."""
+"""API client for backend communication.
 
-import requests
+Requests go through one pooled keep-alive session. The ``*_async`` functions
+run them on a small worker pool and post the result back to the GLib main loop,
+so a slow or unreachable backend never blocks GStreamer bus handling.
+
+SettingsStream optionally receives device updates pushed as server-sent
+events, so settings changes apply without waiting for the next poll.
+"""
+
+import json
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from gi.repository import GLib
 from bondcam.config.settings import (
     get_global_settings_api,
-    get_device_by_serial_api
+    get_device_by_serial_api,
+    get_settings_stream_api
 )
+from bondcam.utils.backoff import Backoff
 from bondcam.utils.logger import get_logger
 
 logger = get_logger()
 
+# Attempts of a background request before giving up until its next call
+MAX_RETRIES = 5
+
+# Worker threads running background requests
+MAX_WORKERS = 2
+
+_session = None
+_session_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='api')
+
+# HTTP traffic since startup, headers included (TCP/TLS overhead is not counted)
+_traffic = {'requests': 0, 'bytes_sent': 0, 'bytes_received': 0, 'since': time.time()}
+_traffic_lock = threading.Lock()
+
+# Coalesced requests: key -> {'data': merged payload or None, 'callbacks': [...]}
+_in_flight = {}
+_pending = {}
+_coalesce_lock = threading.Lock()
+
+
+def get_session():
+    """Get the shared keep-alive session, creating it on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=MAX_WORKERS)
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+        return _session
+
+
+def header_size(headers):
+    """Approximate size of HTTP headers on the wire."""
+    return sum(len(str(name)) + len(str(value)) + 4 for name, value in headers.items())
+
+
+def send(method, url, **kwargs):
+    """Send one request through the shared session and count its traffic.
+
+    Returns:
+        requests Response
+    """
+    response = get_session().request(method, url, timeout=10, **kwargs)
+    request = response.request
+    body = request.body or b''
+    with _traffic_lock:
+        _traffic['requests'] += 1
+        _traffic['bytes_sent'] += len(request.method) + len(request.url) + header_size(request.headers) + len(body)
+        _traffic['bytes_received'] += header_size(response.headers) + len(response.content)
+    return response
+
+
+def get_traffic_stats():
+    """Get the request and byte counters, with their average per day.
+
+    Returns:
+        Dictionary with requests, bytes_sent, bytes_received and the same per day
+    """
+    with _traffic_lock:
+        stats = dict(_traffic)
+    days = max(time.time() - stats.pop('since'), 1) / 86400
+    for key in ('requests', 'bytes_sent', 'bytes_received'):
+        stats[f'{key}_per_day'] = round(stats[key] / days)
+    return stats
+
+
 # Global Wrapper to handle retries, timeouts, and error handling
-def api_request(method, url, delay=5, data=None):
-    """General API request handler with infinite retries until connection is restored."""
+def api_request(method, url, delay=5, data=None, retries=MAX_RETRIES):
+    """General API request handler with retries and exponential backoff.
+
+    Blocks the calling thread, use api_request_async() from the main loop.
+
+    Args:
+        method: 'GET' or 'PUT'
+        url: Request URL
+        delay: Longest delay between retries, in seconds
+        data: JSON body of PUT requests
+        retries: Most attempts, None to retry until the connection is restored
+
+    Returns:
+        Decoded JSON response, or None if every attempt failed
+    """
     had_error = False
     attempt = 1
-    
+    backoff = Backoff(initial=1, maximum=delay)
+
     while True:
         try:
             if method.upper() == "GET":
-                response = requests.get(url, timeout=10)
+                response = send("GET", url)
             elif method.upper() == "PUT":
-                response = requests.put(url, json=data, timeout=10)
+                response = send("PUT", url, json=data)
             else:
                 raise ValueError(f"Unsupported HTTP method: {method}")
 
             # Check for successful response
             response.raise_for_status()
-            
+
             # Print restoration message if previous attempt failed
             if had_error:
                 logger.info("Connection restored successfully")
-                
+
             return response.json()
         except requests.exceptions.RequestException as e:
             had_error = True
@@ -41,24 +137,255 @@ def api_request(method, url, delay=5, data=None):
         except Exception as e:
             logger.error(f"Unexpected error: {e}")
 
-        logger.info(f"Retrying in {delay} seconds...")
-        time.sleep(delay)
+        if retries is not None and attempt >= retries:
+            logger.error(f"Giving up on {method} {url} after {attempt} attempts")
+            return None
+
+        wait = backoff.next_delay()
+        logger.info(f"Retrying in {wait:.1f} seconds...")
+        time.sleep(wait)
         attempt += 1
 
+
+def api_request_async(method, url, callback=None, data=None, key=None):
+    """Run api_request on a worker thread and pass the result to callback on the main loop.
+
+    Requests sharing a key are coalesced: while one is in flight, later calls
+    are merged into a single follow-up request (PUT payloads are merged, later
+    values win) and every callback receives the result of the request that
+    carried its data.
+
+    Args:
+        method: 'GET' or 'PUT'
+        url: Request URL
+        callback: Called with the decoded response, or None on failure
+        data: JSON body of PUT requests
+        key: Coalescing key, defaults to method and URL
+    """
+    key = key or (method.upper(), url)
+    with _coalesce_lock:
+        if key in _in_flight:
+            pending = _pending.setdefault(key, {'data': None, 'callbacks': []})
+            if data is not None:
+                pending['data'] = {**(pending['data'] or {}), **data}
+            if callback:
+                pending['callbacks'].append(callback)
+            return
+        _in_flight[key] = [callback] if callback else []
+    _executor.submit(_run_request, method, url, data, key)
+
+
+def run_async(function, callback, *args):
+    """Run a blocking function on a worker thread and pass its result to callback on the main loop."""
+    def run():
+        try:
+            result = function(*args)
+        except Exception as e:
+            logger.error(f"Error in background request: {e}")
+            result = None
+        GLib.idle_add(_call_once, callback, result)
+
+    _executor.submit(run)
+
+
+def _run_request(method, url, data, key):
+    result = api_request(method, url, data=data)
+    with _coalesce_lock:
+        callbacks = _in_flight.pop(key)
+        pending = _pending.pop(key, None)
+        if pending:
+            # Send what piled up meanwhile as one request
+            _in_flight[key] = pending['callbacks']
+            _executor.submit(_run_request, method, url, pending['data'], key)
+    for callback in callbacks:
+        GLib.idle_add(_call_once, callback, result)
+
+
+def _call_once(callback, result):
+    # GLib repeats idle callbacks that return True
+    try:
+        callback(result)
+    except Exception as e:
+        logger.error(f"Error in API callback: {e}")
+    return False
+
+
 # Function to get global settings
 def get_global_settings():
-    """Fetch global settings using the api_request wrapper."""
-    return api_request("GET", get_global_settings_api())
+    """Fetch global settings using the api_request wrapper, retrying until the backend answers."""
+    return api_request("GET", get_global_settings_api(), retries=None)
+
+
+def device_url(serial):
+    """Get the device endpoint for a serial number."""
+    return get_device_by_serial_api() + f"/{serial}"
+
 
 # Function to update device details
 def update_device(serial, data):
     """Update device details using the api_request wrapper."""
-    url = get_device_by_serial_api() + f"/{serial}"
-    response = api_request("PUT", url, data=data)
-    
+    response = api_request("PUT", device_url(serial), data=data)
+
     if response:
         return response.get('data')
     else:
         logger.error("Failed to update device.")
         return None
 
+
+def fetch_device(serial, etag=None):
+    """Fetch the device, unless it did not change since the response tagged etag.
+
+    A single attempt: the next heartbeat is the retry.
+
+    Returns:
+        (device, etag) with device None when it did not change or the request failed
+    """
+    headers = {'If-None-Match': etag} if etag else {}
+    try:
+        response = send("GET", device_url(serial), headers=headers)
+        if response.status_code == 304:
+            return None, etag
+        response.raise_for_status()
+        return response.json().get('data'), response.headers.get('ETag')
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Request error fetching device: {e}")
+    except ValueError as e:
+        logger.error(f"Error parsing response JSON: {e}")
+    return None, etag
+
+
+def fetch_device_async(serial, etag, callback):
+    """Run fetch_device on a worker thread, callback receives (device, etag) on the main loop."""
+    run_async(lambda: fetch_device(serial, etag), lambda result: callback(*(result or (None, etag))))
+
+
+def update_device_async(serial, data, callback=None):
+    """Update device details from a worker thread, coalescing overlapping updates.
+
+    Args:
+        serial: Device serial number
+        data: Fields to update
+        callback: Called on the main loop with the updated device, or None on failure
+    """
+    def on_response(response):
+        if not response:
+            logger.error("Failed to update device.")
+        if callback:
+            callback(response.get('data') if response else None)
+
+    api_request_async("PUT", device_url(serial), on_response, data=data)
+
+
+class SettingsStream:
+    """Background server-sent events connection receiving device updates.
+
+    Each event's data is the device, as JSON (optionally wrapped in 'data' like
+    the REST responses). Events are handed to on_device on the main loop. The
+    connection is retried with backoff, and on_state tells the main loop when
+    it goes up or down so callers can poll meanwhile.
+    """
+
+    def __init__(self, serial, on_device, on_state=None, url=None):
+        """Initialize SettingsStream.
+
+        Args:
+            serial: Device serial number
+            on_device: Called on the main loop with each pushed device
+            on_state: Called on the main loop with True/False when the stream connects or drops
+            url: Stream base URL, defaults to SETTINGS_STREAM_API
+        """
+        self.url = f"{url or get_settings_stream_api()}/{serial}"
+        self.on_device = on_device
+        self.on_state = on_state
+        self.connected = False
+        self.last_event_id = None
+        self.events = 0
+        self.reconnects = 0
+        self.backoff = Backoff(initial=1, maximum=60)
+        self.stopped = threading.Event()
+        self.response = None
+        self.thread = None
+
+    def start(self):
+        """Connect in the background."""
+        self.thread = threading.Thread(target=self._run, name='settings-stream', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Close the connection and stop reconnecting."""
+        self.stopped.set()
+        if self.response is not None:
+            self.response.close()
+
+    def _set_connected(self, connected):
+        if connected != self.connected:
+            self.connected = connected
+            if self.on_state:
+                GLib.idle_add(_call_once, self.on_state, connected)
+
+    def _run(self):
+        # Its own session: the stream holds its connection for good
+        session = requests.Session()
+        while not self.stopped.is_set():
+            headers = {'Accept': 'text/event-stream'}
+            if self.last_event_id:
+                headers['Last-Event-ID'] = self.last_event_id
+            try:
+                # The read timeout bounds how long a silent dead connection goes unnoticed;
+                # servers are expected to send comments as keep-alives more often than that
+                self.response = session.get(self.url, headers=headers, stream=True, timeout=(10, 90))
+                self.response.raise_for_status()
+                logger.info(f"Settings stream connected to {self.url}")
+                self._set_connected(True)
+                self.backoff.reset()
+                self._read_events(self.response)
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Settings stream error: {e}")
+            finally:
+                self.response = None
+            self._set_connected(False)
+            if self.stopped.is_set():
+                return
+            self.reconnects += 1
+            delay = self.backoff.next_delay()
+            logger.info(f"Settings stream reconnecting in {delay:.1f} seconds, polling meanwhile")
+            self.stopped.wait(delay)
+
+    def _read_events(self, response):
+        data = []
+        # Read byte by byte: with larger chunks a small event waits for the bytes of the next ones
+        for line in response.iter_lines(chunk_size=1, decode_unicode=True):
+            if self.stopped.is_set():
+                return
+            with _traffic_lock:
+                _traffic['bytes_received'] += len(line) + 1
+            if line == '':
+                # A blank line ends the event
+                if data:
+                    self._dispatch('\n'.join(data))
+                data = []
+            elif line.startswith(':'):
+                continue  # Keep-alive comment
+            else:
+                field, _, value = line.partition(':')
+                value = value[1:] if value.startswith(' ') else value
+                if field == 'data':
+                    data.append(value)
+                elif field == 'id':
+                    self.last_event_id = value
+
+    def _dispatch(self, payload):
+        try:
+            message = json.loads(payload)
+        except ValueError as e:
+            logger.error(f"Invalid settings event: {e}")
+            return
+        self.events += 1
+        device = message.get('data', message) if isinstance(message, dict) else None
+        if device:
+            GLib.idle_add(_call_once, self.on_device, device)
+
+    def stats(self):
+        """Get the connection state and event counters."""
+        return {'connected': self.connected, 'events': self.events, 'reconnects': self.reconnects}
@@ -0,0 +1 @@
+"""Pipeline benchmarks that run without cameras or the Rockchip encoder."""
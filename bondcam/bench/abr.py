@@ -0,0 +1,168 @@
+"""Adaptive bitrate decisions over a bandwidth-shaped uplink.
+
+Streams through a local throttling TCP proxy to a stand-in RTMP server
+(ffmpeg in listen mode by default). The proxy follows a bandwidth schedule,
+e.g. a drop from 4 Mbps to 1 Mbps and back, and the benchmark records every
+bitrate decision of the ABR controller along with the output queue level.
+
+Usage:
+    python -m bondcam.bench.abr --schedule 4000:15,1000:30,3000:30
+"""
+
+import gi
+gi.require_version('Gst', '1.0')
+
+import argparse
+import copy
+import json
+import socket
+import sys
+import threading
+import time
+from gi.repository import GLib, Gst
+from bondcam.bench.reconnect import DEFAULT_SERVER_CMD, StandInServer
+from bondcam.streaming.manager import StreamManager
+
+SERVER_PORT = 1937
+
+# Size of the reads forwarded by the proxy
+CHUNK_SIZE = 4096
+
+
+class ThrottlingProxy:
+    """TCP proxy limiting the client -> server direction to a changeable rate."""
+
+    def __init__(self, upstream_port):
+        self.upstream_port = upstream_port
+        self.rate_kbps = None
+        self.listener = socket.create_server(('127.0.0.1', 0))
+        self.port = self.listener.getsockname()[1]
+
+    def start(self):
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            client, _ = self.listener.accept()
+            try:
+                server = socket.create_connection(('127.0.0.1', self.upstream_port))
+            except OSError:
+                client.close()
+                continue
+            threading.Thread(target=self._pipe, args=(client, server, True), daemon=True).start()
+            threading.Thread(target=self._pipe, args=(server, client, False), daemon=True).start()
+
+    def _pipe(self, source, destination, throttled):
+        # Pace the upload to the current rate, like a shaped uplink
+        sent = 0
+        started = time.monotonic()
+        rate = self.rate_kbps
+        try:
+            while True:
+                data = source.recv(CHUNK_SIZE)
+                if not data:
+                    break
+                if throttled:
+                    if rate != self.rate_kbps:
+                        rate, sent, started = self.rate_kbps, 0, time.monotonic()
+                    sent += len(data)
+                    ahead = sent * 8 / (rate * 1000) - (time.monotonic() - started)
+                    if ahead > 0:
+                        time.sleep(ahead)
+                destination.sendall(data)
+        except OSError:
+            pass
+        finally:
+            source.close()
+            destination.close()
+
+
+class AbrStreamManager(StreamManager):
+    """StreamManager recording the output queue level at every ABR sample."""
+
+    def __init__(self, get_stream_settings, element_profile):
+        self.levels = []
+        super().__init__('Bench', get_stream_settings, element_profile)
+
+    def check_bitrates(self):
+        if self.pipeline and self.output_bins and self.output_bins[0]:
+            queue = self.output_bins[0].get_by_name('videoqueue1')
+            self.levels.append((time.time(), round(queue.get_property('current-level-time') / Gst.SECOND, 3)))
+        return super().check_bitrates()
+
+    def is_network_available(self):
+        # The stand-in server is local
+        return True
+
+
+def parse_schedule(text):
+    """Parse 'kbps:seconds,...' into a list of (kbps, seconds)."""
+    return [tuple(int(value) for value in step.split(':')) for step in text.split(',')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server-cmd', default=DEFAULT_SERVER_CMD, help='stand-in server command, {port} is substituted')
+    parser.add_argument('--profile', default='software', help='element profile')
+    parser.add_argument('--schedule', default='4000:15,1000:30,3000:30', help='uplink Kbps:seconds steps')
+    parser.add_argument('--bitrate', type=int, default=3000, help='channel bitrate (ABR ceiling), in Kbps')
+    parser.add_argument('--min-bitrate', type=int, default=300, help='ABR floor, in Kbps')
+    args = parser.parse_args(argv)
+
+    schedule = parse_schedule(args.schedule)
+    server = StandInServer(args.server_cmd, SERVER_PORT)
+    server.start()
+    proxy = ThrottlingProxy(SERVER_PORT)
+    proxy.rate_kbps = schedule[0][0]
+    proxy.start()
+    time.sleep(1)
+
+    settings = {
+        'isEnabled': True,
+        'videoStreams': [{
+            'camera': None,
+            'channel': {
+                'bitrate': args.bitrate,
+                'resolution': {'width': 1280, 'height': 720},
+                'frameRate': 30,
+                'streamEndpoint': f'rtmp://127.0.0.1:{proxy.port}/live/bench',
+                'abr': {'enabled': True, 'minBitrate': args.min_bitrate},
+            },
+        }],
+        'audioDevice': None,
+    }
+    manager = AbrStreamManager(lambda: copy.deepcopy(settings), args.profile)
+    loop = GLib.MainLoop()
+    GLib.timeout_add_seconds(1, server.keep_alive)
+
+    rate_changes = [(time.time(), schedule[0][0])]
+    elapsed = schedule[0][1]
+    for kbps, seconds in schedule[1:]:
+        def set_rate(kbps=kbps):
+            proxy.rate_kbps = kbps
+            rate_changes.append((time.time(), kbps))
+            return False
+        GLib.timeout_add_seconds(elapsed, set_rate)
+        elapsed += seconds
+    GLib.timeout_add_seconds(elapsed, loop.quit)
+    loop.run()
+
+    stats = manager.get_bitrate_stats().get(1, {})
+    if manager.pipeline:
+        manager.pipeline.set_state(Gst.State.NULL)
+    server.stop()
+
+    print(json.dumps({
+        'uplink_kbps': rate_changes,
+        'decisions': [(t, bitrate // 1000, reason) for t, bitrate, reason in stats.get('history', [])],
+        'queue_level_s': manager.levels,
+        'output': manager.output_states[0] and {
+            'reconnects': manager.output_states[0]['reconnects'],
+            'frames_lost': manager.output_states[0]['frames_lost'],
+        },
+    }, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""GStreamer bus latency while the backend is slow.
+
+Starts a local HTTP stand-in for the device endpoint that answers after a
+configurable delay, sends device updates from the main loop as the periodic
+tasks do, and meanwhile posts application messages on a pipeline bus from
+another thread. Reports how long the messages waited before the main loop
+handled them. With --blocking the updates use the synchronous client, which
+shows the main loop stalling for the whole response delay.
+
+Usage:
+    python -m bondcam.bench.api --delay 2
+"""
+
+import gi
+gi.require_version('Gst', '1.0')
+
+import argparse
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from gi.repository import GLib, Gst
+from bondcam.api import client
+
+MESSAGE_INTERVAL = 0.02
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    """Answers every PUT with the device, after the server's delay."""
+
+    def do_PUT(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(self.server.delay)
+        self.server.requests += 1
+        body = json.dumps({'data': {'serial': 'bench'}}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def percentile(values, fraction):
+    """Get a percentile of a list of values, in ms."""
+    if not values:
+        return None
+    values = sorted(values)
+    return round(1000 * values[min(len(values) - 1, int(fraction * len(values)))], 1)
+
+
+def measure_bus_latency(delay, duration, interval=1.0, blocking=False):
+    """Send device updates to a stand-in answering after delay while timing bus messages.
+
+    Args:
+        delay: Backend response delay, in seconds
+        duration: Length of the run, in seconds
+        interval: Seconds between device updates
+        blocking: Use the synchronous client
+
+    Returns:
+        Dictionary with the updates sent, the requests served and the bus latency percentiles
+    """
+    Gst.init(None)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SlowHandler)
+    server.delay = delay
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/devices/serial'
+    device_api = client.get_device_by_serial_api
+    client.get_device_by_serial_api = lambda: url
+
+    pipeline = Gst.Pipeline.new('bench')
+    bus = pipeline.get_bus()
+    bus.add_signal_watch()
+    latencies = []
+
+    def on_message(bus, message):
+        if message.type == Gst.MessageType.APPLICATION:
+            latencies.append(time.monotonic() - message.get_structure().get_value('sent'))
+
+    handler = bus.connect('message', on_message)
+
+    stop = threading.Event()
+
+    def post_messages():
+        while not stop.is_set():
+            structure = Gst.Structure.new_empty('bench')
+            structure.set_value('sent', time.monotonic())
+            bus.post(Gst.Message.new_application(pipeline, structure))
+            time.sleep(MESSAGE_INTERVAL)
+
+    updates = 0
+
+    def send_update():
+        nonlocal updates
+        updates += 1
+        data = {'lastOnlineAt': time.time()}
+        if blocking:
+            client.update_device('bench', data)
+        else:
+            client.update_device_async('bench', data)
+        return True
+
+    loop = GLib.MainLoop()
+    update_source = GLib.timeout_add(int(interval * 1000), send_update)
+    GLib.timeout_add(int(duration * 1000), loop.quit)
+    poster = threading.Thread(target=post_messages, daemon=True)
+    poster.start()
+    try:
+        loop.run()
+    finally:
+        stop.set()
+        poster.join()
+        GLib.source_remove(update_source)
+        bus.disconnect(handler)
+        bus.remove_signal_watch()
+        server.shutdown()
+        client.get_device_by_serial_api = device_api
+
+    return {
+        'client': 'blocking' if blocking else 'async',
+        'backend_delay_s': delay,
+        'updates': updates,
+        'backend_requests': server.requests,
+        'bus_latency_ms': {
+            'p50': percentile(latencies, 0.5),
+            'p99': percentile(latencies, 0.99),
+            'max': percentile(latencies, 1.0),
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--delay', type=float, default=2.0, help='backend response delay, in seconds')
+    parser.add_argument('--duration', type=float, default=10.0, help='length of the run, in seconds')
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between device updates')
+    parser.add_argument('--blocking', action='store_true', help='use the synchronous client')
+    args = parser.parse_args(argv)
+
+    result = measure_bus_latency(args.delay, args.duration, args.interval, args.blocking)
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
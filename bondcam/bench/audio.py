@@ -0,0 +1,64 @@
+"""Cost of listing the audio capture devices.
+
+Times the old ``arecord -l | grep card`` subprocess against the procfs reader,
+and prints what the reader finds. Captured /proc/asound trees under
+bench/fixtures/asound can stand in for the real one on machines without the
+audio hardware.
+
+Usage:
+    python -m bondcam.bench.audio
+    python -m bondcam.bench.audio --fixture orangepi5b-usb-mic
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from bondcam.devices.audio import ASOUND_ROOT, get_audio_devices
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures', 'asound')
+
+
+def arecord_devices():
+    # The listing as it was before the procfs reader
+    result = subprocess.run(["bash", "-c", "arecord -l | grep card"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    devices = []
+    for d in result.stdout.decode('utf-8').split('\n'):
+        if len(d) > 0:
+            devices.append({
+                'name': d.split(':')[1].strip().split(' ')[0],
+                'path': f"hw:{d.split(':')[0].split(' ')[-1]},0",
+            })
+    return devices
+
+
+def time_calls(function, calls):
+    """Average time of one call, in milliseconds."""
+    started = time.perf_counter()
+    for _ in range(calls):
+        function()
+    return round(1000 * (time.perf_counter() - started) / calls, 3)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fixture', help=f'captured tree in {FIXTURES_DIR} to read instead of {ASOUND_ROOT}')
+    parser.add_argument('--calls', type=int, default=50)
+    args = parser.parse_args(argv)
+
+    root = os.path.join(FIXTURES_DIR, args.fixture) if args.fixture else ASOUND_ROOT
+    print(json.dumps({
+        'root': root,
+        'per_call_ms': {
+            'arecord': time_calls(arecord_devices, args.calls),
+            'procfs': time_calls(lambda: get_audio_devices(root), args.calls),
+        },
+        'devices': get_audio_devices(root),
+    }, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""CPU cost of the audio graph for 1, 2 and 4 streams.
+
+Runs the audio part of the pipeline alone, with live audiotestsrc inputs
+standing in for the ALSA devices and fakesinks for the muxers, and reports
+the process CPU% of each layout:
+
+- legacy-silence: silent PCM resampled and AAC-encoded (the old fallback)
+- silence-frames: precomputed AAC silence frames
+- shared-source: one encode teed to every stream
+- per-stream-source: one encode per stream, each with its own source
+
+Usage:
+    python -m bondcam.bench.audio_graph --duration 10
+"""
+
+import gi
+gi.require_version('Gst', '1.0')
+
+import argparse
+import json
+import sys
+import time
+from gi.repository import GLib, Gst
+from bondcam.streaming.audio import AAC_CAPS, SILENCE, make_audio_source, source_description
+
+LEGACY_SILENCE = f'audiotestsrc is-live=1 wave=silence ! audioresample ! audio/x-raw,rate=48000 ! voaacenc bitrate=96000 ! aacparse ! {AAC_CAPS}'
+
+
+def test_source(description):
+    # Live test tones instead of the ALSA devices
+    return description.replace('alsasrc device=', 'audiotestsrc is-live=true wave=sine name=')
+
+
+def add_branch(pipeline, source_bin, num_sinks):
+    """Add a source teed to num_sinks fakesinks."""
+    tee = Gst.ElementFactory.make('tee')
+    pipeline.add(source_bin)
+    pipeline.add(tee)
+    source_bin.link(tee)
+    for _ in range(num_sinks):
+        sink = Gst.parse_bin_from_description('queue ! fakesink sync=false', True)
+        pipeline.add(sink)
+        tee.link(sink)
+
+
+def build(layout, num_streams):
+    pipeline = Gst.Pipeline.new(layout)
+    if layout == 'legacy-silence':
+        add_branch(pipeline, Gst.parse_bin_from_description(LEGACY_SILENCE, True), num_streams)
+    elif layout == 'silence-frames':
+        source_bin, silence = make_audio_source(SILENCE)
+        pipeline.silence = silence  # Keep the need-data handler alive
+        add_branch(pipeline, source_bin, num_streams)
+    elif layout == 'shared-source':
+        description = test_source(source_description(('mic1',), 96000))
+        add_branch(pipeline, Gst.parse_bin_from_description(description, True), num_streams)
+    else:
+        for idx in range(num_streams):
+            description = test_source(source_description((f'mic{idx + 1}',), 96000))
+            add_branch(pipeline, Gst.parse_bin_from_description(description, True), 1)
+    return pipeline
+
+
+def measure(layout, num_streams, duration):
+    pipeline = build(layout, num_streams)
+    loop = GLib.MainLoop()
+    pipeline.set_state(Gst.State.PLAYING)
+    GLib.timeout_add(int(duration * 1000), loop.quit)
+    wall_start = time.monotonic()
+    cpu_start = time.process_time()
+    loop.run()
+    cpu = time.process_time() - cpu_start
+    wall = time.monotonic() - wall_start
+    pipeline.set_state(Gst.State.NULL)
+    return round(100 * cpu / wall, 2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per measurement')
+    args = parser.parse_args(argv)
+
+    Gst.init(None)
+    results = {}
+    for layout in ('legacy-silence', 'silence-frames', 'shared-source', 'per-stream-source'):
+        results[layout] = {str(n): measure(layout, n, args.duration) for n in (1, 2, 4)}
+    print(json.dumps({'cpu_percent': results}, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""Goodput of one SRT stream bonded over two shaped links, against one link alone.
+
+Sets up, as root, a receiver network namespace joined to this one by two veth
+pairs, each shaped by tc netem like an uplink:
+
+    bondcam-a0 10.77.1.1 <-> bondcam-a1 10.77.1.2   --link-a, e.g. 'delay 20ms rate 3mbit'
+    bondcam-b0 10.77.2.1 <-> bondcam-b1 10.77.2.2   --link-b, e.g. 'delay 60ms rate 2mbit loss 1%'
+
+The namespace answers on 10.77.0.1 through either pair. There a BondReceiver
+hands the stream to a GStreamer SRT listener counting what it delivers.
+StreamManager streams a test pattern bonded over both links, then over link A
+alone, each run in a process of its own. The report gives per run the goodput
+next to the encoder bitrate, the SRT sink's counters and the bonder's
+measurements of each link.
+
+Usage:
+    sudo python -m bondcam.bench.bonding --bitrate 4000
+    sudo python -m bondcam.bench.bonding --link-a 'delay 30ms rate 5mbit' --link-b 'delay 80ms rate 3mbit loss 2%'
+"""
+
+import gi
+gi.require_version('Gst', '1.0')
+
+import argparse
+import copy
+import json
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from gi.repository import GLib, Gst
+from bondcam.network.bonding import BondReceiver
+from bondcam.streaming.manager import StreamManager
+from bondcam.streaming.transport import sink_stats
+
+NAMESPACE = 'bondcam-rx'
+
+# Local end, namespace end and shaping option of each link
+LINKS = {
+    'a': ('bondcam-a0', '10.77.1.1', 'bondcam-a1', '10.77.1.2'),
+    'b': ('bondcam-b0', '10.77.2.1', 'bondcam-b1', '10.77.2.2'),
+}
+
+RECEIVER_ADDRESS = '10.77.0.1'
+BOND_PORT = 9001
+SRT_PORT = 9000
+
+# Seconds each run streams before goodput is measured, connection setup excluded
+WARMUP = 4
+
+
+def run(command):
+    subprocess.run(shlex.split(command), check=True)
+
+
+def setup(args):
+    teardown()
+    run(f'ip netns add {NAMESPACE}')
+    run(f'ip netns exec {NAMESPACE} ip link set lo up')
+    run(f'ip netns exec {NAMESPACE} ip addr add {RECEIVER_ADDRESS}/32 dev lo')
+    for name, shaping in (('a', args.link_a), ('b', args.link_b)):
+        local, local_address, remote, remote_address = LINKS[name]
+        run(f'ip link add {local} type veth peer name {remote}')
+        run(f'ip link set {remote} netns {NAMESPACE}')
+        run(f'ip addr add {local_address}/30 dev {local}')
+        run(f'ip link set {local} up')
+        run(f'ip netns exec {NAMESPACE} ip addr add {remote_address}/30 dev {remote}')
+        run(f'ip netns exec {NAMESPACE} ip link set {remote} up')
+        # Sockets bound to either interface reach the receiver through it
+        run(f"ip route add {RECEIVER_ADDRESS}/32 dev {local} metric {1 if name == 'a' else 10}")
+        run(f'tc qdisc add dev {local} root netem {shaping}')
+        run(f'ip netns exec {NAMESPACE} tc qdisc add dev {remote} root netem {shaping}')
+
+
+def teardown():
+    subprocess.run(['ip', 'netns', 'del', NAMESPACE], stderr=subprocess.DEVNULL)
+    for local, local_address, remote, remote_address in LINKS.values():
+        subprocess.run(['ip', 'link', 'del', local], stderr=subprocess.DEVNULL)
+
+
+def receive(args):
+    """Namespace side: reassemble and count the SRT stream, one cumulative byte count per second."""
+    Gst.init(None)
+    receiver = BondReceiver(('0.0.0.0', BOND_PORT), ('127.0.0.1', SRT_PORT))
+    threading.Thread(target=receiver.serve_forever, daemon=True).start()
+    pipeline = Gst.parse_launch(f"srtsrc uri=srt://127.0.0.1:{SRT_PORT}?mode=listener latency={args.latency} "
+                                f"! fakesink name=sink sync=false async=false")
+    received = [0]
+
+    def count(pad, info):
+        received[0] += info.get_buffer().get_size()
+        return Gst.PadProbeReturn.OK
+
+    pipeline.get_by_name('sink').get_static_pad('sink').add_probe(Gst.PadProbeType.BUFFER, count)
+    pipeline.set_state(Gst.State.PLAYING)
+    samples = []
+    for second in range(int(WARMUP + args.duration) + 2):
+        time.sleep(1)
+        samples.append(received[0])
+    pipeline.set_state(Gst.State.NULL)
+    return {'samples': samples, 'skipped': receiver.skipped}
+
+
+class BondingStreamManager(StreamManager):
+    """StreamManager streaming to the receiver namespace."""
+
+    def is_network_available(self):
+        return True
+
+
+def stream(args, interfaces):
+    """Local side: stream bonded over interfaces while the namespace receives."""
+    receiver = subprocess.Popen(['ip', 'netns', 'exec', NAMESPACE, sys.executable, '-m', 'bondcam.bench.bonding',
+                                 '--receive', '--duration', str(args.duration), '--latency', str(args.latency)],
+                                stdout=subprocess.PIPE, text=True)
+    time.sleep(1)
+    settings = {
+        'isEnabled': True,
+        'videoStreams': [{
+            'camera': None,
+            'channel': {
+                'bitrate': args.bitrate,
+                'resolution': {'width': 1280, 'height': 720},
+                'frameRate': 30,
+                'streamEndpoint': f'srt://{RECEIVER_ADDRESS}:{BOND_PORT}',
+                'transport': {'latency': args.latency},
+                'bonding': {'enabled': True, 'receiver': f'{RECEIVER_ADDRESS}:{BOND_PORT}', 'interfaces': interfaces},
+            },
+        }],
+        'audioDevice': None,
+    }
+    manager = BondingStreamManager('Bench', lambda: copy.deepcopy(settings), args.profile)
+    loop = GLib.MainLoop()
+    marks = {}
+
+    def mark(name):
+        counters = manager.telemetry.stream_counters.get(1)
+        marks[name] = counters[1] if counters else 0
+        if name == 'end':
+            marks['links'] = manager.get_bonding_stats().get(1, {})
+            sink = manager.rtmp_sink_elements[0]
+            marks['sink'] = sink_stats(sink) if sink else {}
+            loop.quit()
+        return False
+
+    GLib.timeout_add_seconds(WARMUP, mark, 'start')
+    GLib.timeout_add_seconds(WARMUP + int(args.duration), mark, 'end')
+    loop.run()
+    if manager.pipeline:
+        manager.pipeline.set_state(Gst.State.NULL)
+    manager.stop_bonder(0)
+
+    output, _ = receiver.communicate()
+    try:
+        received = json.loads(output.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        return {'error': f'receiver exit status {receiver.returncode}'}
+    samples = received['samples']
+    window = samples[WARMUP:WARMUP + int(args.duration)]
+    goodput = (window[-1] - window[0]) * 8 / max(1, len(window) - 1) / 1000 if len(window) > 1 else None
+    return {
+        'interfaces': interfaces,
+        'goodput_kbps': round(goodput) if goodput is not None else None,
+        'encoded_kbps': round((marks['end'] - marks['start']) * 8 / args.duration / 1000),
+        'srt': marks['sink'],
+        'links': marks['links'],
+        'reassembly_skipped': received['skipped'],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profile', default='software', help='element profile')
+    parser.add_argument('--bitrate', type=int, default=4000, help='channel bitrate, in Kbps')
+    parser.add_argument('--latency', type=int, default=500, help='SRT latency, in ms')
+    parser.add_argument('--link-a', default='delay 20ms rate 3mbit', help='netem options of link A')
+    parser.add_argument('--link-b', default='delay 60ms rate 2mbit loss 1%', help='netem options of link B')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds measured per run')
+    parser.add_argument('--keep', action='store_true', help='leave the namespace and links in place')
+    parser.add_argument('--receive', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--run', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.receive:
+        print(json.dumps(receive(args)))
+        return 0
+    if args.run:
+        # Child process: one run, report on stdout
+        Gst.init(None)
+        print(json.dumps(stream(args, args.run.split(','))))
+        return 0
+
+    setup(args)
+    forwarded = ['--profile', args.profile, '--bitrate', str(args.bitrate), '--latency', str(args.latency),
+                 '--duration', str(args.duration)]
+    results = {}
+    try:
+        for name, interfaces in (('bonded', 'bondcam-a0,bondcam-b0'), ('single', 'bondcam-a0')):
+            result = subprocess.run([sys.executable, '-m', 'bondcam.bench.bonding', '--run', interfaces] + forwarded,
+                                    stdout=subprocess.PIPE, text=True)
+            try:
+                results[name] = json.loads(result.stdout.strip().splitlines()[-1])
+            except (IndexError, ValueError):
+                results[name] = {'error': f'exit status {result.returncode}'}
+    finally:
+        if not args.keep:
+            teardown()
+    print(json.dumps({'link_a': args.link_a, 'link_b': args.link_b, 'runs': results}, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
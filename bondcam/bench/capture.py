@@ -0,0 +1,165 @@
+"""Benchmark of the capture chains picked by the planner.
+
+Runs every capture format the planner knows about through its chain as fast as
+possible and reports the throughput and CPU cost of each, next to the legacy
+``jpegdec ! videoconvert ! videoscale ! videoconvert`` chain. Synthetic sources
+are used by default; pass ``--device`` to benchmark a real or v4l2loopback camera.
+
+Usage:
+    python -m bondcam.bench.capture --profile software --width 1280 --height 720
+"""
+
+import gi
+gi.require_version('Gst', '1.0')
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from gi.repository import Gst
+from bondcam.streaming.capture import output_caps, plan_capture_chain, probe_camera_caps
+from bondcam.streaming.elements import encoder_properties, get_profile
+from bondcam.streaming.graph import GraphBuilder
+
+
+def run_pipeline(description, timeout=600):
+    """Run a pipeline to EOS and measure it.
+
+    Args:
+        description: gst-launch description, or a pipeline already built
+
+    Returns:
+        Tuple of (wall seconds, CPU seconds), or None if the pipeline failed
+    """
+    pipeline = Gst.parse_launch(description) if isinstance(description, str) else description
+    bus = pipeline.get_bus()
+    wall_start = time.monotonic()
+    cpu_start = time.process_time()
+    pipeline.set_state(Gst.State.PLAYING)
+    message = bus.timed_pop_filtered(timeout * Gst.SECOND, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+    wall = time.monotonic() - wall_start
+    cpu = time.process_time() - cpu_start
+    pipeline.set_state(Gst.State.NULL)
+    if message is None or message.type == Gst.MessageType.ERROR:
+        if message is not None:
+            err, debug = message.parse_error()
+            print(f"Pipeline failed: {err}", file=sys.stderr)
+        return None
+    return wall, cpu
+
+
+def add_encoder(pipeline, profile, name, bitrate, latency=None, framerate=30):
+    """Build an encoder the way the stream bins do and link it between {name}-in and {name}-parse.
+
+    Args:
+        pipeline: Pipeline parsed from a description with elements named {name}-in and {name}-parse
+        profile: Element profile
+        name: Encoder name
+        bitrate: Target bitrate in bps
+        latency: Latency profile, defaults to 'balanced'
+        framerate: Stream framerate
+    """
+    factory = profile['encoder']
+    builder = GraphBuilder(f'{name}-bin')
+    encoder = builder.add(factory, name, encoder_properties(factory, bitrate, latency, framerate))
+    builder.ghost('sink', encoder.get_static_pad('sink'))
+    builder.ghost('src', encoder.get_static_pad('src'))
+    pipeline.add(builder.bin)
+    builder.chain(pipeline.get_by_name(f'{name}-in'), builder.bin, pipeline.get_by_name(f'{name}-parse'))
+
+
+def synthetic_sources(workdir, width, height, framerate, frames):
+    """Build synthetic sources for each capture format.
+
+    Compressed sources are encoded up front so the benchmark only measures the
+    capture chain.
+
+    Returns:
+        Dictionary of name -> (source description, source caps)
+    """
+    size = f"width={width},height={height},framerate={framerate}/1"
+    sources = {}
+    for fmt in ('NV12', 'YUY2'):
+        caps = f"video/x-raw,format={fmt},{size}"
+        sources[f'raw-{fmt.lower()}'] = (f"videotestsrc num-buffers={frames} pattern=ball ! {caps}", caps)
+
+    jpeg = os.path.join(workdir, 'frame.jpg')
+    if run_pipeline(f"videotestsrc num-buffers=1 pattern=ball ! video/x-raw,{size} ! jpegenc ! filesink location={jpeg}"):
+        caps = f"image/jpeg,{size}"
+        sources['mjpeg'] = (f"multifilesrc location={jpeg} loop=true num-buffers={frames} caps=\"{caps}\"", caps)
+
+    clip = os.path.join(workdir, 'clip.h264')
+    if run_pipeline(
+        f"videotestsrc num-buffers={frames} pattern=ball ! video/x-raw,{size} ! x264enc tune=zerolatency "
+        f"! video/x-h264,stream-format=byte-stream ! filesink location={clip}"
+    ):
+        caps = f"video/x-h264,{size}"
+        sources['h264'] = (f"filesrc location={clip} ! h264parse ! {caps}", caps)
+    return sources
+
+
+def measure(name, description, frames):
+    """Run one chain and build its result record."""
+    result = run_pipeline(description)
+    if result is None:
+        return {'chain': name, 'error': 'pipeline failed'}
+    wall, cpu = result
+    return {
+        'chain': name,
+        'pipeline': description,
+        'fps': round(frames / wall, 1) if wall else None,
+        'cpu_percent': round(100 * cpu / wall, 1) if wall else None,
+        'cpu_ms_per_frame': round(1000 * cpu / frames, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profile', default=None, help='element profile (defaults to ELEMENT_PROFILE)')
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--framerate', type=int, default=30)
+    parser.add_argument('--native-width', type=int, default=None, help='source width, to exercise scaling')
+    parser.add_argument('--native-height', type=int, default=None, help='source height, to exercise scaling')
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--device', default=None, help='benchmark a V4L2 device instead of synthetic sources')
+    args = parser.parse_args(argv)
+
+    Gst.init(None)
+    profile = get_profile(args.profile)
+    sink = 'fakesink sync=false'
+    native_width = args.native_width or args.width
+    native_height = args.native_height or args.height
+    results = []
+
+    if args.device:
+        camera_source = Gst.ElementFactory.make('v4l2src', None)
+        camera_source.set_property('device', args.device)
+        device_caps = probe_camera_caps(camera_source)
+        chain = plan_capture_chain(device_caps, args.width, args.height, args.framerate, profile)
+        source = f"v4l2src device={args.device} num-buffers={args.frames}"
+        results.append(measure('device', f"{source} ! {chain.describe()} ! {sink}", args.frames))
+    else:
+        with tempfile.TemporaryDirectory() as workdir:
+            sources = synthetic_sources(workdir, native_width, native_height, args.framerate, args.frames)
+            for name, (source, caps) in sources.items():
+                chain = plan_capture_chain(Gst.Caps.from_string(caps), args.width, args.height, args.framerate, profile)
+                results.append(measure(name, f"{source} ! {chain.describe()} ! {sink}", args.frames))
+
+            if 'mjpeg' in sources:
+                source, caps = sources['mjpeg']
+                legacy = (
+                    f"{source} ! {caps} ! jpegdec ! videoconvert ! videoscale "
+                    f"! video/x-raw,width={args.width},height={args.height} ! videoconvert "
+                    f"! {output_caps(args.width, args.height, args.framerate)}"
+                )
+                results.append(measure('legacy-mjpeg', f"{legacy} ! {sink}", args.frames))
+
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
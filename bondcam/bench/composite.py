@@ -0,0 +1,101 @@
+"""CPU cost of a composite stream against one encoder per camera.
+
+Runs the same cameras (moving test patterns at the capture size) through two
+graphs, offline and as fast as possible:
+
+- composite: every camera scaled to its tile, mixed in a compositor with one
+  of the composite layouts and encoded once
+- separate: one encoder per camera, as separate streams would run them
+
+and reports the CPU needed per second of video, as a percentage of one core,
+and the number of encoders each graph runs.
+
+Usage:
+    python -m bondcam.bench.composite --cameras 4 --layout grid
+"""
+
+import gi
+gi.require_version('Gst', '1.0')
+
+import argparse
+import json
+import sys
+from gi.repository import Gst
+from bondcam.bench.capture import add_encoder, run_pipeline
+from bondcam.streaming.capture import output_caps
+from bondcam.streaming.composite import LAYOUTS, layout_rects
+from bondcam.streaming.elements import get_profile
+
+
+def camera_source(camera, frames, caps):
+    return f"videotestsrc num-buffers={frames} pattern=smpte horizontal-speed={2 + camera} ! {caps}"
+
+
+def composite_pipeline(args, profile, frames):
+    caps = output_caps(args.width, args.height, args.framerate)
+    rects = layout_rects(args.layout, args.cameras, args.width, args.height)
+    pads = []
+    branches = []
+    for camera, rect in enumerate(rects):
+        if rect is None:
+            continue
+        x, y, width, height = rect
+        pads.append(f"sink_{camera}::xpos={x} sink_{camera}::ypos={y}")
+        branches.append(f"{camera_source(camera, frames, caps)} ! {profile['scale']} ! "
+                        f"{output_caps(width, height, args.framerate)} ! mix.sink_{camera}")
+    pipeline = Gst.parse_launch(
+        f"compositor name=mix background=black {' '.join(pads)} ! {caps} ! queue name=encoder-in "
+        f"h264parse name=encoder-parse ! fakesink " + ' '.join(branches))
+    add_encoder(pipeline, profile, 'encoder', args.bitrate * 1000, framerate=args.framerate)
+    return pipeline
+
+
+def separate_pipeline(args, profile, frames):
+    caps = output_caps(args.width, args.height, args.framerate)
+    pipeline = Gst.parse_launch(' '.join(
+        f"{camera_source(camera, frames, caps)} ! queue name=encoder{camera}-in "
+        f"h264parse name=encoder{camera}-parse ! fakesink"
+        for camera in range(args.cameras)
+    ))
+    for camera in range(args.cameras):
+        add_encoder(pipeline, profile, f'encoder{camera}', args.bitrate * 1000, framerate=args.framerate)
+    return pipeline
+
+
+def measure(pipeline, frames, framerate, encoders):
+    result = run_pipeline(pipeline)
+    if result is None:
+        return {'error': 'pipeline failed'}
+    wall, cpu = result
+    return {
+        'encoders': encoders,
+        'cpu_percent_realtime': round(100 * cpu / (frames / framerate), 1),
+        'speed': round(frames / framerate / wall, 2) if wall else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profile', default='software', help='element profile')
+    parser.add_argument('--cameras', type=int, default=4)
+    parser.add_argument('--layout', default='grid', choices=LAYOUTS)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--framerate', type=int, default=30)
+    parser.add_argument('--bitrate', type=int, default=2500, help='bitrate of each encoder, in Kbps')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds of video per measurement')
+    args = parser.parse_args(argv)
+
+    Gst.init(None)
+    profile = get_profile(args.profile)
+    frames = int(args.framerate * args.duration)
+    results = {
+        'composite': measure(composite_pipeline(args, profile, frames), frames, args.framerate, 1),
+        'separate': measure(separate_pipeline(args, profile, frames), frames, args.framerate, args.cameras),
+    }
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
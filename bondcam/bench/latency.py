@@ -0,0 +1,107 @@
+"""Glass-to-glass latency receiver for streams with ``latencyStamps`` enabled.
+
+Receives the RTMP stream through ffmpeg, either by listening for the device's
+push or by pulling it back from the ingest server, turns it into an H.264
+byte stream without re-encoding, and reads the latency stamps StreamManager
+put in SEI NALs. For every stamped frame the delay is split into:
+
+- capture: from capture to the encoder input (conversion, scaling, queues)
+- encode: through the encoder and parser
+- delivery: from the parser to this receiver (muxer, RTMP, server, network)
+
+and reported as percentiles. The device and the receiver clocks must be
+synchronised (NTP or PTP), or the receiver run on the device itself.
+
+Usage:
+    python -m bondcam.bench.latency --listen 1935 --frames 600
+    python -m bondcam.bench.latency --url rtmp://ingest.example.com/live/key
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from bondcam.streaming.latency import parse_stamp_sei
+
+START_CODE = b'\x00\x00\x01'
+
+# Bytes read from ffmpeg at a time
+CHUNK_SIZE = 4096
+
+STAGES = ('capture', 'encode', 'delivery', 'total')
+
+
+def receiver_command(args):
+    source = f'rtmp://0.0.0.0:{args.listen}/live/latency' if args.listen else args.url
+    listen = ['-listen', '1'] if args.listen else []
+    return ['ffmpeg', '-nostdin', '-loglevel', 'error', *listen, '-i', source,
+            '-map', '0:v', '-c', 'copy', '-bsf:v', 'h264_mp4toannexb', '-f', 'h264', '-']
+
+
+def split_nals(data):
+    """Split an Annex B byte stream into NALs.
+
+    Returns:
+        Tuple of (complete NALs, remaining bytes of the NAL still being received)
+    """
+    nals = []
+    start = data.find(START_CODE)
+    if start < 0:
+        return nals, data
+    while True:
+        end = data.find(START_CODE, start + 3)
+        if end < 0:
+            return nals, data[start:]
+        # Four-byte start codes leave a zero at the end of the previous NAL
+        nals.append(data[start + 3:end].rstrip(b'\x00'))
+        start = end
+
+
+def percentiles(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+    pick = lambda fraction: round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 1)
+    return {'p50': pick(0.5), 'p90': pick(0.9), 'p99': pick(0.99), 'max': pick(1.0), 'count': len(ordered)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--listen', type=int, help='port to receive the device push on (rtmp://<host>:<port>/live/latency)')
+    source.add_argument('--url', help='RTMP URL to pull the stream from')
+    parser.add_argument('--frames', type=int, default=600, help='stamped frames to collect')
+    parser.add_argument('--timeout', type=float, default=120, help='seconds to wait for them')
+    args = parser.parse_args(argv)
+
+    process = subprocess.Popen(receiver_command(args), stdout=subprocess.PIPE)
+    delays = {stage: [] for stage in STAGES}
+    pending = b''
+    deadline = time.monotonic() + args.timeout
+    try:
+        while len(delays['total']) < args.frames and time.monotonic() < deadline:
+            chunk = process.stdout.read1(CHUNK_SIZE)
+            if not chunk:
+                break
+            received = time.time_ns()
+            nals, pending = split_nals(pending + chunk)
+            for nal in nals:
+                stamps = parse_stamp_sei(nal)
+                if stamps is None:
+                    continue
+                captured, encoder_in, encoder_out = stamps
+                delays['capture'].append((encoder_in - captured) / 1e6)
+                delays['encode'].append((encoder_out - encoder_in) / 1e6)
+                delays['delivery'].append((received - encoder_out) / 1e6)
+                delays['total'].append((received - captured) / 1e6)
+    finally:
+        process.kill()
+        process.wait()
+
+    print(json.dumps({'latency_ms': {stage: percentiles(values) for stage, values in delays.items()}}, indent=2))
+    return 0 if delays['total'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
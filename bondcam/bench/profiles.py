@@ -0,0 +1,130 @@
+"""Latency against compression efficiency for each latency profile.
+
+For every profile in LATENCY_PROFILES:
+
+- live: one stream through StreamManager to a local RTMP stand-in server,
+  reporting the source-to-muxer latency, the latency the pipeline reports
+  (which includes the muxer) and the bitrate the encoder actually produced
+- quality: the same encoder settings run offline over a moving test pattern,
+  reporting the bitrate and the PSNR of the decoded result against the
+  source, computed by ffmpeg
+
+Usage:
+    python -m bondcam.bench.profiles --width 1280 --height 720 --bitrate 2000
+"""
+
+import gi
+gi.require_version('Gst', '1.0')
+
+import argparse
+import copy
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from gi.repository import GLib, Gst
+from bondcam.bench.capture import add_encoder, run_pipeline
+from bondcam.bench.reconnect import DEFAULT_SERVER_CMD, StandInServer
+from bondcam.bench.suite import WARMUP, SuiteStreamManager, percentile
+from bondcam.streaming.capture import output_caps
+from bondcam.streaming.elements import LATENCY_PROFILES, get_profile
+
+SERVER_PORT = 1938
+
+
+def measure_live(name, args):
+    server = StandInServer(args.server_cmd, SERVER_PORT)
+    server.start()
+    time.sleep(1)
+    settings = {
+        'isEnabled': True,
+        'videoStreams': [{
+            'camera': None,
+            'channel': {
+                'bitrate': args.bitrate,
+                'resolution': {'width': args.width, 'height': args.height},
+                'frameRate': args.framerate,
+                'streamEndpoint': f'rtmp://127.0.0.1:{SERVER_PORT}/live/bench',
+                'latencyProfile': name,
+            },
+        }],
+        'audioDevice': None,
+    }
+    manager = SuiteStreamManager(lambda: copy.deepcopy(settings), args.profile, False)
+    manager.check_camera_devices()
+    loop = GLib.MainLoop()
+    GLib.timeout_add_seconds(1, server.keep_alive)
+    GLib.timeout_add_seconds(WARMUP, loop.quit)
+    loop.run()
+    manager.latencies.clear()
+    frames, size = manager.telemetry.stream_counters.get(1, [0, 0])
+    started = time.monotonic()
+    GLib.timeout_add(int(args.duration * 1000), loop.quit)
+    loop.run()
+    elapsed = time.monotonic() - started
+    end_frames, end_size = manager.telemetry.stream_counters.get(1, [0, 0])
+
+    query = Gst.Query.new_latency()
+    pipeline_latency = None
+    if manager.pipeline.query(query):
+        pipeline_latency = round(query.parse_latency()[1] / Gst.MSECOND, 1)
+    manager.pipeline.set_state(Gst.State.NULL)
+    server.stop()
+    return {
+        'latency_p50_ms': percentile(manager.latencies, 0.5),
+        'latency_p95_ms': percentile(manager.latencies, 0.95),
+        'pipeline_latency_ms': pipeline_latency,
+        'fps': round((end_frames - frames) / elapsed, 2),
+        'bitrate_kbps': round((end_size - size) * 8 / elapsed / 1000, 1),
+    }
+
+
+def measure_quality(name, args, workdir):
+    frames = int(args.framerate * args.duration)
+    reference = os.path.join(workdir, 'reference.y4m')
+    encoded = os.path.join(workdir, f'{name}.flv')
+    # Raw I420 for the reference, the encoder gets the NV12 every capture chain produces
+    caps = output_caps(args.width, args.height, args.framerate)
+    pipeline = Gst.parse_launch(
+        f"videotestsrc num-buffers={frames} pattern=smpte horizontal-speed=4 ! {caps} ! tee name=t "
+        f"t. ! queue ! videoconvert ! video/x-raw,format=I420 ! y4menc ! filesink location={reference} "
+        f"t. ! queue name=encoder-in h264parse name=encoder-parse ! flvmux ! filesink location={encoded}"
+    )
+    add_encoder(pipeline, get_profile(args.profile), 'encoder', args.bitrate * 1000, LATENCY_PROFILES[name],
+                args.framerate)
+    if run_pipeline(pipeline) is None:
+        return None
+    result = subprocess.run(['ffmpeg', '-nostdin', '-i', encoded, '-i', reference, '-lavfi', 'psnr', '-f', 'null', '-'],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    match = re.search(r'average:([\d.]+|inf)', result.stderr)
+    return {
+        'bitrate_kbps': round(os.path.getsize(encoded) * 8 / (frames / args.framerate) / 1000, 1),
+        'psnr_db': float(match.group(1)) if match else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server-cmd', default=DEFAULT_SERVER_CMD, help='stand-in server command, {port} is substituted')
+    parser.add_argument('--profile', default='software', help='element profile')
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--framerate', type=int, default=30)
+    parser.add_argument('--bitrate', type=int, default=2000, help='channel bitrate, in Kbps')
+    parser.add_argument('--duration', type=float, default=15.0, help='seconds measured per profile')
+    args = parser.parse_args(argv)
+
+    Gst.init(None)
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in LATENCY_PROFILES:
+            results[name] = {'live': measure_live(name, args), 'quality': measure_quality(name, args, workdir)}
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
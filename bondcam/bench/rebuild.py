@@ -0,0 +1,105 @@
+"""Stream rebuild time with and without the element pool.
+
+Drives a StreamManager with videotestsrc inputs and fakesink outputs through
+a series of encoder rebuilds (the first stream's latency profile is toggled)
+and full pipeline rebuilds, and reports for each:
+
+- build: time spent building the new bins, on the main loop
+- first buffer: from the change until the rebuilt stream's first muxed buffer
+
+Cold runs discard every element like a parsed pipeline would, warm runs take
+the encoders, parsers and muxers of the discarded bins from the pool.
+
+Usage:
+    python -m bondcam.bench.rebuild --streams 2 --rebuilds 10
+"""
+
+import gi
+gi.require_version('Gst', '1.0')
+
+import argparse
+import copy
+import json
+import statistics
+import sys
+import time
+from gi.repository import GLib, Gst
+from bondcam.bench.reconfigure import SETTLE_TIME, BenchStreamManager, make_stream
+from bondcam.streaming.graph import ElementPool
+
+PROFILES = ('balanced', 'ultra-low')
+
+
+def summarize(values):
+    values = [value for value in values if value is not None]
+    if not values:
+        return None
+    return {'median': round(statistics.median(values), 1), 'max': round(max(values), 1)}
+
+
+def run(mode, args):
+    settings = {
+        'isEnabled': True,
+        'videoStreams': [make_stream(idx) for idx in range(args.streams)],
+        'audioDevice': None,
+    }
+    manager = BenchStreamManager(lambda: copy.deepcopy(settings), args.profile)
+    if mode == 'cold':
+        manager.element_pool = ElementPool(size=0)
+    steps = [('encoder', idx) for idx in range(args.rebuilds)] + [('pipeline', idx) for idx in range(args.rebuilds)]
+    timings = {'encoder': [], 'pipeline': []}
+    loop = GLib.MainLoop()
+    pending = []
+
+    def first_buffer(changed_at, built_at):
+        # The old bins are gone once the build returned, later buffers come from the new ones
+        arrivals = [t for t in manager.arrivals.get(1, []) if t > built_at]
+        return round(1000 * (arrivals[0] - changed_at), 1) if arrivals else None
+
+    def run_step():
+        if pending:
+            kind, changed_at, built_at = pending.pop()
+            timings[kind].append((1000 * (built_at - changed_at), first_buffer(changed_at, built_at)))
+        if not steps:
+            loop.quit()
+            return False
+        kind, count = steps.pop(0)
+        changed_at = time.monotonic()
+        if kind == 'encoder':
+            settings['videoStreams'][0]['channel']['latencyProfile'] = PROFILES[count % 2]
+            manager.check_stream_info()
+        else:
+            manager.build_pipeline()
+        pending.append((kind, changed_at, time.monotonic()))
+        return True
+
+    GLib.timeout_add_seconds(SETTLE_TIME, run_step)
+    loop.run()
+    if manager.pipeline:
+        manager.pipeline.set_state(Gst.State.NULL)
+
+    report = {
+        kind: {
+            'build_ms': summarize([build for build, _ in values]),
+            'first_buffer_ms': summarize([first for _, first in values]),
+        }
+        for kind, values in timings.items()
+    }
+    report['pool'] = manager.element_pool.stats()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--streams', type=int, default=2)
+    parser.add_argument('--rebuilds', type=int, default=10, help='rebuilds of each kind')
+    parser.add_argument('--profile', default='software', help='element profile')
+    args = parser.parse_args(argv)
+
+    Gst.init(None)
+    print(json.dumps({mode: run(mode, args) for mode in ('cold', 'warm')}, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
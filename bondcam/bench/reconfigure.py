@@ -0,0 +1,153 @@
+"""Per-stream downtime of live configuration changes.
+
+Drives a StreamManager through a scripted series of configuration changes with
+videotestsrc inputs and fakesink outputs, and reports for every change how long
+each stream stopped delivering buffers. Pass ``--full-rebuild`` to measure the
+old behaviour of tearing down the whole pipeline on every change.
+
+Usage:
+    python -m bondcam.bench.reconfigure --streams 3
+"""
+
+import gi
+gi.require_version('Gst', '1.0')
+
+import argparse
+import copy
+import json
+import sys
+import time
+from gi.repository import GLib, Gst
+from bondcam.streaming.manager import StreamManager
+
+# Seconds to wait after a change before measuring the next one
+SETTLE_TIME = 3
+
+
+class BenchStreamManager(StreamManager):
+    """StreamManager writing to fakesinks and recording buffer arrival times."""
+
+    def __init__(self, get_stream_settings, element_profile):
+        self.arrivals = {}
+        super().__init__('Bench', get_stream_settings, element_profile)
+
+    def output_sink(self, builder, camera_num, channel):
+        return builder.add('fakesink', f'rtmpsink{camera_num}{self.label}', {'sync': False, 'signal-handoffs': True})
+
+    def add_output(self, idx):
+        super().add_output(idx)
+        self.rtmp_sink_elements[idx].connect('handoff', self.on_handoff, idx + 1)
+
+    def on_handoff(self, sink, buffer, pad, camera_num):
+        # Runs on the streaming thread; list.append is atomic
+        self.arrivals.setdefault(camera_num, []).append(time.monotonic())
+
+
+class FullRebuildStreamManager(BenchStreamManager):
+    """Reproduces the previous behaviour of rebuilding the whole pipeline on any change."""
+
+    def apply_reconfigure_plan(self, plan):
+        self.build_pipeline()
+
+
+def make_stream(idx, width=640, height=360, bitrate=1000):
+    return {
+        'camera': None,
+        'channel': {
+            'bitrate': bitrate,
+            'resolution': {'width': width, 'height': height},
+            'frameRate': 30,
+            'streamEndpoint': f'rtmp://127.0.0.1/live/stream{idx + 1}',
+        },
+    }
+
+
+def scenario(num_streams):
+    """Build the list of (name, change) steps applied to the settings in order."""
+    def change_endpoint(settings):
+        settings['videoStreams'][1 % num_streams]['channel']['streamEndpoint'] += '-new'
+
+    def change_resolution(settings):
+        settings['videoStreams'][-1]['channel']['resolution'] = {'width': 320, 'height': 180}
+
+    def change_bitrate(settings):
+        settings['videoStreams'][0]['channel']['bitrate'] = 1500
+
+    def add_stream(settings):
+        settings['videoStreams'].append(make_stream(len(settings['videoStreams'])))
+
+    def remove_stream(settings):
+        settings['videoStreams'].pop()
+
+    def change_audio(settings):
+        settings['audioDevice'] = 'default'
+
+    return [
+        ('endpoint', change_endpoint),
+        ('resolution', change_resolution),
+        ('bitrate', change_bitrate),
+        ('add-stream', add_stream),
+        ('remove-stream', remove_stream),
+        ('audio-device', change_audio),
+    ]
+
+
+def downtime(arrivals, start, end):
+    """Longest gap between buffers of one stream within [start, end], in ms."""
+    times = [t for t in arrivals if start <= t <= end]
+    before = [t for t in arrivals if t < start]
+    if before:
+        times.insert(0, before[-1])
+    if len(times) < 2:
+        return None
+    return round(1000 * max(b - a for a, b in zip(times, times[1:])), 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--streams', type=int, default=3)
+    parser.add_argument('--profile', default='software', help='element profile')
+    parser.add_argument('--full-rebuild', action='store_true', help='rebuild the whole pipeline on every change')
+    args = parser.parse_args(argv)
+
+    settings = {
+        'isEnabled': True,
+        'videoStreams': [make_stream(idx) for idx in range(args.streams)],
+        'audioDevice': None,
+    }
+    manager_class = FullRebuildStreamManager if args.full_rebuild else BenchStreamManager
+    manager = manager_class(lambda: copy.deepcopy(settings), args.profile)
+
+    steps = scenario(args.streams)
+    results = []
+    loop = GLib.MainLoop()
+
+    def run_step():
+        if results:
+            # Measure the previous change now that it has settled
+            changed_at = results[-1].pop('at')
+            results[-1]['downtime_ms'] = {
+                str(camera_num): downtime(arrivals, changed_at - 0.5, changed_at + SETTLE_TIME)
+                for camera_num, arrivals in sorted(manager.arrivals.items())
+            }
+        if not steps:
+            loop.quit()
+            return False
+        name, change = steps.pop(0)
+        change(settings)
+        changed_at = time.monotonic()
+        manager.check_stream_info()
+        results.append({'change': name, 'at': changed_at})
+        return True
+
+    GLib.timeout_add_seconds(SETTLE_TIME, run_step)
+    loop.run()
+    if manager.pipeline:
+        manager.pipeline.set_state(Gst.State.NULL)
+
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
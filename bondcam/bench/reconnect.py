@@ -0,0 +1,147 @@
+"""RTMP reconnection against a local stand-in server that is killed mid-stream.
+
+Streams to two local RTMP servers, kills the first one for a while and restarts
+it, then reports how long that output took to recover, how many frames it lost
+and the longest gap seen on the healthy output. Any RTMP server that can be
+started from the command line works as the stand-in; ffmpeg in listen mode is
+the default.
+
+Usage:
+    python -m bondcam.bench.reconnect --outage 5
+"""
+
+import gi
+gi.require_version('Gst', '1.0')
+
+import argparse
+import copy
+import json
+import shlex
+import subprocess
+import sys
+import time
+from gi.repository import GLib, Gst
+from bondcam.streaming.manager import StreamManager
+
+DEFAULT_SERVER_CMD = 'ffmpeg -nostdin -loglevel error -listen 1 -f flv -i rtmp://127.0.0.1:{port}/live/bench -f null -'
+
+
+class StandInServer:
+    """RTMP server process that can be killed and restarted."""
+
+    def __init__(self, command, port):
+        self.command = shlex.split(command.format(port=port))
+        self.port = port
+        self.process = None
+
+    def start(self):
+        self.process = subprocess.Popen(self.command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def stop(self):
+        if self.process:
+            self.process.kill()
+            self.process.wait()
+            self.process = None
+
+    def keep_alive(self):
+        # Servers in listen mode exit when their publisher goes away, start them again
+        if self.process and self.process.poll() is not None:
+            self.start()
+        return True
+
+
+class ReconnectStreamManager(StreamManager):
+    """StreamManager recording when buffers reach each RTMP sink."""
+
+    def __init__(self, get_stream_settings, element_profile):
+        self.arrivals = {}
+        super().__init__('Bench', get_stream_settings, element_profile)
+
+    def add_output(self, idx):
+        super().add_output(idx)
+        pad = self.rtmp_sink_elements[idx].get_static_pad('sink')
+        pad.add_probe(Gst.PadProbeType.BUFFER, self.on_sink_buffer, idx + 1)
+
+    def on_sink_buffer(self, pad, info, camera_num):
+        self.arrivals.setdefault(camera_num, []).append(time.monotonic())
+        return Gst.PadProbeReturn.OK
+
+    def is_network_available(self):
+        # The stand-in servers are local
+        return True
+
+
+def longest_gap(arrivals):
+    if len(arrivals) < 2:
+        return None
+    return round(1000 * max(b - a for a, b in zip(arrivals, arrivals[1:])), 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server-cmd', default=DEFAULT_SERVER_CMD, help='stand-in server command, {port} is substituted')
+    parser.add_argument('--profile', default='software', help='element profile')
+    parser.add_argument('--warmup', type=int, default=5, help='seconds before the server is killed')
+    parser.add_argument('--outage', type=int, default=5, help='seconds the server stays down')
+    parser.add_argument('--recovery', type=int, default=20, help='seconds to wait for recovery')
+    args = parser.parse_args(argv)
+
+    servers = [StandInServer(args.server_cmd, port) for port in (1935, 1936)]
+    for server in servers:
+        server.start()
+    time.sleep(1)
+
+    settings = {
+        'isEnabled': True,
+        'videoStreams': [
+            {
+                'camera': None,
+                'channel': {
+                    'bitrate': 1000,
+                    'resolution': {'width': 640, 'height': 360},
+                    'frameRate': 30,
+                    'streamEndpoint': f'rtmp://127.0.0.1:{server.port}/live/bench',
+                },
+            }
+            for server in servers
+        ],
+        'audioDevice': None,
+    }
+    manager = ReconnectStreamManager(lambda: copy.deepcopy(settings), args.profile)
+    loop = GLib.MainLoop()
+    for server in servers:
+        GLib.timeout_add_seconds(1, server.keep_alive)
+
+    def kill():
+        servers[0].stop()
+        return False
+
+    def restart():
+        servers[0].start()
+        return False
+
+    GLib.timeout_add_seconds(args.warmup, kill)
+    GLib.timeout_add_seconds(args.warmup + args.outage, restart)
+    GLib.timeout_add_seconds(args.warmup + args.outage + args.recovery, loop.quit)
+    loop.run()
+
+    state = manager.output_states[0]
+    result = {
+        'outage_s': args.outage,
+        'reconnects': state['reconnects'],
+        # Time from the sink error to media flowing again, including the outage itself
+        'reconnect_latency_s': round(state['last_reconnect_latency'], 2) if state['last_reconnect_latency'] else None,
+        'frames_lost': state['frames_lost'],
+        'healthy_output_longest_gap_ms': longest_gap(manager.arrivals.get(2, [])),
+    }
+    if manager.pipeline:
+        manager.pipeline.set_state(Gst.State.NULL)
+    for server in servers:
+        server.stop()
+
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""Per-tick cost of resolving the stream settings' device names.
+
+Compares the old resolution, which enumerated udev, ran ``arecord -l`` and
+scanned the camera list for every stream on each check_stream_info tick,
+with the DeviceRegistry cache. Cameras are simulated udev devices, so no
+hardware is needed; the audio listing runs the real command.
+
+Usage:
+    python -m bondcam.bench.resolve --cameras 8
+"""
+
+import argparse
+import copy
+import json
+import sys
+import time
+from bondcam.core.device_manager import DeviceManager
+from bondcam.devices import video
+from bondcam.devices.audio import get_audio_devices
+from bondcam.devices.registry import DeviceRegistry
+
+
+class FakeDevice(dict):
+    """video4linux device with the attributes the camera index reads."""
+
+    def __init__(self, number, id_path, model):
+        super().__init__(DEVNAME=f'/dev/video{number}', ID_PATH=id_path, ID_MODEL=model)
+        self.device_node = f'/dev/video{number}'
+        self.sys_path = f'/sys/devices/virtual/video4linux/video{number}'
+        self.sys_number = str(number)
+
+
+class FakeContext:
+    """pyudev Context listing simulated cameras (a capture and a metadata node each)."""
+
+    def __init__(self, num_cameras):
+        self.devices = []
+        for idx in range(num_cameras):
+            id_path = f'platform-fc800000.usb-usb-0:1.{idx + 1}:1.0'
+            self.devices.append(FakeDevice(2 * idx, id_path, 'USB_Camera'))
+            self.devices.append(FakeDevice(2 * idx + 1, id_path, 'USB_Camera'))
+
+    def list_devices(self, subsystem=None):
+        return list(self.devices)
+
+
+def make_settings(num_cameras):
+    return {
+        'isEnabled': True,
+        'audioDevice': 'USB',
+        'videoStreams': [
+            {'camera': f'USB_Camera (platform-fc800000.usb-usb-0:1.{idx + 1}:1.0)', 'channel': {'bitrate': 2000}}
+            for idx in range(num_cameras)
+        ],
+    }
+
+
+def legacy_get_stream_settings(device_info, context):
+    # The resolution as it was: enumerate everything and scan the lists per stream
+    stream_settings = device_info.get('streamSettings', {})
+    index = video.CameraIndex(context)
+    index.refresh()
+    connected_cameras = index.cameras()
+    connected_audio = get_audio_devices()
+    camera_indices = {}
+    for stream in stream_settings.get('videoStreams', []):
+        camera_name = stream['camera']
+        if camera_name not in camera_indices:
+            camera_indices[camera_name] = 0
+        matching_cameras = [cam for cam in connected_cameras if cam['name'] == camera_name]
+        if camera_indices[camera_name] < len(matching_cameras):
+            stream['camera'] = matching_cameras[camera_indices[camera_name]]['path']
+            camera_indices[camera_name] += 1
+        else:
+            stream['camera'] = None
+    audio_device = stream_settings.get('audioDevice')
+    stream_settings['audioDevice'] = next((a['path'] for a in connected_audio if a['name'] == audio_device), None)
+    return stream_settings
+
+
+def time_ticks(function, ticks):
+    """Average time of one call, in microseconds."""
+    started = time.perf_counter()
+    for _ in range(ticks):
+        function()
+    return round(1e6 * (time.perf_counter() - started) / ticks, 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cameras', type=int, default=8)
+    parser.add_argument('--ticks', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    context = FakeContext(args.cameras)
+    device_info = {'serial': 'bench', 'streamSettings': make_settings(args.cameras)}
+
+    camera_index = video.CameraIndex(context)
+    camera_index.refresh()
+    registry = DeviceRegistry(camera_index, context)
+    # Stands in for the started sound monitor, so audio listings are cached too
+    registry.monitor = object()
+    manager = DeviceManager('bench', registry)
+    manager._device_info = device_info
+
+    before = time_ticks(lambda: legacy_get_stream_settings(copy.deepcopy(device_info), context), args.ticks)
+    after = time_ticks(manager.get_stream_settings, args.ticks)
+    after_change = time_ticks(lambda: (registry.invalidate_cameras(), manager.get_stream_settings()), args.ticks)
+
+    print(json.dumps({
+        'cameras': args.cameras,
+        'per_tick_us': {
+            'before': before,
+            'after': after,
+            'after_udev_change': after_change,
+        },
+        'resolved': manager.get_stream_settings()['videoStreams'][0]['camera'],
+    }, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""Settings push latency against a local server-sent events stand-in.
+
+Starts a local SSE server standing in for SETTINGS_STREAM_API, pushes a
+settings change at a fixed interval and reports how long each one took to
+reach the main loop. Half way through, the server drops the connection to
+show the client reconnecting and falling back to polling meanwhile.
+
+Usage:
+    python -m bondcam.bench.settings_push --changes 20
+"""
+
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from gi.repository import GLib
+from bondcam.api.client import SettingsStream
+
+
+class EventStreamHandler(BaseHTTPRequestHandler):
+    """Streams the events queued on the server to one client."""
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        events = queue.Queue()
+        self.server.clients.append(events)
+        try:
+            while True:
+                try:
+                    event = events.get(timeout=15)
+                except queue.Empty:
+                    event = ': keep-alive\n\n'
+                if event is None:
+                    return  # Drop the connection
+                self.wfile.write(event.encode())
+                self.wfile.flush()
+        except OSError:
+            pass
+        finally:
+            self.server.clients.remove(events)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--changes', type=int, default=20, help='settings changes to push')
+    parser.add_argument('--interval', type=float, default=0.5, help='seconds between changes')
+    args = parser.parse_args(argv)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), EventStreamHandler)
+    server.clients = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/devices/stream'
+
+    latencies = []
+    disconnected = []
+
+    def on_device(device):
+        latencies.append(time.monotonic() - device['pushedAt'])
+
+    def on_state(connected):
+        if not connected:
+            disconnected.append(time.monotonic())
+
+    stream = SettingsStream('bench', on_device, on_state, url=url)
+    stream.start()
+
+    loop = GLib.MainLoop()
+    pushed = 0
+
+    def push_change():
+        nonlocal pushed
+        if pushed == args.changes:
+            loop.quit()
+            return False
+        if pushed == args.changes // 2:
+            for client in list(server.clients):
+                client.put(None)
+        device = {'streamSettings': {'isEnabled': True, 'videoStreams': [{'channel': {'bitrate': 1000 + pushed}}]},
+                  'pushedAt': time.monotonic()}
+        event = f'id: {pushed}\ndata: {json.dumps({"data": device})}\n\n'
+        for client in list(server.clients):
+            client.put(event)
+        pushed += 1
+        return True
+
+    GLib.timeout_add(int(args.interval * 1000), push_change)
+    loop.run()
+    stream.stop()
+    server.shutdown()
+
+    latencies.sort()
+    print(json.dumps({
+        'pushed': pushed,
+        'received': len(latencies),
+        'latency_ms': {
+            'p50': round(1000 * latencies[len(latencies) // 2], 1) if latencies else None,
+            'max': round(1000 * latencies[-1], 1) if latencies else None,
+        },
+        'disconnects': len(disconnected),
+        'stream': stream.stats(),
+    }, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
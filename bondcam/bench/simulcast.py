@@ -0,0 +1,93 @@
+"""CPU cost of a simulcast ladder, shared encodes against one encode per endpoint.
+
+Builds the same set of endpoints twice with videotestsrc inputs and fakesink
+outputs (the reconfigure benchmark's StreamManager):
+
+- separate: one videoStreams entry per endpoint, each with its own encoder
+- renditions: one entry whose renditions share the encodes they have in common
+
+and reports the process CPU% and the number of encoders each layout runs.
+
+Usage:
+    python -m bondcam.bench.simulcast --duration 10
+"""
+
+import gi
+gi.require_version('Gst', '1.0')
+
+import argparse
+import copy
+import json
+import sys
+import time
+from gi.repository import GLib, Gst
+from bondcam.bench.reconfigure import BenchStreamManager
+
+# (width, height, bitrate in Kbps, number of endpoints) of each rendition
+LADDER = [(1280, 720, 2500, 2), (640, 360, 800, 1)]
+
+
+def rendition(width, height, bitrate, endpoints, first):
+    return {
+        'resolution': {'width': width, 'height': height},
+        'bitrate': bitrate,
+        'streamEndpoints': [f'rtmp://127.0.0.1/live/{height}p-{first + n}' for n in range(endpoints)],
+    }
+
+
+def layout_settings(layout):
+    renditions = []
+    first = 1
+    for width, height, bitrate, endpoints in LADDER:
+        renditions.append(rendition(width, height, bitrate, endpoints, first))
+        first += endpoints
+    if layout == 'renditions':
+        video_streams = [{'camera': None, 'channel': {'frameRate': 30, 'renditions': renditions}}]
+    else:
+        video_streams = [
+            {'camera': None, 'channel': {
+                'frameRate': 30,
+                'resolution': entry['resolution'],
+                'bitrate': entry['bitrate'],
+                'streamEndpoint': endpoint,
+            }}
+            for entry in renditions for endpoint in entry['streamEndpoints']
+        ]
+    return {'isEnabled': True, 'videoStreams': video_streams, 'audioDevice': None}
+
+
+def measure(layout, profile, duration):
+    settings = layout_settings(layout)
+    manager = BenchStreamManager(lambda: copy.deepcopy(settings), profile)
+    loop = GLib.MainLoop()
+    # Let the encoders settle before measuring
+    GLib.timeout_add_seconds(2, loop.quit)
+    loop.run()
+    GLib.timeout_add(int(duration * 1000), loop.quit)
+    wall_start = time.monotonic()
+    cpu_start = time.process_time()
+    loop.run()
+    cpu = time.process_time() - cpu_start
+    wall = time.monotonic() - wall_start
+    manager.pipeline.set_state(Gst.State.NULL)
+    return {
+        'endpoints': len(manager.output_bins),
+        'encoders': sum(1 for stream_bin in manager.stream_bins if stream_bin),
+        'buffers': {str(camera_num): len(arrivals) for camera_num, arrivals in sorted(manager.arrivals.items())},
+        'cpu_percent': round(100 * cpu / wall, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profile', default='software', help='element profile')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per measurement')
+    args = parser.parse_args(argv)
+
+    results = {layout: measure(layout, args.profile, args.duration) for layout in ('separate', 'renditions')}
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,328 @@
+"""Reproducible benchmark suite over the StreamManager pipeline.
+
+Builds the pipelines through StreamManager itself, so the graphs are the ones
+the device runs, with substitutable parts: videotestsrc or a v4l2loopback
+device for the cameras, the ``software`` element profile for x264enc, and
+fakesinks or local RTMP stand-in servers for the outputs. Scenarios:
+
+- steady-{N}x{H}p{FPS}: 1, 2 or 4 streams at 720p/1080p and 30/60 fps
+- failover-storm: RTMP outputs failing one after the other, and camera
+  reconnects when a device is given
+- config-churn: the scripted changes of the reconfigure benchmark
+
+Each scenario runs in a process of its own so CPU and RSS do not leak from one
+to the next, and reports per-stream fps, source-to-muxer latency percentiles,
+CPU%, RSS and, for the disruptive scenarios, the longest gap per event.
+``--compare`` checks the run against an earlier JSON report and exits with 1
+when a metric regressed past its tolerance.
+
+Usage:
+    python -m bondcam.bench.suite --output baseline.json
+    python -m bondcam.bench.suite --scenarios steady-2x720p30,config-churn --compare baseline.json
+"""
+
+import gi
+gi.require_version('Gst', '1.0')
+
+import argparse
+import copy
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from gi.repository import GLib, Gst
+from bondcam.bench.reconfigure import downtime, scenario as churn_steps
+from bondcam.bench.reconnect import DEFAULT_SERVER_CMD, StandInServer
+from bondcam.streaming.manager import StreamManager
+
+# Seconds the pipeline runs before measuring
+WARMUP = 3
+
+# Seconds between the disruptive events of the storm and churn scenarios
+EVENT_INTERVAL = 4
+
+# First port of the RTMP stand-in servers, one per stream
+RTMP_BASE_PORT = 1940
+
+# Allowed relative change of each metric before it counts as a regression,
+# and whether higher values are better
+TOLERANCES = {
+    'fps_min': (0.05, True),
+    'latency_p95_ms': (0.20, False),
+    'cpu_percent': (0.10, False),
+    'rss_mb': (0.10, False),
+    'downtime_max_ms': (0.25, False),
+}
+
+
+def build_scenarios():
+    scenarios = {}
+    for streams in (1, 2, 4):
+        for width, height in ((1280, 720), (1920, 1080)):
+            for fps in (30, 60):
+                scenarios[f'steady-{streams}x{height}p{fps}'] = {
+                    'kind': 'steady', 'streams': streams, 'width': width, 'height': height, 'fps': fps,
+                }
+    scenarios['failover-storm'] = {'kind': 'storm', 'streams': 2, 'width': 1280, 'height': 720, 'fps': 30}
+    scenarios['config-churn'] = {'kind': 'churn', 'streams': 3, 'width': 640, 'height': 360, 'fps': 30}
+    return scenarios
+
+
+SCENARIOS = build_scenarios()
+
+
+class SuiteStreamManager(StreamManager):
+    """StreamManager recording sink arrivals and the latency at each muxer input."""
+
+    def __init__(self, get_stream_settings, element_profile, fake_sinks):
+        self.fake_sinks = fake_sinks
+        self.arrivals = {}
+        self.latencies = []
+        super().__init__('Bench', get_stream_settings, element_profile)
+
+    def output_sink(self, builder, camera_num, channel):
+        if not self.fake_sinks:
+            return super().output_sink(builder, camera_num, channel)
+        return builder.add('fakesink', f'rtmpsink{camera_num}{self.label}', {'sync': False})
+
+    def add_output(self, idx):
+        super().add_output(idx)
+        camera_num = idx + 1
+        sink_pad = self.rtmp_sink_elements[idx].get_static_pad('sink')
+        sink_pad.add_probe(Gst.PadProbeType.BUFFER, self.on_sink_buffer, camera_num)
+        queue_pad = self.output_bins[idx].get_by_name(f'videoqueue{camera_num}').get_static_pad('src')
+        queue_pad.add_probe(Gst.PadProbeType.BUFFER, self.on_mux_buffer, None)
+
+    def on_sink_buffer(self, pad, info, camera_num):
+        self.arrivals.setdefault(camera_num, []).append(time.monotonic())
+        return Gst.PadProbeReturn.OK
+
+    def on_mux_buffer(self, pad, info, data):
+        # Live sources stamp buffers with the running time they were captured at
+        element = pad.get_parent_element()
+        clock = element.get_clock()
+        pts = info.get_buffer().pts
+        if clock and pts != Gst.CLOCK_TIME_NONE:
+            running_time = clock.get_time() - element.get_base_time()
+            self.latencies.append((running_time - pts) / Gst.MSECOND)
+        return Gst.PadProbeReturn.OK
+
+    def is_network_available(self):
+        # The stand-in servers are local
+        return True
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 1)
+
+
+def rss_mb():
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return round(int(line.split()[1]) / 1024, 1)
+    return None
+
+
+def make_settings(spec, endpoint, device):
+    return {
+        'isEnabled': True,
+        'videoStreams': [{
+            'camera': device,
+            'channel': {
+                'bitrate': 2500 if spec['height'] >= 1080 else 1500,
+                'resolution': {'width': spec['width'], 'height': spec['height']},
+                'frameRate': spec['fps'],
+                'streamEndpoint': endpoint(idx),
+            },
+        } for idx in range(spec['streams'])],
+        'audioDevice': None,
+    }
+
+
+def storm_steps(manager, num_streams):
+    """Fail each output in turn, and reconnect the cameras when there are some."""
+    steps = []
+    for idx in range(num_streams):
+        def fail_output(idx=idx):
+            manager.handle_rtmp_error(manager.rtmp_sink_elements[idx])
+        steps.append((f'output-{idx + 1}-failure', fail_output))
+        if manager.desired_video_streams[idx]['camera'] is not None:
+            steps.append((f'camera-{idx + 1}-reconnect', lambda idx=idx: manager.reconnect_camera(idx)))
+    return steps * 2
+
+
+def run_scenario(name, args):
+    """Run one scenario in this process and return its report."""
+    spec = SCENARIOS[name]
+    servers = []
+    if args.sink == 'rtmp':
+        for idx in range(spec['streams']):
+            server = StandInServer(args.server_cmd, RTMP_BASE_PORT + idx)
+            server.start()
+            servers.append(server)
+        time.sleep(1)
+
+    settings = make_settings(spec, lambda idx: f'rtmp://127.0.0.1:{RTMP_BASE_PORT + idx}/live/bench', args.device)
+    manager = SuiteStreamManager(lambda: copy.deepcopy(settings), args.profile, args.sink == 'fakesink')
+    manager.check_camera_devices()
+    loop = GLib.MainLoop()
+    for server in servers:
+        GLib.timeout_add_seconds(1, server.keep_alive)
+
+    if spec['kind'] == 'storm':
+        steps = storm_steps(manager, spec['streams'])
+    elif spec['kind'] == 'churn':
+        steps = [(step, lambda change=change: (change(settings), manager.check_stream_info()))
+                 for step, change in churn_steps(spec['streams'])]
+    else:
+        steps = []
+    events = []
+
+    def run_event():
+        if not steps:
+            return False
+        step, action = steps.pop(0)
+        events.append((step, time.monotonic()))
+        action()
+        return True
+
+    GLib.timeout_add_seconds(WARMUP, loop.quit)
+    loop.run()
+    manager.latencies.clear()
+    frames_before = {num: counters[0] for num, counters in manager.telemetry.stream_counters.items()}
+    if steps:
+        GLib.timeout_add_seconds(EVENT_INTERVAL, run_event)
+        duration = EVENT_INTERVAL * (len(steps) + 1)
+    else:
+        duration = args.duration
+    GLib.timeout_add(int(duration * 1000), loop.quit)
+    wall_start = time.monotonic()
+    cpu_start = time.process_time()
+    loop.run()
+    cpu = time.process_time() - cpu_start
+    wall = time.monotonic() - wall_start
+
+    fps = {
+        str(num): round((counters[0] - frames_before.get(num, 0)) / wall, 2)
+        for num, counters in sorted(manager.telemetry.stream_counters.items())
+    }
+    report = {
+        'spec': spec,
+        'fps': fps,
+        'fps_min': min(fps.values()) if fps else None,
+        'latency_p50_ms': percentile(manager.latencies, 0.5),
+        'latency_p95_ms': percentile(manager.latencies, 0.95),
+        'latency_max_ms': percentile(manager.latencies, 1.0),
+        'cpu_percent': round(100 * cpu / wall, 2),
+        'rss_mb': rss_mb(),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    if events:
+        report['events'] = {
+            step: {str(num): downtime(arrivals, at - 0.5, at + EVENT_INTERVAL)
+                   for num, arrivals in sorted(manager.arrivals.items())}
+            for step, at in events
+        }
+        gaps = [gap for event in report['events'].values() for gap in event.values() if gap is not None]
+        report['downtime_max_ms'] = max(gaps) if gaps else None
+
+    if manager.pipeline:
+        manager.pipeline.set_state(Gst.State.NULL)
+    for server in servers:
+        server.stop()
+    return report
+
+
+def environment(args):
+    Gst.init(None)
+    return {
+        'gstreamer': Gst.version_string(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'profile': args.profile,
+        'sink': args.sink,
+        'device': args.device,
+        'duration': args.duration,
+    }
+
+
+def compare(report, baseline):
+    """List the metrics of report that regressed against baseline.
+
+    Returns:
+        List of dictionaries with scenario, metric, baseline and current values
+    """
+    regressions = []
+    for name, current in report['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous or 'error' in current or 'error' in previous:
+            continue
+        for metric, (tolerance, higher_is_better) in TOLERANCES.items():
+            old, new = previous.get(metric), current.get(metric)
+            if old is None or new is None or old == 0:
+                continue
+            change = (new - old) / abs(old)
+            if (change < -tolerance) if higher_is_better else (change > tolerance):
+                regressions.append({'scenario': name, 'metric': metric, 'baseline': old,
+                                    'current': new, 'change_percent': round(100 * change, 1)})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma-separated scenario names')
+    parser.add_argument('--profile', default='software', help='element profile')
+    parser.add_argument('--sink', choices=('fakesink', 'rtmp'), default='fakesink', help='output sinks')
+    parser.add_argument('--server-cmd', default=DEFAULT_SERVER_CMD, help='stand-in server command, {port} is substituted')
+    parser.add_argument('--device', default=None, help='V4L2 (e.g. v4l2loopback) device used as every camera')
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds measured per steady scenario')
+    parser.add_argument('--output', help='write the JSON report to this file')
+    parser.add_argument('--compare', help='earlier JSON report to check for regressions')
+    parser.add_argument('--run', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run:
+        # Child process: one scenario, report on stdout
+        print(json.dumps(run_scenario(args.run, args)))
+        return 0
+
+    forwarded = ['--profile', args.profile, '--sink', args.sink, '--server-cmd', args.server_cmd,
+                 '--duration', str(args.duration)]
+    if args.device:
+        forwarded += ['--device', args.device]
+    report = {'environment': environment(args), 'scenarios': {}}
+    for name in args.scenarios.split(','):
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario {name}, pick from {', '.join(SCENARIOS)}")
+        print(f"Running {name}...", file=sys.stderr)
+        result = subprocess.run([sys.executable, '-m', 'bondcam.bench.suite', '--run', name] + forwarded,
+                                stdout=subprocess.PIPE, text=True)
+        try:
+            report['scenarios'][name] = json.loads(result.stdout.strip().splitlines()[-1])
+        except (IndexError, ValueError):
+            report['scenarios'][name] = {'error': f'exit status {result.returncode}'}
+
+    status = 0
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            report['regressions'] = compare(report, json.load(baseline_file))
+        status = 1 if report['regressions'] else 0
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(text + '\n')
+    print(text)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
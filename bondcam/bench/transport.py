@@ -0,0 +1,374 @@
+"""Goodput of the RTMP, SRT and RIST outputs over a lossy loopback link.
+
+Streams one test pattern through StreamManager, once per transport and loss
+rate, each run in a process of its own, to a local receiver behind a lossy
+proxy:
+
+- SRT and RIST: a UDP relay dropping datagrams at random in both directions
+  and delaying the others, in front of a GStreamer srtsrc/ristsrc listener
+- RTMP: a TCP relay in front of a stand-in RTMP server (ffmpeg in listen mode
+  by default). A user-space relay cannot drop TCP segments, so each segment
+  it would have lost holds back the bytes behind it for one retransmission
+  timeout, like TCP's head-of-line blocking at its worst.
+
+``--netem`` leaves the relays lossless and has the kernel drop and delay
+packets on the loopback interface instead (``tc qdisc ... netem``, as root),
+which also exercises TCP's own loss recovery. Packets then cross the
+loopback twice, through the relay, and see the loss rate on each hop.
+
+Reports per run the goodput (bytes the receiver got, per second) next to the
+encoder bitrate, and the sink's RTT, retransmit and loss counters.
+
+Usage:
+    python -m bondcam.bench.transport --loss 0,1,2,5 --delay 25
+    sudo python -m bondcam.bench.transport --loss 0,1,2,5 --delay 25 --netem
+"""
+
+import gi
+gi.require_version('Gst', '1.0')
+
+import argparse
+import copy
+import heapq
+import itertools
+import json
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from gi.repository import GLib, Gst
+from bondcam.bench.reconnect import DEFAULT_SERVER_CMD, StandInServer
+from bondcam.streaming.elements import LATENCY_PROFILES
+from bondcam.streaming.manager import StreamManager
+from bondcam.streaming.transport import RIST, RTMP, SRT, sink_stats, transport_settings
+
+TRANSPORTS = (RTMP, SRT, RIST)
+
+SERVER_PORT = 1938
+
+# Seconds each run streams before goodput is measured, connection setup excluded
+WARMUP = 3
+
+# Payload of a TCP segment on a 1500 byte MTU
+SEGMENT_SIZE = 1448
+
+# Linux's minimum TCP retransmission timeout
+RETRANSMIT_TIMEOUT = 0.2
+
+
+class DelayLine:
+    """Sends datagrams or stream chunks once their due time has come, in order."""
+
+    def __init__(self):
+        self.pending = []
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+
+    def start(self):
+        threading.Thread(target=self._deliver, daemon=True).start()
+
+    def put(self, due, send, data):
+        with self.condition:
+            heapq.heappush(self.pending, (due, next(self.counter), send, data))
+            self.condition.notify()
+
+    def _deliver(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                wait = self.pending[0][0] - time.monotonic()
+                if wait > 0:
+                    self.condition.wait(wait)
+                    continue
+                due, order, send, data = heapq.heappop(self.pending)
+            try:
+                send(data)
+            except OSError:
+                pass
+
+
+class LossyUdpProxy:
+    """UDP relay between one client and a server port, dropping and delaying datagrams both ways."""
+
+    def __init__(self, port, upstream_port, loss, delay):
+        self.loss = loss
+        self.delay = delay
+        self.client = None
+        self.dropped = 0
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.listener.bind(('127.0.0.1', port))
+        self.upstream = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.upstream.connect(('127.0.0.1', upstream_port))
+        self.line = DelayLine()
+
+    def start(self):
+        self.line.start()
+        threading.Thread(target=self._relay, args=(True,), daemon=True).start()
+        threading.Thread(target=self._relay, args=(False,), daemon=True).start()
+
+    def _relay(self, from_client):
+        while True:
+            if from_client:
+                data, self.client = self.listener.recvfrom(65536)
+                send = self.upstream.send
+            else:
+                data = self.upstream.recv(65536)
+                if self.client is None:
+                    continue
+                client = self.client
+                send = lambda data: self.listener.sendto(data, client)
+            if random.random() < self.loss:
+                self.dropped += 1
+                continue
+            self.line.put(time.monotonic() + self.delay, send, data)
+
+
+class LossyTcpProxy:
+    """TCP relay to a server port, stalling the upload for a retransmission timeout per lost segment."""
+
+    def __init__(self, upstream_port, loss, delay):
+        self.upstream_port = upstream_port
+        self.loss = loss
+        self.delay = delay
+        self.forwarded = 0
+        self.stalls = 0
+        self.listener = socket.create_server(('127.0.0.1', 0))
+        self.port = self.listener.getsockname()[1]
+
+    def start(self):
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            client, _ = self.listener.accept()
+            try:
+                server = socket.create_connection(('127.0.0.1', self.upstream_port))
+            except OSError:
+                client.close()
+                continue
+            threading.Thread(target=self._pipe, args=(client, server, True), daemon=True).start()
+            threading.Thread(target=self._pipe, args=(server, client, False), daemon=True).start()
+
+    def _pipe(self, source, destination, upload):
+        line = DelayLine()
+        line.start()
+        last_due = 0.0
+
+        def send(data):
+            destination.sendall(data)
+            if upload:
+                self.forwarded += len(data)
+
+        try:
+            while True:
+                data = source.recv(SEGMENT_SIZE)
+                if not data:
+                    break
+                # Nothing overtakes a lost segment: everything behind it waits for the retransmission
+                due = max(time.monotonic() + self.delay, last_due)
+                if upload and random.random() < self.loss:
+                    self.stalls += 1
+                    due += RETRANSMIT_TIMEOUT
+                last_due = due
+                line.put(due, send, data)
+        except OSError:
+            pass
+        # Let the last chunks out before closing
+        time.sleep(max(0.0, last_due - time.monotonic()) + 0.1)
+        source.close()
+        destination.close()
+
+
+class TransportStreamManager(StreamManager):
+    """StreamManager streaming to local receivers."""
+
+    def is_network_available(self):
+        # The receivers are local
+        return True
+
+
+class Receiver:
+    """GStreamer SRT or RIST listener counting the bytes it delivers."""
+
+    def __init__(self, transport, port, latency):
+        if transport == SRT:
+            source = f"srtsrc uri=srt://127.0.0.1:{port}?mode=listener latency={latency}"
+        else:
+            source = f"ristsrc address=127.0.0.1 port={port} receiver-buffer={latency} ! rtpmp2tdepay"
+        self.pipeline = Gst.parse_launch(f"{source} ! fakesink name=sink sync=false async=false")
+        self.received = 0
+        self.pipeline.get_by_name('sink').get_static_pad('sink').add_probe(Gst.PadProbeType.BUFFER, self._count)
+
+    def _count(self, pad, info):
+        self.received += info.get_buffer().get_size()
+        return Gst.PadProbeReturn.OK
+
+    def start(self):
+        self.pipeline.set_state(Gst.State.PLAYING)
+
+    def stop(self):
+        self.pipeline.set_state(Gst.State.NULL)
+
+
+def free_udp_ports(count):
+    """Find count consecutive free UDP ports, the first one even as RIST needs."""
+    while True:
+        first = random.randrange(20000, 40000, 2)
+        sockets = []
+        try:
+            for port in range(first, first + count):
+                probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                sockets.append(probe)
+                probe.bind(('127.0.0.1', port))
+            return first
+        except OSError:
+            continue
+        finally:
+            for probe in sockets:
+                probe.close()
+
+
+def run_transport(transport, loss, args):
+    """Stream over one transport for args.duration seconds and measure the goodput."""
+    Gst.init(None)
+    loss_percent = loss
+    loss = 0.0 if args.netem else loss / 100
+    delay = 0.0 if args.netem else args.delay / 1000
+    channel = {
+        'bitrate': args.bitrate,
+        'resolution': {'width': 1280, 'height': 720},
+        'frameRate': 30,
+        'latencyProfile': 'balanced',
+    }
+    if args.latency:
+        channel['transport'] = {'latency': args.latency}
+    latency = transport_settings(channel, LATENCY_PROFILES['balanced'])['latency']
+
+    server = receiver = proxy = None
+    if transport == RTMP:
+        server = StandInServer(args.server_cmd, SERVER_PORT)
+        server.start()
+        proxy = LossyTcpProxy(SERVER_PORT, loss, delay)
+        proxy.start()
+        channel['streamEndpoint'] = f'rtmp://127.0.0.1:{proxy.port}/live/bench'
+    else:
+        # RIST sends RTCP on the port after the RTP one, relay both
+        ports = 2 if transport == RIST else 1
+        receiver_port, proxy_port = free_udp_ports(ports), free_udp_ports(ports)
+        receiver = Receiver(transport, receiver_port, latency)
+        receiver.start()
+        proxies = [LossyUdpProxy(proxy_port + offset, receiver_port + offset, loss, delay) for offset in range(ports)]
+        for relay in proxies:
+            relay.start()
+        proxy = proxies[0]
+        channel['streamEndpoint'] = f'{transport}://127.0.0.1:{proxy_port}'
+    time.sleep(1)
+
+    settings = {'isEnabled': True, 'videoStreams': [{'camera': None, 'channel': channel}], 'audioDevice': None}
+    manager = TransportStreamManager('Bench', lambda: copy.deepcopy(settings), args.profile)
+    loop = GLib.MainLoop()
+    if server:
+        GLib.timeout_add_seconds(1, server.keep_alive)
+
+    def delivered():
+        return proxy.forwarded if transport == RTMP else receiver.received
+
+    def encoded():
+        counters = manager.telemetry.stream_counters.get(1)
+        return counters[1] if counters else 0
+
+    marks = {}
+
+    def mark(name):
+        marks[name] = (time.monotonic(), delivered(), encoded())
+        if name == 'end':
+            loop.quit()
+        return False
+
+    GLib.timeout_add_seconds(WARMUP, mark, 'start')
+    GLib.timeout_add_seconds(WARMUP + int(args.duration), mark, 'end')
+    loop.run()
+
+    sink = manager.rtmp_sink_elements[0]
+    stats = sink_stats(sink) if sink else {}
+    state = manager.output_states[0]
+    if manager.pipeline:
+        manager.pipeline.set_state(Gst.State.NULL)
+    if receiver:
+        receiver.stop()
+    if server:
+        server.stop()
+
+    (started, delivered_start, encoded_start), (ended, delivered_end, encoded_end) = marks['start'], marks['end']
+    seconds = ended - started
+    return {
+        'transport': transport,
+        'loss_percent': loss_percent,
+        'goodput_kbps': round((delivered_end - delivered_start) * 8 / seconds / 1000),
+        'encoded_kbps': round((encoded_end - encoded_start) * 8 / seconds / 1000),
+        'rtt_ms': round(stats['rtt'] * 1000, 1) if stats.get('rtt') is not None else None,
+        'retransmitted': stats.get('retransmitted'),
+        'lost': stats.get('lost'),
+        'reconnects': state['reconnects'] if state else None,
+        'frames_lost': state['frames_lost'] if state else None,
+    }
+
+
+def set_netem(loss, delay):
+    subprocess.run(['tc', 'qdisc', 'del', 'dev', 'lo', 'root'], stderr=subprocess.DEVNULL)
+    if loss is not None:
+        subprocess.run(['tc', 'qdisc', 'add', 'dev', 'lo', 'root', 'netem', 'loss', f'{loss}%', 'delay', f'{delay}ms'],
+                       check=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server-cmd', default=DEFAULT_SERVER_CMD, help='stand-in RTMP server command, {port} is substituted')
+    parser.add_argument('--profile', default='software', help='element profile')
+    parser.add_argument('--transports', default=','.join(TRANSPORTS), help='comma-separated transports')
+    parser.add_argument('--loss', default='0,1,2,5', help='comma-separated packet loss rates, in percent')
+    parser.add_argument('--delay', type=int, default=25, help='one-way delay, in ms')
+    parser.add_argument('--bitrate', type=int, default=3000, help='channel bitrate, in Kbps')
+    parser.add_argument('--latency', type=int, default=None, help='SRT/RIST latency in ms (default: latency profile)')
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds measured per run')
+    parser.add_argument('--netem', action='store_true', help='drop and delay packets with tc netem on lo (root)')
+    parser.add_argument('--run', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run:
+        # Child process: one transport at one loss rate, report on stdout
+        transport, loss = args.run.split(':')
+        print(json.dumps(run_transport(transport, float(loss), args)))
+        return 0
+
+    forwarded = ['--server-cmd', args.server_cmd, '--profile', args.profile, '--delay', str(args.delay),
+                 '--bitrate', str(args.bitrate), '--duration', str(args.duration)]
+    if args.latency:
+        forwarded += ['--latency', str(args.latency)]
+    if args.netem:
+        forwarded.append('--netem')
+    results = []
+    try:
+        for loss in args.loss.split(','):
+            if args.netem:
+                set_netem(loss, args.delay)
+            for transport in args.transports.split(','):
+                result = subprocess.run([sys.executable, '-m', 'bondcam.bench.transport', '--run', f'{transport}:{loss}']
+                                        + forwarded, stdout=subprocess.PIPE, text=True)
+                try:
+                    results.append(json.loads(result.stdout.strip().splitlines()[-1]))
+                except (IndexError, ValueError):
+                    results.append({'transport': transport, 'loss_percent': float(loss),
+                                    'error': f'exit status {result.returncode}'})
+    finally:
+        if args.netem:
+            set_netem(None, None)
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -13,6 +13,25 @@ BACKEND_API = os.environ.get("BACKEND_API", "")
 GLOBAL_SETTINGS_API = f"{BACKEND_API}/settings" if BACKEND_API else ""
 DEVICE_BY_SERIAL_API = f"{BACKEND_API}/devices/serial" if BACKEND_API else ""
 
+# Server-sent events stream pushing device settings changes (empty disables it and keeps polling)
+SETTINGS_STREAM_API = os.environ.get("SETTINGS_STREAM_API", "")
+
+# GStreamer element profile ('rockchip' for the MPP hardware blocks, 'software' for stock plugins)
+ELEMENT_PROFILE = os.environ.get("ELEMENT_PROFILE", "rockchip")
+
+# Local DVR ring buffer: segment directory, backfill upload endpoint (empty disables uploads) and rate
+DVR_DIR = os.environ.get("DVR_DIR", os.path.expanduser("~/bondcam-dvr"))
+DVR_UPLOAD_API = os.environ.get("DVR_UPLOAD_API", "")
+DVR_UPLOAD_KBPS = int(os.environ.get("DVR_UPLOAD_KBPS", "2000"))
+
+# Local recordings of the streams with a 'record' channel setting
+RECORD_DIR = os.environ.get("RECORD_DIR", os.path.expanduser("~/bondcam-recordings"))
+
+# Pipeline metrics: host:port of the Prometheus-style endpoint (empty disables it),
+# and whether per-buffer element tracing starts enabled
+TELEMETRY_LISTEN = os.environ.get("TELEMETRY_LISTEN", "127.0.0.1:9101")
+TELEMETRY_TRACING = os.environ.get("TELEMETRY_TRACING", "0") == "1"
+
 def get_backend_api():
     """Get the backend API URL from environment."""
     return BACKEND_API
@@ -25,3 +44,34 @@ def get_device_by_serial_api():
     """Get the device by serial API endpoint."""
     return DEVICE_BY_SERIAL_API
 
+def get_settings_stream_api():
+    """Get the settings push stream URL."""
+    return SETTINGS_STREAM_API
+
+def get_element_profile():
+    """Get the GStreamer element profile name."""
+    return ELEMENT_PROFILE
+
+def get_dvr_dir():
+    """Get the directory the DVR ring buffer writes its segments to."""
+    return DVR_DIR
+
+def get_dvr_upload_api():
+    """Get the endpoint missed DVR segments are uploaded to."""
+    return DVR_UPLOAD_API
+
+def get_dvr_upload_kbps():
+    """Get the rate limit for DVR backfill uploads, in Kbps."""
+    return DVR_UPLOAD_KBPS
+
+def get_record_dir():
+    """Get the directory local recordings are written to."""
+    return RECORD_DIR
+
+def get_telemetry_listen():
+    """Get the host:port the metrics endpoint listens on, empty when disabled."""
+    return TELEMETRY_LISTEN
+
+def get_telemetry_tracing():
+    """Get whether per-buffer element tracing is enabled at startup."""
+    return TELEMETRY_TRACING
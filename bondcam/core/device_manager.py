@@ -1,42 +1,80 @@
 """Device state management"""
 
+import copy
+import time
 from datetime import datetime, timezone
 import subprocess
 import re
-from bondcam.api.client import update_device
-from bondcam.devices.video import list_cameras
-from bondcam.devices.audio import get_audio_devices
+from bondcam.api.client import SettingsStream, fetch_device_async, update_device_async
+from bondcam.config.settings import get_settings_stream_api
+from bondcam.devices.registry import get_device_registry
 from bondcam.utils.logger import get_logger
 
 logger = get_logger()
 
+# Seconds between pipeline metrics summaries carried by the heartbeat
+TELEMETRY_HEARTBEAT_INTERVAL = 60
+
 
 class DeviceManager:
     """Manages device state and operations"""
     
-    def __init__(self, serial: str):
+    def __init__(self, serial: str, registry=None):
         """Initialize DeviceManager with device serial number.
         
         Args:
             serial: The device serial number
+            registry: DeviceRegistry of the connected devices, defaults to the shared one
         """
         self.serial = serial
+        self.registry = registry or get_device_registry()
+        self.registry.add_listener(self._notify_settings_listeners)
+        self._resolved = None  # (settings version, resolved stream settings)
         self._device_info = None
+        self._etag = None
+        self._sent_devices = None  # Last connectedDevices the backend acknowledged
+        self._inventory = None  # connectedDevices of the last heartbeat
+        self._settings_version = 0
+        self._settings_listeners = []
+        self._settings_stream = None
+        self._telemetry_source = None
+        self._telemetry_sent_at = None
     
     def get_serial_number(self) -> str:
         """Get the device serial number."""
         return self.serial
+
+    def start_settings_stream(self):
+        """Receive device updates pushed by the backend, if SETTINGS_STREAM_API is set.
+
+        While the stream is connected the heartbeat stops fetching the device.
+        """
+        if not get_settings_stream_api():
+            return
+        self._settings_stream = SettingsStream(self.serial, self._on_pushed_device, self._on_stream_state)
+        self._settings_stream.start()
+
+    def set_telemetry_source(self, source):
+        """Add the summary returned by source() to a heartbeat every TELEMETRY_HEARTBEAT_INTERVAL."""
+        self._telemetry_source = source
+
+    def add_settings_listener(self, callback):
+        """Register a callback() called on the main loop when the stream settings may have changed."""
+        self._settings_listeners.append(callback)
     
-    def update_device_info(self) -> dict:
-        """Update device info by scanning devices and sending to API.
-        
-        Returns:
-            Updated device_info dictionary
+    def update_device_info(self):
+        """Send the heartbeat and refresh the device info in the background.
+
+        The heartbeat only carries lastOnlineAt, plus connectedDevices when the
+        set of devices changed since the backend last acknowledged it and a
+        pipeline metrics summary once a minute. The device
+        info is fetched with If-None-Match, so the backend answers 304 Not
+        Modified when nothing changed.
         """
         # Build connected_devices list
         connected_devices = []
 
-        cameras = list_cameras()
+        cameras = self.registry.cameras()
         for camera in cameras:
             connected_devices.append(
                 {
@@ -45,7 +83,7 @@ class DeviceManager:
                     'path': camera['path']
                 }
             )
-        audio_devices = get_audio_devices()
+        audio_devices = self.registry.audio_devices()
         for audio_device in audio_devices:
             connected_devices.append(
                 {
@@ -56,12 +94,55 @@ class DeviceManager:
             )
         current_time = datetime.now(timezone.utc).isoformat()
         # Send device info to the integration endpoint
-        data = {
-            "connectedDevices": connected_devices,
-            "lastOnlineAt": current_time
-        }
-        self._device_info = update_device(self.serial, data)
-        return self._device_info
+        data = {"lastOnlineAt": current_time}
+        if connected_devices != self._sent_devices:
+            data["connectedDevices"] = connected_devices
+        if connected_devices != self._inventory:
+            # Stream settings resolve names against the connected devices. Only a change
+            # counts, an inventory still waiting for its acknowledgement is no new one.
+            self._inventory = connected_devices
+            self._settings_version += 1
+        now = time.monotonic()
+        if self._telemetry_source and (self._telemetry_sent_at is None
+                                       or now - self._telemetry_sent_at >= TELEMETRY_HEARTBEAT_INTERVAL):
+            data["telemetry"] = self._telemetry_source()
+            self._telemetry_sent_at = now
+        update_device_async(self.serial, data, lambda device_info: self._on_heartbeat(data, device_info))
+        if self._settings_stream is None or not self._settings_stream.connected:
+            fetch_device_async(self.serial, self._etag, self._on_device_info)
+
+    def _on_heartbeat(self, data, device_info):
+        # Only an acknowledged inventory counts as sent, a failed one is sent again
+        if device_info is not None and "connectedDevices" in data:
+            self._sent_devices = data["connectedDevices"]
+
+    def _on_device_info(self, device_info, etag):
+        # None when unchanged (304) or when the backend is unreachable
+        if device_info is None:
+            return
+        self._etag = etag
+        # Backends without ETag support answer 200 every time, compare the content
+        if device_info != self._device_info:
+            self._device_info = device_info
+            self._settings_version += 1
+            self._notify_settings_listeners()
+
+    def _notify_settings_listeners(self):
+        for callback in self._settings_listeners:
+            callback()
+
+    def _on_pushed_device(self, device_info):
+        # The ETag belongs to the last polled response, not to pushed state
+        self._on_device_info(device_info, None)
+
+    def _on_stream_state(self, connected):
+        # Catch up on changes pushed while the stream was down
+        if connected:
+            fetch_device_async(self.serial, self._etag, self._on_device_info)
+
+    def get_settings_version(self) -> tuple:
+        """Get a version that changes whenever get_stream_settings() may return something new."""
+        return (self._settings_version, self.registry.version)
     
     def get_device_info(self) -> dict:
         """Get current device info.
@@ -73,54 +154,22 @@ class DeviceManager:
     
     def get_stream_settings(self) -> dict:
         """Get stream settings with device paths resolved.
-        
+
+        The resolved view is cached until the device info or the connected
+        devices change. The cached device info keeps the device names.
+
         Returns:
             Stream settings dictionary with resolved device paths
         """
-        if self._device_info is not None:
-            stream_settings = self._device_info.get('streamSettings', {})
-            
-            # Build stream settings by replacing device names with paths
-            connected_cameras = list_cameras()
-            connected_audio = get_audio_devices()
-            
-            # Keep track of how many times we've seen each camera name
-            camera_indices = {}
-            
-            # Replace camera names with their device paths in stream settings
-            for stream in stream_settings.get('videoStreams', []):
-                camera_name = stream['camera']
-                # Initialize index counter for this camera name if not exists
-                if camera_name not in camera_indices:
-                    camera_indices[camera_name] = 0
-                    
-                # Find all cameras with matching name
-                matching_cameras = [
-                    cam for cam in connected_cameras 
-                    if cam['name'] == camera_name
-                ]
-                
-                # Get the camera at current index if available
-                if camera_indices[camera_name] < len(matching_cameras):
-                    stream['camera'] = matching_cameras[camera_indices[camera_name]]['path']
-                    camera_indices[camera_name] += 1
-                else:
-                    stream['camera'] = None
-                    
-            # Replace audio device name with its device path
-            audio_device = stream_settings.get('audioDevice')
-            matched_audio = None
-            for audio in connected_audio:
-                if audio['name'] == audio_device:
-                    matched_audio = audio['path']
-                    break
-            stream_settings['audioDevice'] = matched_audio
-
-            return stream_settings
-            
-        else:
+        if self._device_info is None:
             return {}
-    
+        version = self.get_settings_version()
+        if self._resolved is None or self._resolved[0] != version:
+            stream_settings = self._device_info.get('streamSettings', {})
+            self._resolved = (version, self.registry.resolve(stream_settings))
+        # Callers keep and compare what they get, hand out a copy
+        return copy.deepcopy(self._resolved[1])
+
     def check_for_reboot(self) -> bool:
         """Check if device should reboot.
         
@@ -131,14 +180,24 @@ class DeviceManager:
             requires_reboot = self._device_info.get('requiresReboot')
             if requires_reboot:
                 logger.info("Rebooting device")
-                # Reset requiresReboot to False
-                update_device(self._device_info['serial'], {'requiresReboot': False})
-                # Reboot the device
-                subprocess.run(["systemctl", "reboot"])
+                # Reset requiresReboot to False, then reboot once the backend acknowledged it.
+                # Cleared locally meanwhile so the next ticks do not send it again.
+                self._device_info['requiresReboot'] = False
+                update_device_async(self._device_info['serial'], {'requiresReboot': False}, self._reboot)
                 return True
         return False
 
 
+    def _reboot(self, device_info):
+        if device_info is None:
+            # Rebooting now would find requiresReboot still set on the backend and reboot again
+            logger.error("Could not clear requiresReboot on the backend, reboot postponed")
+            if self._device_info is not None:
+                self._device_info['requiresReboot'] = True
+            return
+        subprocess.run(["systemctl", "reboot"])
+
+
 def get_serial_number():
     """Fetches the CPU serial number from /proc/cpuinfo.
     
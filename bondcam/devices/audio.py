@@ -1,21 +1,118 @@
-"""Audio device utilities for listing and managing audio devices."""
+"""Audio device utilities for listing and managing audio devices.
 
-import subprocess
+Capture devices are read from the ALSA procfs tree, without running arecord.
+Listings are cached by the DeviceRegistry and refreshed on udev sound events.
+"""
 
-def get_audio_devices():
-    """List all available audio devices."""
-    cmd_devices = """arecord -l | grep card"""
-    devicesstr = subprocess.run(["bash", "-c", cmd_devices], stdout=subprocess.PIPE)
-    device_list = devicesstr.stdout.decode('utf-8')
-    devices = []
-    for d in device_list.split('\n'):
-        if len(d) > 0:
-            d_name = d.split(':')[1].strip().split(' ')[0]
-            d_address = f"hw:{d.split(':')[0].split(' ')[-1]},0"
-            devices.append({
-                'name': d_name,
-                'path': d_address
-            })
+import os
+import re
+from bondcam.utils.logger import get_logger
 
-    return devices
+logger = get_logger()
+
+ASOUND_ROOT = '/proc/asound'
+
+# " 1 [USB            ]: USB-Audio - USB Audio Device"
+CARD_LINE = re.compile(r'^\s*(\d+)\s+\[(.*?)\s*\]:')
+
+# "01-00: USB Audio : USB Audio : capture 1"
+PCM_LINE = re.compile(r'^(\d+)-(\d+):')
+
+# "8000 - 96000 (continuous)"
+RATE_RANGE = re.compile(r'(\d+)\s*-\s*(\d+)')
+
+# Sample rates a continuous range is listed as
+STANDARD_RATES = (8000, 11025, 16000, 22050, 32000, 44100, 48000, 88200, 96000, 176400, 192000)
+
+
+def read_file(path):
+    """Read a procfs file, or None if it does not exist."""
+    try:
+        with open(path) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def list_cards(root=ASOUND_ROOT):
+    """Get the ALSA cards by number.
+
+    Returns:
+        Dictionary mapping card numbers to card ids
+    """
+    cards = {}
+    for line in (read_file(os.path.join(root, 'cards')) or '').splitlines():
+        match = CARD_LINE.match(line)
+        if match:
+            cards[int(match.group(1))] = match.group(2)
+    return cards
 
+
+def list_capture_pcms(root=ASOUND_ROOT):
+    """Get the (card, device) numbers of the PCM devices that can capture."""
+    pcms = []
+    for line in (read_file(os.path.join(root, 'pcm')) or '').splitlines():
+        match = PCM_LINE.match(line)
+        fields = [field.strip() for field in line.split(':')]
+        if match and any(field.startswith('capture') for field in fields):
+            pcms.append((int(match.group(1)), int(match.group(2))))
+    return pcms
+
+
+def capture_capabilities(card, root=ASOUND_ROOT):
+    """Get the capture channels and sample rates a card advertises.
+
+    Only USB audio cards describe their formats in procfs (card{N}/stream0);
+    other cards only report them while open, so their lists are empty.
+    A continuous range of rates is listed as the standard rates within it.
+
+    Returns:
+        Dictionary with sorted 'channels' and 'rates' lists
+    """
+    channels = set()
+    rates = set()
+    text = read_file(os.path.join(root, f'card{card}', 'stream0')) or ''
+    capture = text.partition('Capture:')[2]
+    for line in capture.splitlines():
+        line = line.strip()
+        if line.startswith('Playback:'):
+            break
+        key, _, value = line.partition(':')
+        if key == 'Channels':
+            channels.add(int(value))
+        elif key == 'Rates':
+            # "48000, 44100" or a range like "8000 - 48000 (continuous)"
+            match = RATE_RANGE.search(value)
+            if match:
+                low, high = int(match.group(1)), int(match.group(2))
+                rates.update(rate for rate in STANDARD_RATES if low <= rate <= high)
+            else:
+                rates.update(int(rate) for rate in re.findall(r'\d+', value))
+    return {'channels': sorted(channels), 'rates': sorted(rates)}
+
+
+def get_audio_devices(root=ASOUND_ROOT):
+    """List all available audio capture devices.
+
+    Args:
+        root: ALSA procfs directory
+
+    Returns:
+        List of dictionaries with name (the card id, as shown by arecord -l),
+        path (the hw:CARD,DEVICE address), channels and rates
+    """
+    cards = list_cards(root)
+    devices = []
+    capabilities = {}
+    for card, device in list_capture_pcms(root):
+        if card not in cards:
+            continue
+        if card not in capabilities:
+            capabilities[card] = capture_capabilities(card, root)
+        devices.append({
+            'name': cards[card],
+            'path': f"hw:{card},{device}",
+            'channels': capabilities[card]['channels'],
+            'rates': capabilities[card]['rates'],
+        })
+    return devices
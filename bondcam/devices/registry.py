@@ -0,0 +1,221 @@
+"""Cached registry of the connected cameras and audio devices.
+
+Enumeration results are kept in memory and only refreshed when udev reports a
+change: cameras through the CameraIndex, audio devices through a monitor on
+the ``sound`` subsystem. Name -> paths indexes make resolving the device names
+of the stream settings a dictionary lookup per stream.
+"""
+
+import copy
+import pyudev
+from gi.repository import GLib
+from bondcam.devices.audio import get_audio_devices
+from bondcam.devices.video import list_cameras
+from bondcam.utils.logger import get_logger
+
+logger = get_logger()
+
+_registry = None
+
+
+class DeviceRegistry:
+    """Connected devices, with name indexes and a version that moves on every change."""
+
+    def __init__(self, camera_index=None, context=None):
+        """Initialize DeviceRegistry.
+
+        Args:
+            camera_index: CameraIndex to follow, cameras are enumerated on demand without one
+            context: pyudev Context for the sound monitor
+        """
+        self.camera_index = camera_index
+        self.context = context
+        self.version = 0
+        self.monitor = None
+        self.watch_source = None
+        self._cameras = None
+        self._audio = None
+        self._camera_paths = None
+        self._audio_paths = None
+        self.listeners = []
+        if camera_index is not None:
+            camera_index.add_listener(self._on_camera_event)
+
+    def start(self, monitor=None):
+        """Follow ALSA changes through udev from the GLib main loop.
+
+        Args:
+            monitor: pyudev Monitor to read events from, defaults to a netlink monitor
+        """
+        self.context = self.context or pyudev.Context()
+        self.monitor = monitor or pyudev.Monitor.from_netlink(self.context)
+        self.monitor.filter_by('sound')
+        self.monitor.start()
+        self.watch_source = GLib.io_add_watch(self.monitor.fileno(), GLib.PRIORITY_DEFAULT,
+                                              GLib.IO_IN, self._on_monitor_readable)
+
+    def add_listener(self, callback):
+        """Register a callback() called when the set of devices changed."""
+        self.listeners.append(callback)
+
+    def _on_monitor_readable(self, fd, condition):
+        changed = False
+        while True:
+            device = self.monitor.poll(timeout=0)
+            if device is None:
+                break
+            # A sound card appearing or going away also adds/removes its control device
+            if device.action in ('add', 'remove'):
+                changed = True
+        if changed:
+            self.invalidate_audio()
+        return True
+
+    def _on_camera_event(self, action, camera):
+        self.invalidate_cameras()
+
+    def invalidate_cameras(self):
+        """Drop the cached cameras, they are listed again on next use."""
+        self._cameras = None
+        self._camera_paths = None
+        self._changed()
+
+    def invalidate_audio(self):
+        """Drop the cached audio devices, they are listed again on next use."""
+        self._audio = None
+        self._audio_paths = None
+        self._changed()
+
+    def _changed(self):
+        self.version += 1
+        for callback in self.listeners:
+            callback()
+
+    def cameras(self):
+        """List the connected cameras, in the same format as list_cameras()."""
+        # Without a camera index nothing invalidates the cache, enumerate every time
+        if self.camera_index is None:
+            self._cameras = list_cameras()
+            self._camera_paths = None
+        elif self._cameras is None:
+            self._cameras = self.camera_index.cameras()
+            self._camera_paths = None
+        return self._cameras
+
+    def audio_devices(self):
+        """List the connected audio devices, in the same format as get_audio_devices()."""
+        if self._audio is None or self.monitor is None:
+            self._audio = get_audio_devices()
+            self._audio_paths = None
+        return self._audio
+
+    def camera_paths(self):
+        """Get the camera paths by name, in enumeration order."""
+        cameras = self.cameras()
+        if self._camera_paths is None:
+            self._camera_paths = {}
+            for camera in cameras:
+                self._camera_paths.setdefault(camera['name'], []).append(camera['path'])
+        return self._camera_paths
+
+    def audio_paths(self):
+        """Get the path of the first audio device with each name."""
+        devices = self.audio_devices()
+        if self._audio_paths is None:
+            self._audio_paths = {}
+            for device in devices:
+                self._audio_paths.setdefault(device['name'], device['path'])
+        return self._audio_paths
+
+    def resolve(self, stream_settings):
+        """Get a copy of stream settings with device names replaced by their paths.
+
+        Streams naming the same camera get its devices in order, backup cameras
+        after every main camera; names without a connected device resolve to None.
+        The cameras of a composite resolve to the devices streams already show,
+        a name listed twice to its first two devices.
+
+        Args:
+            stream_settings: Stream settings as sent by the backend, left untouched
+
+        Returns:
+            Resolved stream settings dictionary
+        """
+        resolved = copy.deepcopy(stream_settings)
+        camera_paths = self.camera_paths()
+        used = {}
+        for stream in resolved.get('videoStreams', []):
+            if 'cameras' in stream:
+                stream['cameras'] = self.resolve_composite(stream['cameras'] or [], camera_paths)
+                continue
+            camera_name = stream['camera']
+            index = used.get(camera_name, 0)
+            paths = camera_paths.get(camera_name, ())
+            if index < len(paths):
+                stream['camera'] = paths[index]
+                used[camera_name] = index + 1
+            else:
+                stream['camera'] = None
+        # Backup cameras take the devices left over once every stream got its main camera
+        for stream in resolved.get('videoStreams', []):
+            backups = []
+            for camera_name in stream.get('backupCameras') or []:
+                index = used.get(camera_name, 0)
+                paths = camera_paths.get(camera_name, ())
+                if index < len(paths):
+                    backups.append(paths[index])
+                    used[camera_name] = index + 1
+                else:
+                    backups.append(None)
+            if 'backupCameras' in stream:
+                stream['backupCameras'] = backups
+        audio_paths = self.audio_paths()
+        resolved['audioDevice'] = self.resolve_audio(resolved.get('audioDevice'), audio_paths)
+        # Streams, and each of their renditions, may pick their own audio device, or several to mix
+        for stream in resolved.get('videoStreams', []):
+            channel = stream.get('channel', {})
+            for settings in [channel] + (channel.get('renditions') or []):
+                if 'audioDevice' in settings:
+                    settings['audioDevice'] = self.resolve_audio(settings['audioDevice'], audio_paths)
+                if 'audioDevices' in settings:
+                    settings['audioDevices'] = [self.resolve_audio(name, audio_paths) for name in settings['audioDevices'] or []]
+        return resolved
+
+    def resolve_composite(self, names, camera_paths):
+        """Get the paths of a composite's cameras, None for the ones not connected."""
+        paths = []
+        seen = {}
+        for name in names:
+            index = seen.get(name, 0)
+            seen[name] = index + 1
+            devices = camera_paths.get(name, ())
+            paths.append(devices[index] if index < len(devices) else None)
+        return paths
+
+    def resolve_audio(self, name, audio_paths):
+        """Get the path of an audio device name, None (silence) when it is not connected."""
+        path = audio_paths.get(name)
+        if name and path is None:
+            logger.warning(f"Audio device '{name}' is not connected, streaming silence instead")
+        return path
+
+
+def start_device_registry(camera_index, context=None, monitor=None):
+    """Start the shared registry following camera_index and ALSA udev events.
+
+    Returns:
+        The DeviceRegistry
+    """
+    global _registry
+    if _registry is None or _registry.monitor is None:
+        _registry = DeviceRegistry(camera_index, context)
+        _registry.start(monitor)
+    return _registry
+
+
+def get_device_registry():
+    """Get the shared registry, or a registry enumerating on demand if none was started."""
+    global _registry
+    if _registry is None:
+        _registry = DeviceRegistry()
+    return _registry
@@ -1,36 +1,186 @@
 """Video device utilities for listing and managing cameras."""
 
 import pyudev
+from gi.repository import GLib
+from bondcam.utils.logger import get_logger
+
+logger = get_logger()
+
+# Index kept up to date by the udev monitor, None until start_camera_monitor() is called
+_camera_index = None
+
+
+class CameraIndex:
+    """In-memory index of the connected cameras, kept up to date by udev events.
+
+    A camera exposes several video4linux nodes (capture, metadata, ...) that
+    share its ID_PATH. Cameras are keyed by ID_PATH, falling back to the sysfs
+    path for devices without one, and use their lowest numbered capture node.
+    The nodes of a camera appear in any order, so its path may change as they
+    do, which is reported as a 'change'.
+    """
+
+    def __init__(self, context=None):
+        """Initialize CameraIndex.
+
+        Args:
+            context: pyudev Context, a new one is created by default
+        """
+        self.context = context or pyudev.Context()
+        self.devices = {}  # key -> {'model': ..., 'nodes': {sys_path: (not capture, number, device_node)}}
+        self.listeners = []
+        self.monitor = None
+        self.watch_source = None
+        self.enumerations = 0
+
+    def refresh(self):
+        """Rebuild the index by enumerating every video4linux device."""
+        self.devices = {}
+        for device in self.context.list_devices(subsystem='video4linux'):
+            self._add_device(device)
+        self.enumerations += 1
+
+    def start(self, monitor=None):
+        """Enumerate the cameras once, then follow udev events from the GLib main loop.
+
+        Args:
+            monitor: pyudev Monitor to read events from, defaults to a netlink monitor
+        """
+        self.refresh()
+        self.monitor = monitor or pyudev.Monitor.from_netlink(self.context)
+        self.monitor.filter_by('video4linux')
+        self.monitor.start()
+        self.watch_source = GLib.io_add_watch(self.monitor.fileno(), GLib.PRIORITY_DEFAULT,
+                                              GLib.IO_IN, self._on_monitor_readable)
+
+    def stop(self):
+        """Stop following udev events."""
+        if self.watch_source:
+            GLib.source_remove(self.watch_source)
+            self.watch_source = None
+        self.monitor = None
+
+    def add_listener(self, callback):
+        """Register a callback(action, camera) called when a camera is added, removed or changes path."""
+        self.listeners.append(callback)
+
+    def _on_monitor_readable(self, fd, condition):
+        # Drain every pending event without blocking the main loop
+        while True:
+            device = self.monitor.poll(timeout=0)
+            if device is None:
+                return True
+            self.handle_event(device.action, device)
+
+    def handle_event(self, action, device):
+        """Apply one udev event to the index and notify the listeners.
+
+        Args:
+            action: udev action ('add', 'remove', 'change', ...)
+            device: pyudev Device the event is about
+        """
+        if action == 'add':
+            event = self._add_device(device)
+        elif action == 'remove':
+            event = self._remove_device(device)
+        else:
+            return
+        if event is None:
+            return
+        action, camera = event
+        logger.info(f"Camera {action}: {camera['name']} at {camera['path']}")
+        for callback in self.listeners:
+            try:
+                callback(action, camera)
+            except Exception as e:
+                logger.error(f"Error in camera {action} listener: {e}")
+
+    def _add_device(self, device):
+        # Returns (action, camera) when this node made a camera appear or changed its path
+        if 'DEVNAME' not in device:
+            return None
+        key = device.get('ID_PATH', '') or device.sys_path
+        entry = self.devices.get(key)
+        if entry is None:
+            entry = {'id_path': device.get('ID_PATH', ''), 'model': device.get('ID_MODEL', 'Unknown'), 'nodes': {}}
+            self.devices[key] = entry
+            previous = None
+        else:
+            previous = camera_info(entry)['path']
+        entry['nodes'][device.sys_path] = (not is_capture(device), node_number(device), device.device_node)
+        camera = camera_info(entry)
+        if previous is None:
+            return 'add', camera
+        return ('change', camera) if camera['path'] != previous else None
+
+    def _remove_device(self, device):
+        # Returns (action, camera) when its last node went away or its path changed
+        key = device.get('ID_PATH', '') or device.sys_path
+        entry = self.devices.get(key)
+        if entry is None or device.sys_path not in entry['nodes']:
+            return None
+        previous = camera_info(entry)['path']
+        del entry['nodes'][device.sys_path]
+        if not entry['nodes']:
+            del self.devices[key]
+            return 'remove', {'name': camera_name(entry), 'path': previous}
+        camera = camera_info(entry)
+        return ('change', camera) if camera['path'] != previous else None
+
+    def cameras(self):
+        """List the indexed cameras, in the same format as list_cameras()."""
+        return [camera_info(entry) for entry in self.devices.values()]
+
+
+def node_number(device):
+    """Get the number of a video4linux node (N in /dev/videoN)."""
+    try:
+        return int(device.sys_number)
+    except (TypeError, ValueError):
+        return 0
+
+
+def is_capture(device):
+    """Check whether a video4linux node captures video, rather than metadata or output."""
+    return ':capture:' in device.get('ID_V4L_CAPABILITIES', '')
+
+
+def camera_name(entry):
+    """Get the display name of an index entry."""
+    if entry['id_path']:
+        return f"{entry['model']} ({entry['id_path']})"
+    return entry['model']
+
+
+def camera_info(entry):
+    """Get the camera dictionary of an index entry."""
+    # Capture nodes first, then the lowest numbered
+    _, _, path = min(entry['nodes'].values())
+    return {"name": camera_name(entry), "path": path}
+
+
+def start_camera_monitor(context=None, monitor=None):
+    """Start the shared camera index, so list_cameras() stops enumerating devices.
+
+    Returns:
+        The CameraIndex
+    """
+    global _camera_index
+    if _camera_index is None:
+        _camera_index = CameraIndex(context)
+        _camera_index.start(monitor)
+    return _camera_index
+
+
+def get_camera_index():
+    """Get the shared camera index, or None if the monitor was not started."""
+    return _camera_index
+
 
 def list_cameras():
     """List all available video cameras."""
-    context = pyudev.Context()
-    cameras = []
-    seen_devices = {}
-    
-    for device in context.list_devices(subsystem='video4linux'):
-        if 'DEVNAME' in device:
-            video_path = device.device_node
-
-            # Get the unique physical path of the device
-            id_path = device.get('ID_PATH', '')
-            model = device.get('ID_MODEL', 'Unknown')
-
-            if id_path and id_path not in seen_devices:
-                seen_devices[id_path] = video_path
-                cameras.append({
-                    "name": f"{model} ({id_path})",
-                    "path": video_path
-                })
-            elif not id_path:
-                # Fallback for devices without ID_PATH
-                unique_id = device.sys_path
-                if unique_id not in seen_devices:
-                    seen_devices[unique_id] = video_path
-                    cameras.append({
-                        "name": model,
-                        "path": video_path
-                    })
-
-    return cameras
-
+    if _camera_index is not None:
+        return _camera_index.cameras()
+    index = CameraIndex()
+    index.refresh()
+    return index.cameras()
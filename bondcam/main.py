@@ -1,18 +1,25 @@
 #!/usr/bin/env python3
 """Main entry point for Bondcam streaming application."""
 
-from bondcam.api.client import get_global_settings
+from bondcam.api.client import get_global_settings, get_traffic_stats
+from bondcam.config.settings import get_telemetry_listen
 from bondcam.core.device_manager import DeviceManager, get_serial_number
+from bondcam.devices.registry import start_device_registry
+from bondcam.devices.video import start_camera_monitor
+from bondcam.network.bonding import start_link_monitor
 from bondcam.network.manager import NetworkManager
 from bondcam.streaming.manager import StreamManager
+from bondcam.streaming.telemetry import MetricsServer
 from bondcam.utils.logger import get_logger
 from gi.repository import GLib
 import sys
-import time
 import traceback
 
 logger = get_logger()
 
+# Seconds between reports of the backend traffic counters
+TRAFFIC_LOG_INTERVAL = 3600
+
 
 def main(args):
     """Main application entry point."""
@@ -20,12 +27,20 @@ def main(args):
         # Get device serial number
         serial = get_serial_number()
 
+        # Follow camera hotplug events instead of enumerating devices on every check
+        camera_index = start_camera_monitor()
+        start_device_registry(camera_index)
+
         # Initialize DeviceManager
         device_manager = DeviceManager(serial)
+        device_manager.start_settings_stream()
 
         # Initialize NetworkManager
         network_manager = NetworkManager()
 
+        # Follow the connected uplinks that bonded streams are striped over
+        start_link_monitor(network_manager.get_active_links)
+
         # Fetch global settings
         global_settings = get_global_settings()
         if global_settings:
@@ -48,6 +63,13 @@ def main(args):
 
         GLib.timeout_add_seconds(check_settings_every, run_periodic_tasks)
 
+        # Report the backend traffic, to follow the bandwidth used per device per day
+        def log_traffic_stats():
+            logger.info(f"Backend traffic: {get_traffic_stats()}")
+            return True
+
+        GLib.timeout_add_seconds(TRAFFIC_LOG_INTERVAL, log_traffic_stats)
+
         # Start initial tasks immediately
         run_periodic_tasks()
 
@@ -56,9 +78,10 @@ def main(args):
             if global_settings is None:
                 return 1
 
-            # Ensure device_info is populated
+            # Ensure device_info is populated, running the main loop so the
+            # background device update can deliver its result
             if device_manager.get_device_info() is None:
-                time.sleep(1)
+                GLib.MainContext.default().iteration(True)
                 continue
 
             logger.info("Starting streaming process")
@@ -66,7 +89,19 @@ def main(args):
 
         # Create and run the output connector
         # Pass DeviceManager's get_stream_settings method as the callable
-        stream_manager = StreamManager('Bondcam', device_manager.get_stream_settings)
+        stream_manager = StreamManager('Bondcam', device_manager.get_stream_settings,
+                                       get_settings_version=device_manager.get_settings_version)
+        # Called after the device registry, whose change re-resolves the stream settings first
+        camera_index.add_listener(stream_manager.on_camera_event)
+        device_manager.add_settings_listener(stream_manager.check_stream_info)
+
+        # Pipeline metrics for local scraping and the heartbeat
+        device_manager.set_telemetry_source(stream_manager.telemetry.summary)
+        if get_telemetry_listen():
+            try:
+                MetricsServer(stream_manager.telemetry, get_telemetry_listen(), stream_manager.set_tracing).start()
+            except OSError as e:
+                logger.error(f"Failed to start the metrics endpoint on {get_telemetry_listen()}: {e}")
         stream_manager.run_pipeline()
 
         return 0
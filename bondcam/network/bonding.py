@@ -0,0 +1,555 @@
+"""Network bonding: one SRT stream striped across every connected uplink.
+
+A stream whose channel has ``"bonding": {"enabled": true, "receiver": "host:port"}``
+sends its SRT output to a LinkBonder on the loopback interface instead of the
+endpoint. The bonder stripes the datagrams over one socket per uplink (WiFi,
+Ethernet, cellular), each bound to its interface, to a BondReceiver running
+next to the SRT server. The receiver puts the datagrams back in order and
+hands them to the server from a single socket, so SRT sees one ordinary peer
+and recovers whatever the links lost. The server's replies go back over every
+link.
+
+Each link is probed continuously for its round trip time, delivered
+throughput and loss. Its share of the traffic grows while it delivers
+everything without queueing, and halves when it loses packets or its round
+trip time inflates, so the traffic settles in proportion to what each link
+carries. A link that stops answering gets nothing until it answers again.
+
+Sockets are bound to their interface with SO_BINDTODEVICE, which needs root or
+CAP_NET_RAW. Without it they are bound to the interface's address, and the
+links only leave through their own interfaces with source-based policy
+routing.
+
+The receiver runs on the ingest side as::
+
+    python -m bondcam.network.bonding --listen 0.0.0.0:9001 --forward 127.0.0.1:9000
+"""
+
+import argparse
+import fcntl
+import itertools
+import selectors
+import socket
+import struct
+import sys
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit
+from bondcam.utils.logger import get_logger
+
+logger = get_logger()
+
+# Header of every bonded datagram: magic, type, link id, sequence number
+HEADER = struct.Struct('!2sBBI')
+MAGIC = b'BC'
+DATA = 0
+PROBE = 1
+PROBE_REPLY = 2
+
+# Probe payload: sender time; the reply adds the bytes and packets received on the link
+PROBE_PAYLOAD = struct.Struct('!d')
+REPLY_PAYLOAD = struct.Struct('!dQQ')
+
+SEQUENCE_MASK = 0xFFFFFFFF
+
+# Seconds between probes of each link
+PROBE_INTERVAL = 0.5
+
+# Seconds without a probe reply before a link is considered down
+LINK_TIMEOUT = 2.0
+
+# Seconds between refreshes of the list of connected interfaces
+LINK_REFRESH_INTERVAL = 10
+
+# Link weights: starting point, bounds, and the AIMD steps applied at each probe reply
+INITIAL_WEIGHT = 10.0
+MIN_WEIGHT = 1.0
+MAX_WEIGHT = 100.0
+WEIGHT_INCREASE = 1.0
+WEIGHT_DECREASE = 0.5
+
+# Loss ratio, and round trip time over the link's lowest plus a slack, marking a congested link
+LOSS_THRESHOLD = 0.05
+RTT_INFLATION = 2.0
+RTT_SLACK = 0.01
+
+# Weight of a new round trip time sample in the smoothed value
+RTT_SMOOTHING = 0.125
+
+# Seconds the receiver holds datagrams behind a gap, waiting for the missing one from a slower link
+REORDER_TIMEOUT = 0.08
+
+# Datagrams the receiver holds behind a gap before giving up on it
+MAX_HELD = 2048
+
+# A datagram this far behind the expected one means the sender started over
+RESYNC_GAP = 10000
+
+# Largest UDP datagram
+DATAGRAM_SIZE = 65536
+
+SIOCGIFADDR = 0x8915
+
+_monitor = None
+
+
+def interface_address(name):
+    """Get the IPv4 address of a network interface, None when it has none."""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        try:
+            request = struct.pack('256s', name.encode()[:15])
+            return socket.inet_ntoa(fcntl.ioctl(probe.fileno(), SIOCGIFADDR, request)[20:24])
+        except OSError:
+            return None
+
+
+def list_interfaces():
+    """List the interfaces with an IPv4 address, loopback excluded, as (name, address)."""
+    links = []
+    for index, name in socket.if_nameindex():
+        address = interface_address(name)
+        if name != 'lo' and address and not address.startswith('127.'):
+            links.append((name, address))
+    return links
+
+
+def close_socket(sock):
+    """Close a socket, waking up the thread blocked reading it."""
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+    sock.close()
+
+
+def bonding_settings(channel):
+    """Get the bonding settings of a channel, or None if bonding is disabled.
+
+    Returns:
+        Dictionary with receiver ((host, port)) and interfaces (names, None for every connected one)
+    """
+    bonding = channel.get('bonding') or {}
+    if not bonding.get('enabled'):
+        return None
+    receiver = bonding.get('receiver') or ''
+    host, _, port = receiver.rpartition(':')
+    if not host or not port.isdigit():
+        logger.warning(f"Bonding needs a receiver as host:port, got '{receiver}'; sending over the default route")
+        return None
+    return {'receiver': (host, int(port)), 'interfaces': bonding.get('interfaces') or None}
+
+
+def later(sequence, reference):
+    """Distance from reference to sequence, modulo the sequence space."""
+    return (sequence - reference) & SEQUENCE_MASK
+
+
+class Link:
+    """One uplink of a bonder: its socket, measurements and weight."""
+
+    def __init__(self, link_id, name, address, receiver):
+        self.link_id = link_id
+        self.name = name
+        self.address = address
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_BINDTODEVICE, name.encode())
+        except (OSError, AttributeError):
+            logger.debug(f"Cannot bind to {name}, relying on source routing for {address}")
+        self.socket.bind((address, 0))
+        self.socket.connect(receiver)
+        self.weight = INITIAL_WEIGHT
+        self.current = 0.0  # Smooth weighted round-robin credit
+        self.sent_bytes = 0
+        self.sent_packets = 0
+        self.rtt = None
+        self.min_rtt = None
+        self.throughput = 0.0
+        self.loss = 0.0
+        self.last_reply = None
+        self.probe_sequence = 0
+        self.probes = {}  # probe sequence -> packets sent when it left
+        self.previous_reply = None  # (time, sent packets, received bytes, received packets)
+
+    def alive(self, now):
+        return self.last_reply is not None and now - self.last_reply < LINK_TIMEOUT
+
+    def on_reply(self, sequence, sent_at, received_bytes, received_packets, now):
+        sent_packets = self.probes.pop(sequence, None)
+        if sent_packets is None:
+            return
+        self.last_reply = now
+        rtt = now - sent_at
+        self.rtt = rtt if self.rtt is None else self.rtt + RTT_SMOOTHING * (rtt - self.rtt)
+        self.min_rtt = rtt if self.min_rtt is None else min(self.min_rtt, rtt)
+        previous = self.previous_reply
+        self.previous_reply = (sent_at, sent_packets, received_bytes, received_packets)
+        if previous is None or sent_at <= previous[0]:
+            return
+        sent = sent_packets - previous[1]
+        received = received_packets - previous[3]
+        self.throughput = (received_bytes - previous[2]) * 8 / (sent_at - previous[0])
+        self.loss = max(0.0, 1 - received / sent) if sent > 0 else 0.0
+        if self.loss > LOSS_THRESHOLD or rtt > RTT_INFLATION * self.min_rtt + RTT_SLACK:
+            self.weight = max(MIN_WEIGHT, self.weight * WEIGHT_DECREASE)
+        else:
+            self.weight = min(MAX_WEIGHT, self.weight + WEIGHT_INCREASE)
+
+    def stats(self, now):
+        return {
+            'address': self.address,
+            'alive': self.alive(now),
+            'weight': round(self.weight, 2),
+            'rtt': self.rtt,
+            'throughput': int(self.throughput),
+            'loss': round(self.loss, 4),
+            'sentBytes': self.sent_bytes,
+        }
+
+
+class LinkBonder:
+    """Loopback SRT peer striping one stream over several uplinks to a BondReceiver."""
+
+    def __init__(self, receiver, interfaces=None):
+        """Initialize LinkBonder.
+
+        Args:
+            receiver: (host, port) of the BondReceiver
+            interfaces: Names of the interfaces to use, None for every connected one
+        """
+        self.receiver = receiver
+        self.interfaces = interfaces
+        self.local = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.local.bind(('127.0.0.1', 0))
+        self.port = self.local.getsockname()[1]
+        self.peer = None
+        self.links = {}  # interface name -> Link
+        self.link_ids = itertools.count(1)
+        self.sequence = 0
+        self.lock = threading.Lock()
+        self.running = False
+
+    def local_endpoint(self, endpoint):
+        """Get the endpoint the stream's sink sends to instead of endpoint."""
+        url = urlsplit(endpoint)
+        return urlunsplit((url.scheme, f'127.0.0.1:{self.port}', url.path, url.query, url.fragment))
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self._send_loop, name='bond-send', daemon=True).start()
+        threading.Thread(target=self._probe_loop, name='bond-probe', daemon=True).start()
+        logger.info(f"Bonding to {self.receiver[0]}:{self.receiver[1]} through 127.0.0.1:{self.port}")
+
+    def stop(self):
+        self.running = False
+        close_socket(self.local)
+        with self.lock:
+            links, self.links = list(self.links.values()), {}
+        for link in links:
+            close_socket(link.socket)
+
+    def set_links(self, links):
+        """Follow the connected interfaces, given as (name, address)."""
+        if not self.running:
+            return
+        wanted = {name: address for name, address in links if self.interfaces is None or name in self.interfaces}
+        with self.lock:
+            for name in list(self.links):
+                if self.links[name].address != wanted.get(name):
+                    logger.info(f"Bonding link {name} went away")
+                    close_socket(self.links.pop(name).socket)
+            for name, address in wanted.items():
+                if name in self.links:
+                    continue
+                try:
+                    link = Link(next(self.link_ids), name, address, self.receiver)
+                except OSError as e:
+                    logger.warning(f"Cannot send over {name} ({address}): {e}")
+                    continue
+                self.links[name] = link
+                threading.Thread(target=self._receive_loop, args=(link,), name=f'bond-{name}', daemon=True).start()
+                logger.info(f"Bonding link {name} ({address}) added")
+
+    def _pick(self, now):
+        # Smooth weighted round-robin over the live links, every link when none answers
+        with self.lock:
+            links = [link for link in self.links.values() if link.alive(now)] or list(self.links.values())
+        best = None
+        total = 0.0
+        for link in links:
+            link.current += link.weight
+            total += link.weight
+            if best is None or link.current > best.current:
+                best = link
+        if best is not None:
+            best.current -= total
+        return best
+
+    def _send_loop(self):
+        while self.running:
+            try:
+                data, peer = self.local.recvfrom(DATAGRAM_SIZE)
+            except OSError:
+                return
+            if not self.running:
+                return
+            self.peer = peer
+            link = self._pick(time.monotonic())
+            if link is None:
+                continue
+            packet = HEADER.pack(MAGIC, DATA, link.link_id, self.sequence) + data
+            self.sequence = (self.sequence + 1) & SEQUENCE_MASK
+            try:
+                link.socket.send(packet)
+            except OSError:
+                # The link may have gone down between two refreshes, SRT retransmits what it loses
+                continue
+            link.sent_bytes += len(data)
+            link.sent_packets += 1
+
+    def _receive_loop(self, link):
+        while self.running:
+            try:
+                packet = link.socket.recv(DATAGRAM_SIZE)
+            except OSError:
+                return
+            if not packet and link.socket.fileno() == -1:
+                return
+            if len(packet) < HEADER.size:
+                continue
+            magic, kind, link_id, sequence = HEADER.unpack_from(packet)
+            if magic != MAGIC:
+                continue
+            if kind == DATA and self.peer is not None:
+                try:
+                    self.local.sendto(packet[HEADER.size:], self.peer)
+                except OSError:
+                    return
+            elif kind == PROBE_REPLY and len(packet) >= HEADER.size + REPLY_PAYLOAD.size:
+                sent_at, received_bytes, received_packets = REPLY_PAYLOAD.unpack_from(packet, HEADER.size)
+                link.on_reply(sequence, sent_at, received_bytes, received_packets, time.monotonic())
+
+    def _probe_loop(self):
+        while self.running:
+            with self.lock:
+                links = list(self.links.values())
+            now = time.monotonic()
+            for link in links:
+                sequence = link.probe_sequence
+                link.probe_sequence = (sequence + 1) & SEQUENCE_MASK
+                link.probes[sequence] = link.sent_packets
+                # Probes lost on the way are forgotten after a while
+                for stale in [key for key in link.probes if later(sequence, key) > 2 * LINK_TIMEOUT / PROBE_INTERVAL]:
+                    del link.probes[stale]
+                try:
+                    link.socket.send(HEADER.pack(MAGIC, PROBE, link.link_id, sequence) + PROBE_PAYLOAD.pack(now))
+                except OSError:
+                    pass
+            time.sleep(PROBE_INTERVAL)
+
+    def stats(self):
+        """Get the measurements and weight of each link, by interface name."""
+        now = time.monotonic()
+        with self.lock:
+            return {name: link.stats(now) for name, link in self.links.items()}
+
+
+class LinkMonitor:
+    """Background refresh of the connected interfaces, handed to the bonders."""
+
+    def __init__(self, list_links, interval=LINK_REFRESH_INTERVAL):
+        """Initialize LinkMonitor.
+
+        Args:
+            list_links: Callable returning the connected interfaces as (name, address), run off the main loop
+            interval: Seconds between refreshes
+        """
+        self.list_links = list_links
+        self.interval = interval
+        self.links = []
+        self.listeners = []
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        # Listing the links may take seconds (nmcli), the first refresh runs in the thread as well
+        self.thread = threading.Thread(target=self._run, name='link-monitor', daemon=True)
+        self.thread.start()
+
+    def add_listener(self, callback):
+        """Register a callback(links) called with the current links now and on every change."""
+        with self.lock:
+            self.listeners.append(callback)
+            links = self.links
+        callback(links)
+
+    def remove_listener(self, callback):
+        with self.lock:
+            if callback in self.listeners:
+                self.listeners.remove(callback)
+
+    def refresh(self):
+        try:
+            links = sorted(self.list_links())
+        except Exception as e:
+            logger.error(f"Error listing network links: {e}")
+            return
+        with self.lock:
+            changed = links != self.links
+            self.links = links
+            listeners = list(self.listeners)
+        if changed:
+            logger.info(f"Network links: {', '.join(f'{name} ({address})' for name, address in links) or 'none'}")
+            for callback in listeners:
+                callback(links)
+
+    def _run(self):
+        while True:
+            self.refresh()
+            time.sleep(self.interval)
+
+
+def start_link_monitor(list_links):
+    """Start the shared link monitor, following the interfaces list_links returns.
+
+    Returns:
+        The LinkMonitor
+    """
+    global _monitor
+    if _monitor is None:
+        _monitor = LinkMonitor(list_links)
+        _monitor.start()
+    return _monitor
+
+
+def get_link_monitor():
+    """Get the shared link monitor, or one following every interface with an address if none was started."""
+    return start_link_monitor(list_interfaces)
+
+
+class BondReceiver:
+    """Reassembly server: bonded datagrams back in order, to and from one SRT server."""
+
+    def __init__(self, listen, forward, reorder_timeout=REORDER_TIMEOUT):
+        """Initialize BondReceiver.
+
+        Args:
+            listen: (host, port) the bonders send to
+            forward: (host, port) of the SRT server
+            reorder_timeout: Seconds datagrams wait behind a gap
+        """
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(listen)
+        self.upstream = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.upstream.connect(forward)
+        self.reorder_timeout = reorder_timeout
+        self.links = {}  # link id -> {'address', 'last_seen', 'bytes', 'packets'}
+        self.next_sequence = None
+        self.held = {}  # sequence -> (arrival, payload)
+        self.skipped = 0
+
+    def serve_forever(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self.socket, selectors.EVENT_READ, self._on_link_packet)
+        selector.register(self.upstream, selectors.EVENT_READ, self._on_server_packet)
+        while True:
+            for key, events in selector.select(self.reorder_timeout / 2):
+                key.data()
+            self._release(time.monotonic())
+
+    def _on_link_packet(self):
+        packet, address = self.socket.recvfrom(DATAGRAM_SIZE)
+        if len(packet) < HEADER.size:
+            return
+        magic, kind, link_id, sequence = HEADER.unpack_from(packet)
+        if magic != MAGIC:
+            return
+        now = time.monotonic()
+        link = self.links.get(link_id)
+        if link is None:
+            link = self.links[link_id] = {'bytes': 0, 'packets': 0}
+            logger.info(f"Bonded link {link_id} from {address[0]}:{address[1]}")
+        # Follow NAT rebinding, replies go where the link last sent from
+        link['address'] = address
+        link['last_seen'] = now
+        if kind == PROBE and len(packet) >= HEADER.size + PROBE_PAYLOAD.size:
+            sent_at, = PROBE_PAYLOAD.unpack_from(packet, HEADER.size)
+            reply = REPLY_PAYLOAD.pack(sent_at, link['bytes'], link['packets'])
+            self.socket.sendto(HEADER.pack(MAGIC, PROBE_REPLY, link_id, sequence) + reply, address)
+        elif kind == DATA:
+            payload = packet[HEADER.size:]
+            link['bytes'] += len(payload)
+            link['packets'] += 1
+            self._on_data(sequence, payload, now)
+
+    def _on_data(self, sequence, payload, now):
+        if self.next_sequence is None:
+            self.next_sequence = sequence
+        ahead = later(sequence, self.next_sequence)
+        if ahead > SEQUENCE_MASK // 2:
+            if SEQUENCE_MASK + 1 - ahead > RESYNC_GAP:
+                # The sender started over
+                self.held = {}
+                self.next_sequence = sequence
+            else:
+                # Late, after its gap was given up on: SRT puts it in place
+                self._forward(payload)
+                return
+        self.held[sequence] = (now, payload)
+        self._release(now)
+
+    def _release(self, now):
+        while self.held:
+            entry = self.held.pop(self.next_sequence, None)
+            if entry is not None:
+                self._forward(entry[1])
+                self.next_sequence = (self.next_sequence + 1) & SEQUENCE_MASK
+                continue
+            oldest = min(arrival for arrival, payload in self.held.values())
+            if now - oldest < self.reorder_timeout and len(self.held) < MAX_HELD:
+                return
+            # The missing datagram was lost, SRT asks for it again
+            following = min(self.held, key=lambda sequence: later(sequence, self.next_sequence))
+            self.skipped += later(following, self.next_sequence)
+            self.next_sequence = following
+
+    def _forward(self, payload):
+        try:
+            self.upstream.send(payload)
+        except OSError:
+            # The server is not listening (yet)
+            pass
+
+    def _on_server_packet(self):
+        try:
+            payload = self.upstream.recv(DATAGRAM_SIZE)
+        except OSError:
+            return
+        # Replies are small, send them over every live link so a dying one cannot hold them
+        now = time.monotonic()
+        packet = HEADER.pack(MAGIC, DATA, 0, 0) + payload
+        for link in self.links.values():
+            if now - link['last_seen'] < LINK_TIMEOUT:
+                self.socket.sendto(packet, link['address'])
+
+
+def parse_address(text):
+    host, _, port = text.rpartition(':')
+    return host or '0.0.0.0', int(port)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Reassemble bonded streams and hand them to an SRT server.')
+    parser.add_argument('--listen', default='0.0.0.0:9001', help='host:port the bonded links send to')
+    parser.add_argument('--forward', default='127.0.0.1:9000', help='host:port of the SRT server')
+    parser.add_argument('--reorder-ms', type=int, default=int(REORDER_TIMEOUT * 1000),
+                        help='milliseconds datagrams wait behind a gap')
+    args = parser.parse_args(argv)
+    receiver = BondReceiver(parse_address(args.listen), parse_address(args.forward), args.reorder_ms / 1000)
+    logger.info(f"Reassembling bonded streams on {args.listen} for {args.forward}")
+    receiver.serve_forever()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,12 +3,16 @@
 from datetime import datetime, timezone
 import nmcli
 import os
-import time
-from bondcam.api.client import update_device
+from bondcam.api.client import update_device_async
+from bondcam.network.bonding import interface_address
+from bondcam.network.state import NetworkStateService
 from bondcam.utils.logger import get_logger
 
 logger = get_logger()
 
+# nmcli device types a stream can be bonded over
+UPLINK_TYPES = ('wifi', 'ethernet', 'gsm')
+
 # Disable sudo usage for nmcli - service should have NetworkManager permissions via polkit
 # If running as root, sudo is not needed anyway
 if os.geteuid() == 0:
@@ -23,83 +27,62 @@ else:
 
 
 class NetworkManager:
-    """Manages network settings and WiFi connections."""
+    """Manages network settings and WiFi connections.
+
+    Every nmcli call runs on the NetworkStateService worker, the methods called
+    from the main loop only read its cached snapshot.
+    """
     
-    def __init__(self):
-        """Initialize NetworkManager."""
+    def __init__(self, state_service=None):
+        """Initialize NetworkManager.
+
+        Args:
+            state_service: NetworkStateService to use, one running nmcli is started by default
+        """
         self.last_wifi_settings = None
+        self.serial = None
+        self.preferred_networks = []
+        self.state = state_service or NetworkStateService(self.connect_to_wifi, self.on_connected)
+        if state_service is None:
+            self.state.start()
     
     def get_connected_network(self):
-        """Get current Wi-Fi status by querying the system for the active SSID."""
+        """Get the SSID of the connected Wi-Fi network, as last seen by the network state service."""
+        return self.state.connected_network()
+
+    def get_active_links(self):
+        """List the connected WiFi, Ethernet and cellular interfaces as (name, IPv4 address)."""
         try:
-            # Get all WiFi networks and find the one that's in use
-            wifi_networks = nmcli.device.wifi()
-            for network in wifi_networks:
-                if network.in_use:
-                    return network.ssid
-            
-            # Fallback: check devices for connected WiFi
             devices = nmcli.device()
-            for device in devices:
-                if device.device_type == 'wifi' and device.state == 'connected':
-                    # The connection name is typically the SSID for WiFi
-                    return device.connection if device.connection else None
-            return None
         except Exception as e:
-            logger.error(f"Error getting current Wi-Fi status: {e}")
-            return None
+            logger.error(f"Error listing network devices: {e}")
+            return []
+        links = []
+        for device in devices:
+            if device.device_type not in UPLINK_TYPES or device.state != 'connected':
+                continue
+            address = interface_address(device.device)
+            if address:
+                links.append((device.device, address))
+        return links
 
     def get_available_networks(self):
-        """Scan and return a list of available SSIDs in the area using nmcli."""
-        try:
-            # Get available WiFi networks
-            wifi_networks = nmcli.device.wifi()
-            
-            # Extract SSIDs and deduplicate using a set
-            networks = set()
-            for network in wifi_networks:
-                if network.ssid:  # Only add non-empty SSIDs
-                    networks.add(network.ssid)
-            
-            # Convert back to sorted list for consistent output
-            return sorted(list(networks))
-        except Exception as e:
-            logger.error(f"Error scanning for available networks: {e}")
-            return []
+        """Get the SSIDs in range, from the cached scan results."""
+        return self.state.available_networks()
 
     def connect_to_preferred_network(self, preferred_networks, serial):
-        """Connect to the preferred network if not already connected and available in the area."""
-        connected_ssid = self.get_connected_network()
-        logger.info(f"Current connected SSID: {connected_ssid}")
-
-        available_networks = self.get_available_networks()
-        logger.info(f"Available networks: {available_networks}")
-
-        for wifi_network in preferred_networks:
-            ssid = wifi_network['ssid']
-            password = wifi_network['password']
-
-            # Break if already connected to the preferred network
-            if connected_ssid == ssid:
-                logger.info(f"Already connected to network '{ssid}'.")
-                break
-
-            # Skip if network is not in the available coverage area
-            if ssid not in available_networks:
-                logger.warning(f"Network '{ssid}' not found in the area. Skipping...")
-                continue
-                
-            # Attempt to connect to the network
-            logger.info(f"Attempting to connect to network '{ssid}'...")
-            if self.connect_to_wifi(ssid, password):
-                logger.info(f"Successfully connected to network '{ssid}'")
-                time.sleep(5)  # Wait for 5 seconds to ensure the connection is stable
-                # Update the wifi status
-                current_timestamp = datetime.now(timezone.utc).isoformat()
-                self.update_wifi_status(serial, ssid, current_timestamp, preferred_networks)
-                break
-            else:
-                logger.warning(f"Failed to connect to network '{ssid}'. Trying next...")
+        """Hand the preferred networks to the network state service, which connects and roams between them."""
+        self.serial = serial
+        self.preferred_networks = preferred_networks
+        logger.info(f"Current connected SSID: {self.get_connected_network()}")
+        self.state.set_preferred(preferred_networks)
+
+    def on_connected(self, ssid):
+        """Report a connection the network state service made."""
+        logger.info(f"Successfully connected to network '{ssid}'")
+        if self.serial:
+            current_timestamp = datetime.now(timezone.utc).isoformat()
+            self.update_wifi_status(self.serial, ssid, current_timestamp, self.preferred_networks)
 
     def connect_to_wifi(self, ssid, password):
         """Connect to a WiFi network using nmcli library."""
@@ -123,7 +106,7 @@ class NetworkManager:
                 "preferredNetworks": preferred_networks
             }
         }
-        update_device(serial, data)
+        update_device_async(serial, data)
 
     def monitor_network_settings(self, device_manager):
         """Monitor network settings and update if necessary.
@@ -0,0 +1,385 @@
+"""Background view of the WiFi state, and roaming between the preferred networks.
+
+nmcli calls take from milliseconds (reading NetworkManager's cached scan) to
+seconds (a scan or a connection), so none of them run on the GLib main loop.
+A worker thread keeps a snapshot of the connected network and the networks in
+range, replaced as a whole, that the main loop reads without locking or
+blocking. The worker reads it from nmcli when NetworkManager signals that a
+device or connection changed state, that the primary connection moved or that
+a scan finished, and every SCAN_TTL. Every SCAN_TTL it also asks for a new
+scan. The signal strength of the access points changes all the time, those
+signals only update the snapshot, and the access point names are looked up on
+D-Bus, so they never fork nmcli. Without D-Bus the worker polls nmcli every
+REFRESH_INTERVAL.
+
+Networks are scored by signal strength and the bitrate NetworkManager reports
+for them. The connected one also loses points as its round trip time to the
+backend grows. The worker roams to a preferred network once it has scored
+better than the current one by ROAM_MARGIN for ROAM_HOLD seconds, which is
+before the stream degrades but not on every fluctuation. Roams are at least
+ROAM_COOLDOWN apart.
+"""
+
+import gi
+gi.require_version('Gio', '2.0')
+
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+import nmcli
+from gi.repository import Gio, GLib
+from bondcam.config.settings import get_backend_api
+from bondcam.network.bonding import interface_address
+from bondcam.utils.logger import get_logger
+
+logger = get_logger()
+
+NM_BUS_NAME = 'org.freedesktop.NetworkManager'
+NM_INTERFACE = 'org.freedesktop.NetworkManager'
+DEVICE_INTERFACE = 'org.freedesktop.NetworkManager.Device'
+WIRELESS_INTERFACE = 'org.freedesktop.NetworkManager.Device.Wireless'
+ACTIVE_CONNECTION_INTERFACE = 'org.freedesktop.NetworkManager.Connection.Active'
+ACCESS_POINT_INTERFACE = 'org.freedesktop.NetworkManager.AccessPoint'
+PROPERTIES_INTERFACE = 'org.freedesktop.DBus.Properties'
+
+# Seconds between round trip measurements, and between nmcli refreshes without D-Bus
+REFRESH_INTERVAL = 10
+
+# Shortest time between two passes of the worker, bursts of signals are coalesced
+MIN_REFRESH_INTERVAL = 2
+
+# Age in seconds after which the scan results are refreshed with a new scan, and
+# seconds between nmcli refreshes while D-Bus signals report the changes
+SCAN_TTL = 30
+
+# Seconds the backend gets to accept the connection measuring the round trip time
+RTT_TIMEOUT = 2
+
+# Score: signal strength (0-100), plus up to RATE_BONUS points for the link bitrate up to
+# RATE_FULL Mbit/s, less RTT_PENALTY points per second of round trip time over RTT_TARGET
+RATE_BONUS = 10
+RATE_FULL = 300
+RTT_TARGET = 0.1
+RTT_PENALTY = 100
+MAX_RTT_PENALTY = 50
+
+# Points per rank in the preferred list, preference breaks near ties
+PREFERENCE_BONUS = 2
+
+# Score margin a network must keep over the connected one, and for how many seconds, to be roamed to
+ROAM_MARGIN = 15
+ROAM_HOLD = 10
+
+# Signal strength below which a better network is roamed to without waiting
+WEAK_SIGNAL = 30
+
+# Seconds between roams, and before a network that failed to connect is tried again
+ROAM_COOLDOWN = 60
+
+
+def link_score(signal, rate, rtt=None):
+    """Score a WiFi link, higher is better.
+
+    Args:
+        signal: Signal strength, 0-100
+        rate: Link bitrate in Mbit/s
+        rtt: Round trip time in seconds, None when not measured
+    """
+    score = signal + min(rate or 0, RATE_FULL) / RATE_FULL * RATE_BONUS
+    if rtt is not None:
+        score -= min(MAX_RTT_PENALTY, max(0.0, rtt - RTT_TARGET) * RTT_PENALTY)
+    return score
+
+
+class NmcliBackend:
+    """NetworkManager access through nmcli, every call may block."""
+
+    def scan_results(self, rescan):
+        """List the networks in range as (ssid, signal, rate, in use), asking for a new scan first when rescan is set."""
+        if rescan:
+            nmcli.device.wifi_rescan()
+        return [(network.ssid, network.signal, network.rate, network.in_use)
+                for network in nmcli.device.wifi(rescan=False) if network.ssid]
+
+    def wifi_interface(self):
+        """Get the connected WiFi interface and its connection name, or (None, None)."""
+        for device in nmcli.device():
+            if device.device_type == 'wifi' and device.state == 'connected':
+                return device.device, device.connection
+        return None, None
+
+
+class NetworkStateService:
+    """Worker thread owning every nmcli call: cached WiFi snapshot and roaming."""
+
+    def __init__(self, connect, on_connected=None, backend=None, probe_address=None):
+        """Initialize NetworkStateService.
+
+        Args:
+            connect: Callable(ssid, password) -> bool connecting to a network, run on the worker
+            on_connected: Called on the main loop with the SSID after the worker connected to it
+            backend: Source of the WiFi state, defaults to nmcli
+            probe_address: (host, port) whose connection time measures the round trip, defaults to the backend API
+        """
+        self.connect = connect
+        self.on_connected = on_connected
+        self.backend = backend or NmcliBackend()
+        self.probe_address = probe_address or backend_address()
+        self.snapshot = {'connected': None, 'interface': None, 'signal': None, 'rate': None, 'rtt': None,
+                         'networks': {}, 'scanned': None, 'roams': 0}
+        self.preferred = []
+        self.last_scan = None
+        self.last_refresh = None
+        self.last_rtt = None
+        self.last_run = None
+        self.last_roam = None
+        self.better_since = None
+        self.failed = {}  # ssid -> time of the failed connection attempt
+        self.roams = 0
+        self.refresh_requested = False
+        self.strength_updates = {}  # Access point object path -> strength, handed over by the main loop
+        self.access_points = {}  # Access point object path -> [ssid, strength], kept by the worker
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.bus = None
+        self.subscriptions = []
+        self.thread = None
+
+    def start(self):
+        """Follow NetworkManager's D-Bus signals and start the worker."""
+        try:
+            self.bus = Gio.bus_get_sync(Gio.BusType.SYSTEM, None)
+            # The bus only delivers these, not the statistics and properties NetworkManager keeps updating
+            for interface, member, arg0 in (
+                    (DEVICE_INTERFACE, 'StateChanged', None),
+                    (ACTIVE_CONNECTION_INTERFACE, 'StateChanged', None),
+                    (WIRELESS_INTERFACE, 'AccessPointRemoved', None),
+                    (PROPERTIES_INTERFACE, 'PropertiesChanged', NM_INTERFACE),
+                    (PROPERTIES_INTERFACE, 'PropertiesChanged', WIRELESS_INTERFACE),
+                    (PROPERTIES_INTERFACE, 'PropertiesChanged', ACCESS_POINT_INTERFACE)):
+                self.subscriptions.append(self.bus.signal_subscribe(
+                    NM_BUS_NAME, interface, member, None, arg0, Gio.DBusSignalFlags.NONE, self._on_signal))
+        except GLib.Error as e:
+            logger.warning(f"NetworkManager signals unavailable ({e.message}), polling every {REFRESH_INTERVAL} s")
+            self.unsubscribe()
+        self.thread = threading.Thread(target=self._run, name='network-state', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.unsubscribe()
+        self.stopped.set()
+        self.wake.set()
+
+    def unsubscribe(self):
+        for subscription in self.subscriptions:
+            self.bus.signal_unsubscribe(subscription)
+        self.subscriptions = []
+
+    def _on_signal(self, connection, sender, path, interface, member, parameters):
+        # Main loop: sort the signal out and wake the worker, which coalesces bursts of them
+        if member == 'PropertiesChanged':
+            changed_interface, changed, _ = parameters.unpack()
+            if changed_interface == ACCESS_POINT_INTERFACE:
+                if 'Strength' not in changed:
+                    return
+                with self.lock:
+                    self.strength_updates[path] = changed['Strength']
+            elif changed_interface == NM_INTERFACE and 'PrimaryConnection' in changed:
+                self.refresh_requested = True
+            elif changed_interface == WIRELESS_INTERFACE and 'LastScan' in changed:
+                self.refresh_requested = True
+            else:
+                return
+        elif member == 'AccessPointRemoved':
+            with self.lock:
+                self.strength_updates[parameters.unpack()[0]] = None
+        else:
+            self.refresh_requested = True
+        self.wake.set()
+
+    def set_preferred(self, preferred_networks):
+        """Hand over the preferred networks ({'ssid', 'password'}, in order of preference)."""
+        self.preferred = list(preferred_networks or [])
+        self.better_since = None
+        self.failed = {}
+        self.wake.set()
+
+    def connected_network(self):
+        """Get the SSID of the connected network, from the snapshot."""
+        return self.snapshot['connected']
+
+    def available_networks(self):
+        """Get the sorted SSIDs in range, from the snapshot."""
+        return sorted(self.snapshot['networks'])
+
+    def _run(self):
+        while not self.stopped.is_set():
+            if self.last_run is not None:
+                self.wake.wait(REFRESH_INTERVAL)
+                # Let a burst of signals settle into one pass
+                self.stopped.wait(max(0.0, self.last_run + MIN_REFRESH_INTERVAL - time.monotonic()))
+            self.wake.clear()
+            if self.stopped.is_set():
+                return
+            now = time.monotonic()
+            self.last_run = now
+            try:
+                interval = SCAN_TTL if self.subscriptions else REFRESH_INTERVAL
+                if self.refresh_requested or self.last_refresh is None or now - self.last_refresh >= interval:
+                    self.refresh_requested = False
+                    self.refresh()
+                self.apply_strengths()
+                if self.last_rtt is None or now - self.last_rtt >= REFRESH_INTERVAL:
+                    self.last_rtt = now
+                    interface = self.snapshot['interface'] if self.snapshot['connected'] else None
+                    self.update_snapshot(rtt=self.measure_rtt(interface) if interface else None)
+                self.evaluate(now)
+            except Exception as e:
+                logger.error(f"Error refreshing network state: {e}")
+
+    def update_snapshot(self, **changes):
+        # The main loop reads the snapshot without locking, it is replaced and never changed in place
+        self.snapshot = {**self.snapshot, **changes}
+
+    def refresh(self):
+        """Read the WiFi state into a new snapshot from nmcli, scanning when the results are stale."""
+        now = time.monotonic()
+        self.last_refresh = now
+        rescan = self.last_scan is None or now - self.last_scan >= SCAN_TTL
+        if rescan:
+            self.last_scan = now
+        networks = {}
+        connected = None
+        for ssid, signal, rate, in_use in self.backend.scan_results(rescan):
+            # The same SSID from several access points counts as its strongest
+            if ssid not in networks or signal > networks[ssid]['signal']:
+                networks[ssid] = {'signal': signal, 'rate': rate}
+            if in_use:
+                connected = ssid
+        interface, connection = self.backend.wifi_interface()
+        connected = connected or connection
+        current = networks.get(connected, {})
+        changes = {'connected': connected, 'interface': interface, 'signal': current.get('signal'),
+                   'rate': current.get('rate'), 'networks': networks, 'scanned': self.last_scan, 'roams': self.roams}
+        if connected != self.snapshot['connected'] or interface != self.snapshot['interface']:
+            # The round trip time was the previous link's, measure the new one right away
+            changes['rtt'] = None
+            self.last_rtt = None
+        self.update_snapshot(**changes)
+
+    def apply_strengths(self):
+        """Apply the signal strengths NetworkManager reported on D-Bus since the last pass."""
+        with self.lock:
+            updates, self.strength_updates = self.strength_updates, {}
+        changed = set()
+        for path, strength in updates.items():
+            if strength is None:
+                # The access point went out of range
+                access_point = self.access_points.pop(path, None)
+            else:
+                access_point = self.access_points.get(path)
+                if access_point is None:
+                    ssid = self.access_point_ssid(path)
+                    if ssid is None:
+                        continue
+                    access_point = self.access_points[path] = [ssid, strength]
+                access_point[1] = strength
+            if access_point:
+                changed.add(access_point[0])
+        networks = self.snapshot['networks']
+        changed &= set(networks)
+        if not changed:
+            # Networks nmcli has not listed yet come with the next refresh
+            return
+        networks = dict(networks)
+        for ssid in changed:
+            strengths = [strength for name, strength in self.access_points.values() if name == ssid]
+            if strengths:
+                networks[ssid] = {**networks[ssid], 'signal': max(strengths)}
+        current = networks.get(self.snapshot['connected'], {})
+        self.update_snapshot(networks=networks, signal=current.get('signal', self.snapshot['signal']))
+
+    def access_point_ssid(self, path):
+        # Worker thread: one D-Bus call, cached for as long as the access point is in range
+        try:
+            result = self.bus.call_sync(NM_BUS_NAME, path, PROPERTIES_INTERFACE, 'Get',
+                                        GLib.Variant('(ss)', (ACCESS_POINT_INTERFACE, 'Ssid')),
+                                        GLib.VariantType('(v)'), Gio.DBusCallFlags.NONE, RTT_TIMEOUT * 1000, None)
+        except GLib.Error as e:
+            logger.debug(f"Could not read the SSID of {path}: {e.message}")
+            return None
+        ssid = bytes(result.unpack()[0]).decode('utf-8', 'replace')
+        return ssid or None
+
+    def measure_rtt(self, interface):
+        # One TCP handshake to the backend over the WiFi interface, None when it does not answer
+        address = interface_address(interface) if interface else None
+        if not self.probe_address or not address:
+            return None
+        started = time.monotonic()
+        try:
+            with socket.create_connection(self.probe_address, timeout=RTT_TIMEOUT, source_address=(address, 0)):
+                return time.monotonic() - started
+        except OSError:
+            return None
+
+    def score(self, ssid, rtt=None):
+        network = self.snapshot['networks'][ssid]
+        ranks = [entry['ssid'] for entry in self.preferred]
+        bonus = (len(ranks) - ranks.index(ssid)) * PREFERENCE_BONUS if ssid in ranks else 0
+        return link_score(network['signal'], network['rate'], rtt) + bonus
+
+    def evaluate(self, now):
+        """Connect to the best preferred network, or roam to a better one."""
+        snapshot = self.snapshot
+        ranks = [entry['ssid'] for entry in self.preferred]
+        current = snapshot['connected']
+        candidates = [entry for entry in self.preferred
+                      if entry['ssid'] in snapshot['networks'] and entry['ssid'] != current
+                      and (entry['ssid'] not in self.failed or now - self.failed[entry['ssid']] >= ROAM_COOLDOWN)]
+        if not candidates or (current in ranks and snapshot['signal'] is None):
+            # Nothing to go to, or nothing to compare with
+            self.better_since = None
+            return
+        best = max(candidates, key=lambda entry: self.score(entry['ssid']))
+        best_score = self.score(best['ssid'])
+        if current in ranks:
+            current_score = self.score(current, snapshot['rtt'])
+            if best_score < current_score + ROAM_MARGIN:
+                self.better_since = None
+                return
+            if self.better_since is None:
+                self.better_since = now
+            weak = snapshot['signal'] < WEAK_SIGNAL
+            if not weak and now - self.better_since < ROAM_HOLD:
+                return
+            if self.last_roam is not None and now - self.last_roam < ROAM_COOLDOWN:
+                return
+            logger.info(f"Roaming from '{current}' (score {current_score:.0f}) to '{best['ssid']}' "
+                        f"(score {best_score:.0f})")
+        else:
+            logger.info(f"Connecting to preferred network '{best['ssid']}'")
+        self.better_since = None
+        self.last_roam = now
+        if self.connect(best['ssid'], best['password']):
+            self.roams += 1
+            if self.on_connected:
+                GLib.idle_add(self._notify_connected, best['ssid'])
+        else:
+            self.failed[best['ssid']] = now
+        # The new state shows up through D-Bus, refresh right away without it
+        self.wake.set()
+
+    def _notify_connected(self, ssid):
+        self.on_connected(ssid)
+        return False
+
+
+def backend_address():
+    """Get the (host, port) of the backend API, None when it is not configured."""
+    url = urlsplit(get_backend_api())
+    if not url.hostname:
+        return None
+    return url.hostname, url.port or (443 if url.scheme == 'https' else 80)
@@ -0,0 +1,118 @@
+"""Closed-loop bitrate control driven by RTMP send pressure.
+
+A stream with an enabled ``abr`` channel setting has its encoder bitrate
+adjusted between ``minBitrate`` and the channel ``bitrate`` (both in Kbps).
+Each sample carries how much media waits in the output queue before the
+muxer and how many bytes the RTMP server acknowledged since the last sample.
+A queue that stays above the high watermark means the uplink is slower than
+the encoder: the bitrate drops to a fraction of what actually got through.
+Once the queue stays near empty for a while, the bitrate climbs back in small
+steps. The watermarks and hold times keep it from oscillating.
+"""
+
+import time
+
+# Defaults for the per-stream 'abr' channel setting
+DEFAULT_MIN_BITRATE_KBPS = 300
+
+# Output queue levels, in seconds of media, marking congestion and a clear link
+HIGH_WATERMARK = 0.5
+LOW_WATERMARK = 0.1
+
+# Consecutive congested samples before stepping down
+CONGESTED_SAMPLES = 2
+
+# Seconds since the last change (and with a clear link) before stepping up
+INCREASE_HOLD = 10
+
+# Decrease to this fraction of the measured throughput, or of the bitrate without one
+DECREASE_FACTOR = 0.8
+
+# Increase step, as a fraction of the target bitrate
+INCREASE_STEP = 0.1
+
+# Decisions kept for stats
+HISTORY_LENGTH = 100
+
+
+class BitrateController:
+    """AIMD bitrate controller for one stream."""
+
+    def __init__(self, target, minimum):
+        """Initialize BitrateController.
+
+        Args:
+            target: Highest bitrate, the channel bitrate, in bps
+            minimum: Lowest bitrate, in bps
+        """
+        self.target = target
+        self.minimum = min(minimum, target)
+        self.bitrate = target
+        self.congested = 0
+        self.last_change = time.monotonic()
+        self.history = []
+
+    def set_bounds(self, target, minimum):
+        """Change the bounds, e.g. after the backend changed the channel bitrate.
+
+        Returns:
+            The bitrate to apply
+        """
+        self.target = target
+        self.minimum = min(minimum, target)
+        self.bitrate = max(self.minimum, min(self.bitrate, target))
+        return self.bitrate
+
+    def sample(self, queue_level, acked_bps=None, now=None):
+        """Feed one measurement.
+
+        Args:
+            queue_level: Seconds of media waiting in the output queue
+            acked_bps: Throughput acknowledged by the RTMP server since the last sample, if known
+            now: Monotonic time of the sample
+
+        Returns:
+            New bitrate in bps, or None to keep the current one
+        """
+        now = now if now is not None else time.monotonic()
+        if queue_level >= HIGH_WATERMARK:
+            self.congested += 1
+            if self.congested < CONGESTED_SAMPLES or self.bitrate <= self.minimum:
+                return None
+            base = min(acked_bps, self.bitrate) if acked_bps else self.bitrate
+            return self._change(max(self.minimum, int(base * DECREASE_FACTOR)), now, 'congested')
+
+        self.congested = 0
+        if queue_level <= LOW_WATERMARK and self.bitrate < self.target and now - self.last_change >= INCREASE_HOLD:
+            return self._change(min(self.target, self.bitrate + int(self.target * INCREASE_STEP)), now, 'clear')
+        return None
+
+    def _change(self, bitrate, now, reason):
+        self.bitrate = bitrate
+        self.congested = 0
+        self.last_change = now
+        self.history.append((time.time(), bitrate, reason))
+        del self.history[:-HISTORY_LENGTH]
+        return bitrate
+
+    def stats(self):
+        """Get the current bitrate, bounds and recent decisions."""
+        return {
+            'bitrate': self.bitrate,
+            'target': self.target,
+            'minimum': self.minimum,
+            'history': list(self.history),
+        }
+
+
+def abr_settings(channel):
+    """Get the bitrate bounds of a channel in bps, or None if ABR is disabled.
+
+    Returns:
+        Tuple of (target, minimum)
+    """
+    abr = channel.get('abr') or {}
+    if not abr.get('enabled'):
+        return None
+    target = channel.get('bitrate', 2000) * 1000
+    return target, abr.get('minBitrate', DEFAULT_MIN_BITRATE_KBPS) * 1000
@@ -0,0 +1,108 @@
+"""Audio graph: one AAC encode per distinct source and bitrate, shared through tees.
+
+Each stream picks its audio from its channel settings (``audioDevices`` for
+several microphones mixed together, ``audioDevice`` for one, otherwise the
+device-wide ``audioDevice``) and ``audioBitrate`` in Kbps. Streams with the
+same sources and bitrate share one encoder. Streams without a connected
+source get precomputed AAC silence frames instead of encoding silent PCM.
+"""
+
+import gi
+gi.require_version('Gst', '1.0')
+
+from gi.repository import Gst
+from bondcam.utils.logger import get_logger
+
+logger = get_logger()
+
+DEFAULT_AUDIO_BITRATE_KBPS = 96
+AUDIO_RATE = 48000
+
+AAC_CAPS = 'audio/mpeg, mpegversion=4'
+
+# One AAC-LC frame of stereo silence, covering 1024 samples
+AAC_FRAME_SAMPLES = 1024
+SILENT_AAC_FRAME = bytes([0x21, 0x00, 0x49, 0x90, 0x02, 0x19, 0x00, 0x23, 0x80])
+
+# AudioSpecificConfig of the silence frames: AAC-LC, 48 kHz, 2 channels
+SILENT_AAC_CAPS = (
+    f'audio/mpeg, mpegversion=4, stream-format=raw, framed=true, '
+    f'rate={AUDIO_RATE}, channels=2, codec_data=(buffer)1190'
+)
+
+# Key of the silent source
+SILENCE = ((), 0)
+
+
+def stream_audio_key(stream_settings, channel):
+    """Get the audio sources and bitrate a stream should use.
+
+    Args:
+        stream_settings: Resolved device-wide stream settings
+        channel: Resolved channel settings of the stream
+
+    Returns:
+        Tuple of (sorted device paths, bitrate in bps), SILENCE without a source
+    """
+    if 'audioDevices' in channel:
+        devices = channel['audioDevices'] or []
+    elif 'audioDevice' in channel:
+        devices = [channel['audioDevice']]
+    else:
+        devices = [stream_settings.get('audioDevice')]
+    devices = tuple(sorted(set(device for device in devices if device)))
+    if not devices:
+        return SILENCE
+    return devices, channel.get('audioBitrate', DEFAULT_AUDIO_BITRATE_KBPS) * 1000
+
+
+def source_description(devices, bitrate):
+    """Build the gst-launch description encoding one or several ALSA devices."""
+    encode = f'voaacenc bitrate={bitrate} ! aacparse ! {AAC_CAPS}'
+    if len(devices) == 1:
+        return f'alsasrc device={devices[0]} ! audioresample ! audio/x-raw,rate={AUDIO_RATE} ! {encode}'
+    inputs = ' '.join(
+        f'alsasrc device={device} ! audioconvert ! audioresample ! audio/x-raw,rate={AUDIO_RATE} ! queue ! mix.'
+        for device in devices
+    )
+    return f'audiomixer name=mix ! audio/x-raw,rate={AUDIO_RATE} ! {encode} {inputs}'
+
+
+class SilenceSource:
+    """Live source pushing the same precomputed AAC silence frame, paced to the clock."""
+
+    def __init__(self):
+        self.bin = Gst.parse_bin_from_description(
+            f'appsrc name=silence is-live=true format=time max-bytes=64 caps="{SILENT_AAC_CAPS}" ! identity sync=true',
+            True)
+        self.appsrc = self.bin.get_by_name('silence')
+        self.frame = Gst.Buffer.new_wrapped(SILENT_AAC_FRAME)
+        self.duration = Gst.util_uint64_scale(AAC_FRAME_SAMPLES, Gst.SECOND, AUDIO_RATE)
+        self.base_time = None
+        self.frames = 0
+        self.appsrc.connect('need-data', self.on_need_data)
+
+    def on_need_data(self, appsrc, length):
+        if self.base_time is None:
+            # Start at the current running time, the source may join a running pipeline
+            clock = appsrc.get_clock()
+            self.base_time = clock.get_time() - appsrc.get_base_time() if clock else 0
+        # Shares the frame's memory, only the timestamps are new
+        buffer = self.frame.copy()
+        buffer.pts = self.base_time + Gst.util_uint64_scale(self.frames, Gst.SECOND * AAC_FRAME_SAMPLES, AUDIO_RATE)
+        buffer.duration = self.duration
+        self.frames += 1
+        appsrc.emit('push-buffer', buffer)
+
+
+def make_audio_source(key):
+    """Build the bin producing AAC for an audio key.
+
+    Returns:
+        Tuple of (bin with a 'src' ghost pad, SilenceSource or None)
+    """
+    if key == SILENCE:
+        silence = SilenceSource()
+        return silence.bin, silence
+    devices, bitrate = key
+    return Gst.parse_bin_from_description(source_description(devices, bitrate), True), None
@@ -0,0 +1,195 @@
+"""Capture chain planning for V4L2 cameras.
+
+The planner looks at the caps a camera supports and picks the cheapest chain
+that turns them into NV12 at the stream resolution, which is what the encoder
+consumes. Raw NV12 at the native size needs no processing at all, other raw
+formats need one conversion and compressed formats need a decoder.
+"""
+
+import gi
+gi.require_version('Gst', '1.0')
+
+from gi.repository import Gst
+from bondcam.streaming.elements import get_decoder, get_profile
+from bondcam.utils.logger import get_logger
+
+logger = get_logger()
+
+# Format the encoder consumes
+OUTPUT_FORMAT = 'NV12'
+
+# Raw formats commonly offered by UVC cameras, in order of preference
+RAW_FORMATS = ['NV12', 'YUY2', 'I420', 'UYVY']
+
+# Relative CPU cost of each processing step
+COST_SOFTWARE_DECODE = 8
+COST_HARDWARE_DECODE = 1
+COST_CONVERT = 3
+COST_SCALE = 3
+
+
+class CaptureChain:
+    """Elements turning a camera's native caps into encoder-ready frames."""
+
+    def __init__(self, source_caps, decoder=None, convert=None, scale=None, cost=0):
+        self.source_caps = source_caps
+        self.decoder = decoder
+        self.convert = convert
+        self.scale = scale
+        self.cost = cost
+        self.output_caps = None
+
+    def factories(self):
+        """Get the factory names of the processing elements, in order."""
+        return [factory for factory in (self.decoder, self.convert, self.scale) if factory]
+
+    def describe(self):
+        """Build the gst-launch description of the chain, without the source."""
+        parts = [self.source_caps]
+        parts.extend(self.factories())
+        parts.append(self.output_caps)
+        return ' ! '.join(parts)
+
+    def make_elements(self):
+        """Create the chain elements, from the source capsfilter to the output queue.
+
+        Returns:
+            List of elements, or None if one of them could not be created
+        """
+        caps_filter = Gst.ElementFactory.make('capsfilter', None)
+        output_filter = Gst.ElementFactory.make('capsfilter', None)
+        if not caps_filter or not output_filter:
+            return None
+        caps_filter.set_property('caps', Gst.Caps.from_string(self.source_caps))
+        output_filter.set_property('caps', Gst.Caps.from_string(self.output_caps))
+
+        elements = [caps_filter]
+        for factory in self.factories():
+            element = Gst.ElementFactory.make(factory, None)
+            if not element:
+                logger.error(f"Failed to create {factory} element")
+                return None
+            elements.append(element)
+        elements.append(output_filter)
+        elements.append(Gst.ElementFactory.make('queue', None))
+        if not elements[-1]:
+            return None
+        return elements
+
+    def __repr__(self):
+        return f"CaptureChain({self.describe()}, cost={self.cost})"
+
+
+def output_caps(width, height, framerate):
+    """Get the caps every capture chain (and the fallback source) must produce."""
+    return f"video/x-raw,format={OUTPUT_FORMAT},width={width},height={height},framerate={framerate}/1"
+
+
+def open_camera(camera_source):
+    """Open a camera and query the caps it supports.
+
+    The element is brought to READY, which opens the device, and left there so
+    it can start streaming without opening it again. It is returned to NULL if
+    the device cannot be opened. Opening a misbehaving UVC device can block for
+    a long time, call this off the main loop.
+
+    Args:
+        camera_source: v4l2src element with its device property set
+
+    Returns:
+        Gst.Caps supported by the device, or None if it cannot be opened
+    """
+    try:
+        camera_source.set_state(Gst.State.READY)
+        state_change_return, state, pending = camera_source.get_state(Gst.CLOCK_TIME_NONE)
+        if state_change_return != Gst.StateChangeReturn.FAILURE:
+            return camera_source.get_static_pad('src').query_caps(None)
+    except Exception as e:
+        logger.error(f"Exception while opening {camera_source.get_property('device')}: {e}")
+    camera_source.set_state(Gst.State.NULL)
+    return None
+
+
+def probe_camera_caps(camera_source):
+    """Query the caps supported by a v4l2src element.
+
+    The element is brought to READY to open the device and returned to NULL
+    afterwards.
+
+    Args:
+        camera_source: v4l2src element with its device property set
+
+    Returns:
+        Gst.Caps supported by the device, or None if it cannot be opened
+    """
+    try:
+        return open_camera(camera_source)
+    finally:
+        camera_source.set_state(Gst.State.NULL)
+
+
+def _candidates(width, height, framerate, profile):
+    """Yield every (source caps, decoder, convert, scale, cost) combination worth trying."""
+    size = f"width={width},height={height}"
+    rate = f"framerate={framerate}/1"
+
+    for exact in (True, False):
+        scale = None if exact else profile['scale']
+        scale_cost = 0 if exact else COST_SCALE
+
+        for fmt in RAW_FORMATS:
+            caps = f"video/x-raw,format={fmt},{size},{rate}" if exact else f"video/x-raw,format={fmt},{rate}"
+            if fmt == OUTPUT_FORMAT:
+                yield caps, None, None, scale, scale_cost
+            else:
+                yield caps, None, profile['convert'], scale, COST_CONVERT + scale_cost
+
+        for media_type in ('image/jpeg', 'video/x-h264'):
+            decoder = get_decoder(profile, media_type)
+            if not decoder:
+                continue
+            caps = f"{media_type},{size},{rate}" if exact else f"{media_type},{rate}"
+            cost = COST_HARDWARE_DECODE if decoder['hardware'] else COST_SOFTWARE_DECODE
+            # Convert only when the decoder output is not already NV12
+            convert = None
+            if decoder['format'] != OUTPUT_FORMAT:
+                convert = profile['convert']
+                cost += COST_CONVERT
+            yield caps, decoder['factory'], convert, scale, cost + scale_cost
+
+
+def plan_capture_chain(device_caps, width, height, framerate, profile=None):
+    """Pick the cheapest capture chain for a camera.
+
+    Args:
+        device_caps: Gst.Caps reported by the camera, or None if unknown
+        width: Stream width
+        height: Stream height
+        framerate: Stream framerate
+        profile: Element profile, defaults to the configured one
+
+    Returns:
+        CaptureChain producing NV12 at the requested size
+    """
+    profile = profile or get_profile()
+    best = None
+    if device_caps is not None:
+        for caps, decoder, convert, scale, cost in _candidates(width, height, framerate, profile):
+            if not device_caps.can_intersect(Gst.Caps.from_string(caps)):
+                continue
+            if best is None or cost < best.cost:
+                best = CaptureChain(caps, decoder, convert, scale, cost)
+
+    if best is None:
+        # Unknown device caps: assume an MJPEG camera, as most UVC cameras are
+        decoder = get_decoder(profile, 'image/jpeg')
+        factory = decoder['factory'] if decoder else 'jpegdec'
+        best = CaptureChain(
+            f"image/jpeg,framerate={framerate}/1",
+            factory,
+            profile['convert'],
+            profile['scale'],
+        )
+
+    best.output_caps = output_caps(width, height, framerate)
+    return best
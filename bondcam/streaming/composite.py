@@ -0,0 +1,68 @@
+"""Layouts of composite streams, several cameras mixed into one picture.
+
+A ``videoStreams`` entry listing ``cameras`` instead of a ``camera`` is a
+composite: its camera bin mixes the cameras in a compositor instead of
+selecting one of them, and the mix is encoded once like any other capture.
+Each camera (a tile) is scaled to its place in the layout once, before the
+compositor, and moving to another layout only changes the tiles' places.
+
+A tile naming a camera that another stream shows is fed from that stream's
+capture tee instead of opening the device a second time.
+"""
+
+PIP = 'pip'
+SIDE_BY_SIDE = 'side-by-side'
+GRID = 'grid'
+
+LAYOUTS = (PIP, SIDE_BY_SIDE, GRID)
+DEFAULT_LAYOUT = GRID
+
+# Picture-in-picture insets are this fraction of the picture, along its bottom edge
+PIP_INSET = 4
+
+# Margin around the insets, as a fraction of the picture width
+PIP_MARGIN = 32
+
+
+def even(value):
+    """Round a dimension down to an even number, as NV12 requires."""
+    return int(value) - int(value) % 2
+
+
+def layout_rects(layout, count, width, height):
+    """Place the tiles of a composite in its picture.
+
+    Args:
+        layout: One of LAYOUTS, unknown names fall back to DEFAULT_LAYOUT
+        count: Number of tiles
+        width: Picture width
+        height: Picture height
+
+    Returns:
+        List of (x, y, width, height) per tile, None for the tiles the layout has no room for
+    """
+    if count == 0:
+        return []
+    if layout not in LAYOUTS:
+        layout = DEFAULT_LAYOUT
+    if layout == PIP:
+        # The first tile fills the picture, the others are insets from the bottom right corner
+        inset_width, inset_height = even(width / PIP_INSET), even(height / PIP_INSET)
+        margin = even(width / PIP_MARGIN)
+        rects = [(0, 0, even(width), even(height))]
+        for position in range(1, count):
+            x = width - position * (inset_width + margin)
+            rects.append((even(x), even(height - inset_height - margin), inset_width, inset_height) if x >= 0 else None)
+        return rects[:count]
+    if layout == SIDE_BY_SIDE:
+        # One row, each tile keeps the picture's aspect ratio
+        tile_width, tile_height = even(width / count), even(height / count)
+        y = even((height - tile_height) / 2)
+        return [(even(position * width / count), y, tile_width, tile_height) for position in range(count)]
+    # Square grid, 2x2 for up to four tiles
+    side = 2
+    while side * side < count:
+        side += 1
+    tile_width, tile_height = even(width / side), even(height / side)
+    return [(even(position % side * width / side), even(position // side * height / side), tile_width, tile_height)
+            for position in range(count)]
@@ -0,0 +1,299 @@
+"""Local ring-buffer DVR that keeps recording through RTMP outages.
+
+Each stream with a ``dvr`` channel setting writes its already-encoded H.264/AAC
+to short MPEG-TS segments on disk, which stay playable even when the device
+loses power mid-segment. The ring evicts the oldest segments to stay under
+its size and age caps. When an RTMP outage ends, the segments covering it are
+uploaded in the background at a limited rate so the backend can backfill the
+gap.
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import deque
+import requests
+from bondcam.config.settings import get_dvr_upload_api, get_dvr_upload_kbps
+from bondcam.utils.logger import get_logger
+
+logger = get_logger()
+
+# Defaults for the per-stream 'dvr' channel setting
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+DEFAULT_MAX_SECONDS = 600
+DEFAULT_SEGMENT_SECONDS = 10
+
+# Size of the file reads used for uploads
+UPLOAD_CHUNK_SIZE = 256 * 1024
+
+SEGMENT_EXTENSION = '.ts'
+
+
+class Segment:
+    """One closed segment file of the ring."""
+
+    def __init__(self, path, size, start, end):
+        self.path = path
+        self.size = size
+        self.start = start  # Wall-clock time of the first frame
+        self.end = end      # Wall-clock time the segment was closed
+        self.pending_upload = False
+
+
+class SegmentRing:
+    """Size- and time-capped set of segment files for one stream."""
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES, max_seconds=DEFAULT_MAX_SECONDS, uploader=None,
+                 extension=SEGMENT_EXTENSION):
+        """Initialize SegmentRing, picking up segments left by a previous run.
+
+        Args:
+            directory: Directory holding this stream's segments
+            max_bytes: Most bytes kept on disk
+            max_seconds: Oldest segment age kept, in seconds
+            uploader: BackfillUploader for segments missed during outages
+            extension: File extension of the segments
+        """
+        self.directory = directory
+        self.extension = extension
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.uploader = uploader
+        self.lock = threading.Lock()
+        self.segments = deque()
+        self.total_bytes = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self.open_segments = {}  # Location -> start time of the segments splitmuxsink is writing
+        self.outage_start = None
+        self.outages = []  # Finished (start, end) outage windows still waiting for segments
+
+        os.makedirs(directory, exist_ok=True)
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(extension):
+                path = os.path.join(directory, name)
+                mtime = os.path.getmtime(path)
+                self._append(Segment(path, os.path.getsize(path), segment_start(path, mtime), mtime))
+        self.enforce_limits()
+
+    def _append(self, segment):
+        self.segments.append(segment)
+        self.total_bytes += segment.size
+
+    def next_location(self, fragment_id):
+        """Name the next segment file. Called from the streaming thread by splitmuxsink."""
+        start = time.time()
+        location = os.path.join(self.directory, f'{int(start * 1000)}-{fragment_id:06d}{self.extension}')
+        with self.lock:
+            self.open_segments[location] = start
+        return location
+
+    def segment_closed(self, location):
+        """Add a segment splitmuxsink finished writing and apply the caps."""
+        with self.lock:
+            start = self.open_segments.pop(location, None)
+        try:
+            size = os.path.getsize(location)
+        except OSError:
+            return
+        with self.lock:
+            segment = Segment(location, size, start or time.time(), time.time())
+            self._append(segment)
+            self._queue_missed([segment])
+        self.enforce_limits()
+
+    def set_limits(self, max_bytes, max_seconds):
+        """Change the size and age caps, evicting right away if they shrank."""
+        with self.lock:
+            self.max_bytes = max_bytes
+            self.max_seconds = max_seconds
+        self.enforce_limits()
+
+    def close_open_segments(self):
+        """Add the segments cut short when the DVR branch was stopped mid-segment."""
+        with self.lock:
+            locations = list(self.open_segments)
+        for location in locations:
+            self.segment_closed(location)
+
+    def enforce_limits(self):
+        """Evict the oldest segments until the ring is within its size and age caps."""
+        now = time.time()
+        with self.lock:
+            while self.segments:
+                oldest = self.segments[0]
+                if not self.over_limits(oldest, now):
+                    break
+                self.segments.popleft()
+                self.total_bytes -= oldest.size
+                self.evictions += 1
+                self.evicted_bytes += oldest.size
+                if oldest.pending_upload:
+                    logger.warning(f"Evicting DVR segment {oldest.path} before it was uploaded")
+                try:
+                    os.remove(oldest.path)
+                except OSError as e:
+                    logger.error(f"Failed to remove segment {oldest.path}: {e}")
+
+    def over_limits(self, oldest, now):
+        """Check whether the oldest segment must be evicted. Called with the lock held."""
+        return self.total_bytes > self.max_bytes or now - oldest.end > self.max_seconds
+
+    def begin_outage(self, start):
+        """Mark the start of an RTMP outage."""
+        with self.lock:
+            if self.outage_start is None:
+                self.outage_start = start
+
+    def end_outage(self, end):
+        """Mark the end of an RTMP outage and queue the segments covering it for upload."""
+        with self.lock:
+            if self.outage_start is None:
+                return
+            self.outages.append((self.outage_start, end))
+            self.outage_start = None
+            self._queue_missed(list(self.segments))
+
+    def _queue_missed(self, segments):
+        # Called with the lock held
+        if not self.outages:
+            return
+        for segment in segments:
+            if segment.pending_upload:
+                continue
+            if any(segment.start <= end and segment.end >= start for start, end in self.outages):
+                if self.uploader and self.uploader.enqueue(self, segment):
+                    segment.pending_upload = True
+                else:
+                    logger.info(f"No DVR upload endpoint configured, keeping {segment.path} locally")
+        # Windows older than the newest closed segment are fully covered
+        if self.segments:
+            newest = self.segments[-1].end
+            self.outages = [(start, end) for start, end in self.outages if end > newest]
+
+    def upload_done(self, segment):
+        """Called by the uploader once a segment reached the backend."""
+        with self.lock:
+            segment.pending_upload = False
+
+    def stats(self):
+        """Get the fill level and eviction counters of the ring."""
+        with self.lock:
+            return {
+                'segments': len(self.segments),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'fill': self.total_bytes / self.max_bytes if self.max_bytes else 0,
+                'evictions': self.evictions,
+                'evicted_bytes': self.evicted_bytes,
+                'pending_uploads': sum(1 for segment in self.segments if segment.pending_upload),
+                'in_outage': self.outage_start is not None,
+            }
+
+
+class BackfillUploader:
+    """Background thread uploading missed segments at a limited rate."""
+
+    def __init__(self, url=None, rate_kbps=None):
+        """Initialize BackfillUploader.
+
+        Args:
+            url: Endpoint the segments are PUT to, defaults to DVR_UPLOAD_API
+            rate_kbps: Upload rate limit, defaults to DVR_UPLOAD_KBPS
+        """
+        self.url = url if url is not None else get_dvr_upload_api()
+        self.rate = (rate_kbps or get_dvr_upload_kbps()) * 1000 / 8  # bytes per second
+        self.queue = queue.Queue()
+        self.uploaded = 0
+        self.uploaded_bytes = 0
+        self.failed = 0
+        self.thread = None
+
+    def enqueue(self, ring, segment):
+        """Queue a segment for upload.
+
+        Returns:
+            False if no upload endpoint is configured
+        """
+        if not self.url:
+            return False
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name='dvr-backfill', daemon=True)
+            self.thread.start()
+        self.queue.put((ring, segment))
+        return True
+
+    def _chunks(self, path):
+        # Bulk reads, paced to the rate limit
+        started = time.monotonic()
+        sent = 0
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    return
+                sent += len(chunk)
+                ahead = sent / self.rate - (time.monotonic() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+                yield chunk
+
+    def _run(self):
+        session = requests.Session()
+        while True:
+            ring, segment = self.queue.get()
+            if not os.path.exists(segment.path):
+                continue
+            name = os.path.basename(segment.path)
+            try:
+                response = session.put(
+                    f"{self.url}/{os.path.basename(ring.directory)}/{name}",
+                    data=self._chunks(segment.path),
+                    headers={'Content-Type': 'video/mp2t'},
+                    timeout=60,
+                )
+                response.raise_for_status()
+                self.uploaded += 1
+                self.uploaded_bytes += segment.size
+                ring.upload_done(segment)
+                logger.info(f"Uploaded missed DVR segment {name}")
+            except (requests.exceptions.RequestException, OSError) as e:
+                self.failed += 1
+                logger.error(f"Failed to upload DVR segment {name}: {e}")
+                # Try again later, unless the ring evicted it meanwhile
+                time.sleep(10)
+                self.queue.put((ring, segment))
+
+    def stats(self):
+        """Get the upload counters of the backfill queue."""
+        return {
+            'queued': self.queue.qsize(),
+            'uploaded': self.uploaded,
+            'uploaded_bytes': self.uploaded_bytes,
+            'failed': self.failed,
+        }
+
+
+def segment_start(path, default):
+    """Get the start time encoded in a segment file name, in seconds."""
+    try:
+        return int(os.path.basename(path).split('-')[0]) / 1000
+    except ValueError:
+        return default
+
+
+def dvr_settings(channel):
+    """Get the DVR settings of a channel, or None if the DVR is disabled.
+
+    Returns:
+        Dictionary with maxBytes, maxSeconds and segmentSeconds
+    """
+    dvr = channel.get('dvr') or {}
+    if not dvr.get('enabled'):
+        return None
+    return {
+        'maxBytes': dvr.get('maxBytes', DEFAULT_MAX_BYTES),
+        'maxSeconds': dvr.get('maxSeconds', DEFAULT_MAX_SECONDS),
+        'segmentSeconds': dvr.get('segmentSeconds', DEFAULT_SEGMENT_SECONDS),
+    }
@@ -0,0 +1,209 @@
+"""Registry of the GStreamer elements used to decode, convert and encode video.
+
+Each profile names the element factories the pipeline should use on a given
+platform. The default ``rockchip`` profile uses the MPP hardware blocks of the
+Orange Pi 5B, while the ``software`` profile only needs stock GStreamer plugins
+so the same pipelines can be exercised on a plain Linux box.
+
+Latency profiles, picked per stream with the ``latencyProfile`` channel
+setting, trade delay for compression efficiency consistently across the
+encoder (GOP length, B-frames), the queues, the muxer and the output sink.
+"""
+
+import gi
+gi.require_version('Gst', '1.0')
+
+from gi.repository import Gst
+from bondcam.config.settings import get_element_profile
+from bondcam.utils.logger import get_logger
+
+logger = get_logger()
+
+# Decoders map a compressed capture media type to the element decoding it.
+# 'format' is the raw format the decoder outputs (None when it depends on the
+# input), 'hardware' marks decoders that do not run on the CPU.
+ELEMENT_PROFILES = {
+    'rockchip': {
+        'decoders': {
+            'image/jpeg': {'factory': 'mppjpegdec', 'format': 'NV12', 'hardware': True},
+            'video/x-h264': {'factory': 'mppvideodec', 'format': 'NV12', 'hardware': True},
+        },
+        'convert': 'videoconvert',
+        'scale': 'videoscale',
+        'encoder': 'mpph264enc',
+    },
+    'software': {
+        'decoders': {
+            'image/jpeg': {'factory': 'avdec_mjpeg', 'format': None, 'hardware': False},
+            'video/x-h264': {'factory': 'avdec_h264', 'format': None, 'hardware': False},
+        },
+        'convert': 'videoconvert',
+        'scale': 'videoscale',
+        'encoder': 'x264enc',
+    },
+}
+
+
+# GOP length in seconds, B-frames (software encoder only, the MPP H.264 encoder
+# has no B-frame setting), capture queue length in buffers, output queue
+# length, muxer latency, RTMP chunk size (small chunks interleave audio and
+# video more finely, large ones carry less framing overhead), and the SRT/RIST
+# retransmission window in milliseconds
+LATENCY_PROFILES = {
+    'ultra-low': {
+        'gop_seconds': 1,
+        'b_frames': 0,
+        'capture_queue_buffers': 2,
+        'output_queue_time': Gst.SECOND,
+        'mux_latency': 0,
+        'chunk_size': 1024,
+        'transport_latency': 120,
+    },
+    'balanced': {
+        'gop_seconds': 2,
+        'b_frames': 0,
+        'capture_queue_buffers': 5,
+        'output_queue_time': 2 * Gst.SECOND,
+        'mux_latency': 100 * Gst.MSECOND,
+        'chunk_size': 4096,
+        'transport_latency': 500,
+    },
+    'quality': {
+        'gop_seconds': 4,
+        'b_frames': 2,
+        'capture_queue_buffers': 10,
+        'output_queue_time': 4 * Gst.SECOND,
+        'mux_latency': 500 * Gst.MSECOND,
+        'chunk_size': 65536,
+        'transport_latency': 2000,
+    },
+}
+
+DEFAULT_LATENCY_PROFILE = 'balanced'
+
+
+def get_latency_profile(channel):
+    """Get the latency profile a stream's channel settings select.
+
+    Returns:
+        Profile dictionary, 'balanced' for missing or unknown names
+    """
+    name = channel.get('latencyProfile') or DEFAULT_LATENCY_PROFILE
+    if name not in LATENCY_PROFILES:
+        logger.warning(f"Unknown latency profile '{name}', using '{DEFAULT_LATENCY_PROFILE}'")
+        name = DEFAULT_LATENCY_PROFILE
+    return LATENCY_PROFILES[name]
+
+
+def register_profile(name, profile):
+    """Register (or replace) an element profile.
+
+    Args:
+        name: Profile name, as selected through ELEMENT_PROFILE
+        profile: Dictionary with the same keys as the built-in profiles
+    """
+    ELEMENT_PROFILES[name] = profile
+
+
+def get_profile(name=None):
+    """Get an element profile, falling back to 'rockchip' for unknown names.
+
+    Args:
+        name: Profile name, defaults to the configured ELEMENT_PROFILE
+
+    Returns:
+        Profile dictionary
+    """
+    name = name or get_element_profile()
+    if name not in ELEMENT_PROFILES:
+        logger.warning(f"Unknown element profile '{name}', using 'rockchip'")
+        name = 'rockchip'
+    return ELEMENT_PROFILES[name]
+
+
+def element_available(factory):
+    """Check whether a GStreamer element factory is installed."""
+    return Gst.ElementFactory.find(factory) is not None
+
+
+def get_decoder(profile, media_type):
+    """Get the decoder entry for a compressed media type.
+
+    Returns:
+        Decoder dictionary, or None if the profile has no usable decoder
+    """
+    decoder = profile['decoders'].get(media_type)
+    if decoder and element_available(decoder['factory']):
+        return decoder
+    return None
+
+
+def encoder_properties(factory, bitrate, latency=None, framerate=30):
+    """Get the encoder properties for a target bitrate.
+
+    Args:
+        factory: Encoder element factory name
+        bitrate: Target bitrate in bps
+        latency: Latency profile, defaults to 'balanced'
+        framerate: Stream framerate, to turn the GOP length into frames
+
+    Returns:
+        Dictionary of element properties
+    """
+    latency = latency or LATENCY_PROFILES[DEFAULT_LATENCY_PROFILE]
+    gop = latency['gop_seconds'] * framerate
+    if factory == 'mpph264enc':
+        return {
+            # No B-frames: mpph264enc has no property enabling them, only the GOP follows the profile
+            'profile': 'main',
+            'qos': True,
+            'header-mode': 1,
+            'gop': gop,
+            'bps': bitrate,
+            'bps-max': bitrate + 1000000,
+            'rc-mode': 'vbr',
+        }
+    if factory == 'x264enc':
+        # x264enc takes its bitrate in Kbps. zerolatency also turns off B-frames
+        # and lookahead, so it only goes with profiles that have none.
+        properties = {
+            'bitrate': bitrate // 1000,
+            'speed-preset': 'ultrafast',
+            'key-int-max': gop,
+            'bframes': latency['b_frames'],
+        }
+        if not latency['b_frames']:
+            properties['tune'] = 'zerolatency'
+        return properties
+    return {}
+
+
+def set_encoder_bitrate(encoder, bitrate):
+    """Change the bitrate of a running encoder.
+
+    Args:
+        encoder: Encoder element
+        bitrate: Target bitrate in bps
+    """
+    factory = encoder.get_factory().get_name()
+    for key in ('bps', 'bps-max', 'bitrate'):
+        value = encoder_properties(factory, bitrate).get(key)
+        if value is not None:
+            encoder.set_property(key, value)
+
+
+def force_key_unit_event():
+    """Build an upstream event asking the encoder for a keyframe with SPS/PPS.
+
+    Same event as gst_video_event_new_upstream_force_key_unit(), built by hand
+    to avoid depending on the GstVideo bindings.
+    """
+    structure = Gst.Structure.new_from_string('GstForceKeyUnit, all-headers=(boolean)true')
+    return Gst.Event.new_custom(Gst.EventType.CUSTOM_UPSTREAM, structure)
+
+
+def format_value(value):
+    """Format a property value for a gst-launch description."""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
@@ -0,0 +1,176 @@
+"""Programmatic construction of the pipeline bins.
+
+Bins are built element by element through Gst.ElementFactory instead of being
+parsed from gst-launch descriptions, so values such as endpoint URLs are set
+as properties and never need quoting. Encoders, parsers and muxers are the
+costly elements to create (an MPP encoder sets up its hardware context), so
+the ones of discarded bins are kept in an ElementPool and handed out again,
+with their properties back at their defaults, on the next rebuild.
+"""
+
+import gi
+gi.require_version('Gst', '1.0')
+
+from gi.repository import GObject, Gst
+from bondcam.streaming.elements import format_value
+from bondcam.utils.logger import get_logger
+
+logger = get_logger()
+
+# Factories whose idle elements are kept for reuse
+POOLED_FACTORIES = ('mpph264enc', 'x264enc', 'h264parse', 'flvmux', 'mpegtsmux')
+
+# Idle elements kept per factory, enough for a few streams rebuilt at once
+POOL_SIZE = 4
+
+# Properties left alone when an element is reset
+UNRESET_PROPERTIES = ('name', 'parent')
+
+
+def set_properties(element, properties):
+    """Set element properties the way gst-launch would parse them.
+
+    Numbers, booleans and strings naming enum values or flags go through
+    Gst.util_set_object_arg, string properties and objects (caps, structures)
+    are set as they are.
+    """
+    for key, value in properties.items():
+        pspec = element.find_property(key)
+        if pspec is None:
+            raise RuntimeError(f"{element.get_name()} has no property {key}")
+        if isinstance(value, (bool, int, str)) and pspec.value_type != GObject.TYPE_STRING:
+            Gst.util_set_object_arg(element, key, format_value(value))
+        else:
+            element.set_property(key, value)
+
+
+def reset_properties(element):
+    """Put every writable property of an element back to its default."""
+    for pspec in element.list_properties():
+        flags = pspec.flags
+        if (pspec.name in UNRESET_PROPERTIES or not flags & GObject.ParamFlags.WRITABLE
+                or flags & GObject.ParamFlags.CONSTRUCT_ONLY):
+            continue
+        try:
+            element.set_property(pspec.name, pspec.default_value)
+        except (AttributeError, TypeError, ValueError):
+            # Boxed and object properties have no usable default
+            pass
+
+
+def release_request_pads(element):
+    """Give back the request pads (muxer inputs...) an element handed out."""
+    for pad in list(element.pads):
+        template = pad.get_pad_template()
+        if template is not None and template.presence == Gst.PadPresence.REQUEST:
+            element.release_request_pad(pad)
+
+
+class ElementPool:
+    """Idle elements of the costly factories, reused across rebuilds."""
+
+    def __init__(self, factories=POOLED_FACTORIES, size=POOL_SIZE):
+        self.factories = set(factories)
+        self.size = size
+        self.idle = {}  # factory -> [elements]
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self, factory, name=None):
+        """Get an element of a factory, reusing an idle one when there is one.
+
+        Raises:
+            RuntimeError: The element could not be created
+        """
+        idle = self.idle.get(factory)
+        if idle:
+            element = idle.pop()
+            if name:
+                element.set_name(name)
+            self.reused += 1
+            return element
+        element = Gst.ElementFactory.make(factory, name)
+        if element is None:
+            raise RuntimeError(f"Failed to create {factory} element")
+        self.created += 1
+        return element
+
+    def recycle(self, bin):
+        """Take the pooled elements out of a bin being discarded.
+
+        The bin must already be in the NULL state and out of the pipeline.
+        """
+        for element in list(bin.children):
+            factory = element.get_factory()
+            if factory is None or factory.get_name() not in self.factories:
+                continue
+            idle = self.idle.setdefault(factory.get_name(), [])
+            if len(idle) >= self.size:
+                continue
+            # Removing the element from the bin also unlinks it
+            bin.remove(element)
+            element.set_state(Gst.State.NULL)
+            release_request_pads(element)
+            reset_properties(element)
+            idle.append(element)
+
+    def stats(self):
+        """Get the number of elements created and reused, and of idle ones per factory."""
+        return {
+            'created': self.created,
+            'reused': self.reused,
+            'idle': {factory: len(elements) for factory, elements in self.idle.items()},
+        }
+
+
+class GraphBuilder:
+    """Builds one bin, taking the costly elements from a pool."""
+
+    def __init__(self, name, pool=None):
+        self.bin = Gst.Bin.new(name)
+        self.pool = pool
+
+    def add(self, factory, name=None, properties=None):
+        """Create an element, set its properties and add it to the bin.
+
+        Raises:
+            RuntimeError: The element could not be created
+        """
+        if self.pool is not None and factory in self.pool.factories:
+            element = self.pool.acquire(factory, name)
+        else:
+            element = Gst.ElementFactory.make(factory, name)
+            if element is None:
+                raise RuntimeError(f"Failed to create {factory} element")
+        set_properties(element, properties or {})
+        self.bin.add(element)
+        return element
+
+    def caps(self, caps, name=None):
+        """Add a capsfilter for a caps string."""
+        return self.add('capsfilter', name, {'caps': Gst.Caps.from_string(caps)})
+
+    def chain(self, *elements):
+        """Link elements one after the other.
+
+        Raises:
+            RuntimeError: Two of the elements could not be linked
+        """
+        for upstream, downstream in zip(elements, elements[1:]):
+            if not upstream.link(downstream):
+                raise RuntimeError(f"Failed to link {upstream.get_name()} to {downstream.get_name()}")
+
+    def link_pads(self, upstream, src_pad, downstream, sink_pad):
+        """Link two elements through named pads, requesting them when needed (mux.video...).
+
+        Raises:
+            RuntimeError: The pads could not be linked
+        """
+        if not upstream.link_pads(src_pad, downstream, sink_pad):
+            raise RuntimeError(f"Failed to link {upstream.get_name()}.{src_pad} to {downstream.get_name()}.{sink_pad}")
+
+    def ghost(self, name, pad):
+        """Expose a pad of an element of the bin on the bin itself."""
+        ghost_pad = Gst.GhostPad.new(name, pad)
+        self.bin.add_pad(ghost_pad)
+        return ghost_pad
@@ -0,0 +1,179 @@
+"""Glass-to-glass latency stamps carried in the H.264 stream.
+
+With ``latencyStamps`` enabled in its channel settings, a stream's encoded
+frames pass through an appsink/appsrc hop that prepends an SEI
+user_data_unregistered NAL to each access unit. The SEI carries three wall
+clock times in nanoseconds since the epoch:
+
+- capture: when the frame was captured, from its running-time timestamp
+- encoder in: when the frame reached the encoder
+- encoder out: when the encoded frame left the parser
+
+SEI NALs survive flvmux, the RTMP hop and most servers, so a receiver with a
+synchronised clock (see bondcam.bench.latency) can split the delay into
+capture, encode and delivery stages.
+"""
+
+import gi
+gi.require_version('Gst', '1.0')
+
+import collections
+import struct
+import time
+import uuid
+from gi.repository import Gst
+from bondcam.utils.logger import get_logger
+
+logger = get_logger()
+
+# Identifies our SEI payloads among other user data
+STAMP_UUID = uuid.UUID('5b0d6c1e-8a4f-4c3e-9d2b-6f1a7e0c4b21').bytes
+
+# Capture, encoder in and encoder out times, big-endian nanoseconds
+STAMP_FORMAT = '>QQQ'
+
+SEI_NAL_TYPE = 6
+SEI_USER_DATA_UNREGISTERED = 5
+
+# Length prefix of the NALs h264parse outputs in avc stream format
+NAL_LENGTH_SIZE = 4
+
+# Frames waiting for the encoder before the oldest stamps are given up on
+PENDING_LIMIT = 64
+
+# Caps forced on the parser output so the stamps can be inserted as length-prefixed NALs
+AVC_CAPS = 'video/x-h264,stream-format=avc,alignment=au'
+
+
+def escape_rbsp(payload):
+    """Insert the emulation prevention bytes H.264 requires in a NAL payload."""
+    escaped = bytearray()
+    zeros = 0
+    for byte in payload:
+        if zeros >= 2 and byte <= 3:
+            escaped.append(3)
+            zeros = 0
+        escaped.append(byte)
+        zeros = zeros + 1 if byte == 0 else 0
+    return bytes(escaped)
+
+
+def unescape_rbsp(payload):
+    """Remove the emulation prevention bytes from a NAL payload."""
+    return payload.replace(b'\x00\x00\x03', b'\x00\x00')
+
+
+def stamp_sei(capture_ns, encoder_in_ns, encoder_out_ns):
+    """Build the SEI NAL (without length prefix or start code) carrying the stamps."""
+    payload = STAMP_UUID + struct.pack(STAMP_FORMAT, capture_ns, encoder_in_ns, encoder_out_ns)
+    rbsp = bytes([SEI_USER_DATA_UNREGISTERED, len(payload)]) + payload + b'\x80'
+    return bytes([SEI_NAL_TYPE]) + escape_rbsp(rbsp)
+
+
+def parse_stamp_sei(nal):
+    """Get the stamps carried by an SEI NAL.
+
+    Args:
+        nal: NAL unit bytes, starting with the NAL header
+
+    Returns:
+        Tuple of (capture, encoder in, encoder out) nanoseconds, or None if the
+        NAL carries no stamp
+    """
+    if not nal or nal[0] & 0x1f != SEI_NAL_TYPE:
+        return None
+    rbsp = unescape_rbsp(nal[1:])
+    position = 0
+    while position < len(rbsp) and rbsp[position] != 0x80:
+        payload_type = payload_size = 0
+        while rbsp[position] == 0xff:
+            payload_type += 255
+            position += 1
+        payload_type += rbsp[position]
+        position += 1
+        while rbsp[position] == 0xff:
+            payload_size += 255
+            position += 1
+        payload_size += rbsp[position]
+        position += 1
+        payload = rbsp[position:position + payload_size]
+        position += payload_size
+        if payload_type == SEI_USER_DATA_UNREGISTERED and payload[:16] == STAMP_UUID:
+            return struct.unpack(STAMP_FORMAT, payload[16:16 + struct.calcsize(STAMP_FORMAT)])
+    return None
+
+
+def add_stamp_hop(builder, camera_num):
+    """Add the appsink/appsrc hop bridging the parser and the tee of a stamped stream.
+
+    Args:
+        builder: GraphBuilder of the stream bin
+
+    Returns:
+        Tuple of (element to link the parser to, element to link to the tee)
+    """
+    caps = builder.caps(AVC_CAPS)
+    appsink = builder.add('appsink', f'stampsink{camera_num}', {'emit-signals': True, 'sync': False, 'max-buffers': 8})
+    appsrc = builder.add('appsrc', f'stampsrc{camera_num}', {'is-live': True, 'format': 'time', 'max-bytes': 0})
+    builder.chain(caps, appsink)
+    return caps, appsrc
+
+
+class LatencyStamper:
+    """Stamps the encoded frames of one stream bin."""
+
+    def __init__(self, stream_bin, camera_num):
+        self.pending = collections.OrderedDict()  # pts -> (capture ns, encoder in ns), shared by two streaming threads
+        self.caps = None
+        self.stamped = 0
+        self.appsink = stream_bin.get_by_name(f'stampsink{camera_num}')
+        self.appsrc = stream_bin.get_by_name(f'stampsrc{camera_num}')
+        # The selector output is the encoder input, probed there so pooled encoders carry no probes
+        selector = stream_bin.get_by_name(f'source_compositor{camera_num}')
+        selector.get_static_pad('src').add_probe(Gst.PadProbeType.BUFFER, self.on_encoder_input)
+        self.appsink.connect('new-sample', self.on_new_sample)
+        # Keyframe requests from the outputs have to cross the hop upstream
+        self.appsrc.get_static_pad('src').add_probe(Gst.PadProbeType.EVENT_UPSTREAM, self.on_upstream_event)
+
+    def on_encoder_input(self, pad, info):
+        pts = info.get_buffer().pts
+        element = pad.get_parent_element()
+        clock = element.get_clock()
+        if clock is None or pts == Gst.CLOCK_TIME_NONE:
+            return Gst.PadProbeReturn.OK
+        now = time.time_ns()
+        # Live sources stamp buffers with the running time they were captured at
+        age = clock.get_time() - element.get_base_time() - pts
+        if len(self.pending) >= PENDING_LIMIT:
+            self.pending.popitem(last=False)
+        self.pending[pts] = (now - max(age, 0), now)
+        return Gst.PadProbeReturn.OK
+
+    def on_new_sample(self, appsink):
+        sample = appsink.emit('pull-sample')
+        if sample is None:
+            return Gst.FlowReturn.EOS
+        caps = sample.get_caps()
+        if caps is not None and (self.caps is None or not caps.is_equal(self.caps)):
+            self.caps = caps
+            self.appsrc.set_property('caps', caps)
+
+        buffer = sample.get_buffer()
+        data = buffer.extract_dup(0, buffer.get_size())
+        stamps = self.pending.pop(buffer.pts, None)
+        if stamps is not None:
+            sei = stamp_sei(stamps[0], stamps[1], time.time_ns())
+            data = len(sei).to_bytes(NAL_LENGTH_SIZE, 'big') + sei + data
+            self.stamped += 1
+        stamped = Gst.Buffer.new_wrapped(data)
+        stamped.pts = buffer.pts
+        stamped.dts = buffer.dts
+        stamped.duration = buffer.duration
+        stamped.set_flags(buffer.get_flags())
+        return self.appsrc.emit('push-buffer', stamped)
+
+    def on_upstream_event(self, pad, info):
+        event = info.get_event()
+        if event.type == Gst.EventType.CUSTOM_UPSTREAM:
+            self.appsink.get_static_pad('sink').push_event(event)
+        return Gst.PadProbeReturn.OK
@@ -1,20 +1,68 @@
 import gi
 gi.require_version('Gst', '1.0')
 
+import os
 import sys
 import copy
+import socket
+import threading
+import time
 from gi.repository import Gst, GLib
+from bondcam.config.settings import get_dvr_dir, get_record_dir, get_telemetry_tracing
+from bondcam.network.bonding import LinkBonder, bonding_settings, get_link_monitor
+from bondcam.streaming.abr import BitrateController, abr_settings
+from bondcam.streaming.audio import make_audio_source, stream_audio_key
+from bondcam.streaming.capture import open_camera, output_caps, plan_capture_chain
+from bondcam.streaming.composite import layout_rects
+from bondcam.streaming.elements import (encoder_properties, force_key_unit_event, get_latency_profile, get_profile,
+                                       set_encoder_bitrate)
+from bondcam.streaming.dvr import BackfillUploader, SegmentRing, dvr_settings
+from bondcam.streaming.graph import ElementPool, GraphBuilder, set_properties
+from bondcam.streaming.latency import LatencyStamper, add_stamp_hop
+from bondcam.streaming.reconcile import CAMERA, DVR, ENCODER, OUTPUT, RECORD, diff_streams
+from bondcam.streaming.recording import (MOOV_UPDATE_SECONDS, RECORD_FORMATS, RECORD_QUEUE_BYTES, WRITE_BUFFER_BYTES,
+                                         RecordingRing, record_settings)
+from bondcam.streaming.renditions import expand_renditions, stream_size
+from bondcam.streaming.slate import make_slate_source
+from bondcam.streaming.telemetry import TELEMETRY_INTERVAL, PipelineTelemetry
+from bondcam.streaming.transport import SRT, TRANSPORTS, muxer_properties, sink_properties, transport_name
+from bondcam.utils.backoff import Backoff
 from bondcam.utils.logger import get_logger
 
 logger = get_logger()
 
+# Seconds an output must run without errors before its reconnect backoff starts over
+RTMP_STABLE_TIME = 30
+
+# Seconds between retries of cameras that are plugged in but failed to connect.
+# Plug and unplug events are handled right away through on_camera_event.
+CAMERA_RETRY_INTERVAL = 30
+
+# Seconds a camera gets to open before the attempt is given up on
+CAMERA_OPEN_TIMEOUT = 5
+
+# Seconds the connectivity check before an RTMP reconnect waits for an answer
+NETWORK_CHECK_TIMEOUT = 5
+
+# Milliseconds between checks of the camera watchdogs. The buffer probes only store a
+# timestamp, a stall is noticed at most this long after the watchdog timeout.
+CAMERA_WATCHDOG_INTERVAL = 250
+
+# Most media an output queue holds while its sink is slow, before dropping the oldest data
+OUTPUT_QUEUE_TIME = 2 * Gst.SECOND
+
+# Seconds between samples of the adaptive bitrate controllers
+ABR_INTERVAL = 1
+
 class StreamManager:
-    def __init__(self, label, get_stream_settings):
+    def __init__(self, label, get_stream_settings, element_profile=None, get_settings_version=None):
         self.label = label
         self.get_stream_settings = get_stream_settings  # Callable to get current stream_settings
+        self.get_settings_version = get_settings_version  # Optional callable, settings are only re-read when it moves
+        self.settings_version = None
         self.stream_settings = {}  # Initialize stream_settings
         self.pipeline = None
-        self.watchdog_timeout = 5000  # Set your desired watchdog timeout in milliseconds
+        self.watchdog_timeout = 1000  # Milliseconds a camera may go without a frame before failing over
 
         # Store current configuration
         self.current_video_streams = []
@@ -33,11 +81,91 @@ class StreamManager:
         # Stores the requested sink pads for camera sources
         self.camera_sink_pads = []
 
+        # Stores the bin each opened camera is pre-rolled in, and when its connection attempt started
+        self.camera_bins = []
+        self.camera_starts = []
+
+        # Cameras being opened off the main loop: stream index -> attempt, and the devices still opening
+        self.camera_probes = {}
+        self.busy_cameras = set()
+
+        # Stores the stream opening each stream's camera, and the elements scaling
+        # its capture to the stream size: {'elements', 'tee_pad', 'src_pad', 'sink_pad'}
+        self.capture_sources = []
+        self.camera_feeds = []
+
+        # Stores the (width, height, framerate) each stream's encoder and each camera capture runs at
+        self.stream_sizes = []
+        self.capture_sizes = []
+
         # Stores RTMP sink elements
         self.rtmp_sink_elements = []
 
-        # Stores the v4l2src elements for dynamic property adjustments
-        self.v4l2src_elements = []
+        # Stores the open candidate cameras of each stream, in order of preference
+        # ({'source', 'elements', 'pad', 'last_buffer'} or None), and the one on air
+        self.camera_candidates = []
+        self.active_cameras = []
+
+        # Stores the slate each stream shows when none of its cameras delivers frames
+        self.slates = []
+
+        # Stores the tiles of each running composite, None for other streams: per camera
+        # {'owner', 'elements', 'pad', 'filter', 'feed', 'rect', 'last_buffer', 'live'} or None
+        self.composite_tiles = []
+
+        # Stores the per-stream bins (camera/encoder side and mux/sink side)
+        self.stream_bins = []
+        self.output_bins = []
+
+        # Stores the stream whose encoder feeds each output and the pad it is fed from
+        self.encode_sources = []
+        self.video_pads = []
+
+        # Stores the reconnect state of each output (backoff, drop probes, counters). The
+        # streaming thread of a failing sink installs the drop probes too, under the lock.
+        self.output_states = []
+        self.output_lock = threading.Lock()
+
+        # Stores the audio tee pads feeding each output and the audio key each stream uses
+        self.audio_tee_pads = []
+        self.audio_keys = []
+
+        # Stores one encoded audio source per distinct audio key: key -> {'bin', 'tee', 'silence'}
+        self.audio_groups = {}
+        self.audio_group_count = 0
+
+        # Stores the DVR bins, their segment rings and the tee pads feeding them
+        self.dvr_bins = []
+        self.dvr_rings = []
+        self.dvr_video_pads = []
+        self.dvr_audio_tee_pads = []
+
+        # Stores the local recording bins, their file rings and the tee pads feeding them
+        self.record_bins = []
+        self.record_rings = []
+        self.record_video_pads = []
+        self.record_audio_tee_pads = []
+
+        # Stores the adaptive bitrate controller of each stream (None when ABR is off)
+        self.bitrate_controllers = []
+
+        # Stores the latency stamper of each stream (None unless latencyStamps is on)
+        self.latency_stampers = []
+
+        # Stores the link bonder striping each stream's SRT output over every uplink (None unless bonding is on)
+        self.bonders = []
+
+        # Uploads the DVR segments covering RTMP outages, shared by all streams
+        self.dvr_uploader = BackfillUploader()
+
+        # Element factories used for decoding and encoding
+        self.element_profile = get_profile(element_profile)
+
+        # Encoders, parsers and muxers of discarded bins, reused by the next ones
+        self.element_pool = ElementPool()
+
+        # Frame rate, bitrate, queue and RTMP metrics, plus element tracing on demand
+        self.telemetry = PipelineTelemetry(tracing=get_telemetry_tracing())
 
         self.launch_pipeline()
 
@@ -54,10 +182,39 @@ class StreamManager:
         # Start periodic configuration check
         GLib.timeout_add_seconds(5, self.check_stream_info)
 
-        # Start periodic camera device check
-        GLib.timeout_add_seconds(5, self.check_camera_devices)
+        # Retry cameras that failed to connect now and then
+        GLib.timeout_add_seconds(CAMERA_RETRY_INTERVAL, self.check_camera_devices)
+
+        # Adapt the bitrate of ABR streams to their uplink
+        GLib.timeout_add_seconds(ABR_INTERVAL, self.check_bitrates)
+
+        # Sample the pipeline metrics
+        GLib.timeout_add_seconds(TELEMETRY_INTERVAL, self.sample_telemetry)
+
+        # Fail cameras over as soon as they stop delivering frames
+        GLib.timeout_add(CAMERA_WATCHDOG_INTERVAL, self.check_camera_watchdogs)
+
+    def destroy_pipeline(self):
+        # Stop the pipeline and everything running next to it, bonders keep probing their links otherwise
+        for idx, bonder in enumerate(self.bonders):
+            if bonder:
+                self.stop_bonder(idx)
+        if not self.pipeline:
+            return
+        logger.info(f'Destroying existing pipeline for StreamManager "{self.label}"')
+        self.pipeline.set_state(Gst.State.NULL)
+        for stream_bin in self.stream_bins + self.output_bins:
+            if stream_bin:
+                self.pipeline.remove(stream_bin)
+                self.discard_bin(stream_bin)
+        for idx, record_bin in enumerate(self.record_bins):
+            if record_bin:
+                self.telemetry.unwatch_recording(idx + 1)
+        self.pipeline = None
 
     def fetch_stream_settings(self):
+        if self.get_settings_version:
+            self.settings_version = self.get_settings_version()
         # Use the get_stream_settings function provided to get the latest settings
         self.stream_settings = self.get_stream_settings()
 
@@ -66,33 +223,58 @@ class StreamManager:
             self.stream_settings = {}
 
         self.is_enabled = self.stream_settings.get('isEnabled', False)
-        self.desired_video_streams = self.stream_settings.get('videoStreams', [])
+        # Each endpoint of each rendition is built as a stream of its own
+        self.desired_video_streams = expand_renditions(self.stream_settings.get('videoStreams', []))
         self.audio_device = self.stream_settings.get('audioDevice', None)
 
     def build_pipeline(self):
         # Check if streaming is enabled before building the pipeline
         if not self.is_enabled:
             logger.info('Streaming is disabled')
-            if self.pipeline:
-                self.pipeline.set_state(Gst.State.NULL)
-                self.pipeline = None
+            self.destroy_pipeline()
             return
 
-        if self.pipeline:
-            logger.info(f'Destroying existing pipeline for StreamManager "{self.label}"')
-            self.pipeline.set_state(Gst.State.NULL)
-            self.pipeline = None
+        self.destroy_pipeline()
 
         # Reset all stored information
         self.compositors = []
         self.camera_connected = []
         self.camera_elements = []
         self.camera_sink_pads = []
+        self.camera_bins = []
+        self.camera_starts = []
+        self.camera_probes = {}
+        self.capture_sources = []
+        self.camera_feeds = []
+        self.stream_sizes = []
+        self.capture_sizes = []
         self.rtmp_sink_elements = []
-        self.v4l2src_elements = []
-
-        # Build the pipeline
-        gcommand = ""
+        self.camera_candidates = []
+        self.active_cameras = []
+        self.slates = []
+        self.composite_tiles = []
+        self.stream_bins = []
+        self.output_bins = []
+        self.encode_sources = []
+        self.video_pads = []
+        self.audio_tee_pads = []
+        self.audio_keys = []
+        self.audio_groups = {}
+        self.dvr_bins = []
+        self.dvr_rings = []
+        self.dvr_video_pads = []
+        self.dvr_audio_tee_pads = []
+        self.record_bins = []
+        self.record_rings = []
+        self.record_video_pads = []
+        self.record_audio_tee_pads = []
+        self.bitrate_controllers = []
+        self.latency_stampers = []
+        self.bonders = []
+        for state in self.output_states:
+            if state and state['retry_source']:
+                GLib.source_remove(state['retry_source'])
+        self.output_states = []
 
         num_streams = len(self.desired_video_streams)
         if num_streams == 0:
@@ -100,87 +282,641 @@ class StreamManager:
             self.current_video_streams = []
             return
 
-        for idx, stream in enumerate(self.desired_video_streams):
-            camera_num = idx + 1
-            channel = stream['channel']
-
-            # User provides bitrate in Kbps; convert to bps
-            bitrate_kbps = channel.get('bitrate', 2000)  # default 2000 Kbps
-            bitrate = bitrate_kbps * 1000  # Convert Kbps to bps
-            resolution = channel.get('resolution', {'width': 1920, 'height': 1080})
-            width = resolution.get('width', 1920)
-            height = resolution.get('height', 1080)
-            rtmp_url = channel.get('streamEndpoint', '')  # Updated from rtmp_url to streamEndpoint
-
-            # Create the fallback videotestsrc pipeline
-            gcommand += f"""
-                videotestsrc pattern=0 is-live=1 name=videotestsrc{camera_num} ! videoconvert ! video/x-raw,width={width},height={height} ! source_compositor{camera_num}.sink_0
-                input-selector name=source_compositor{camera_num} sync-mode=1 ! videoconvert ! video/x-raw,format=NV12 !
-                mpph264enc name=encoder{camera_num} profile=main qos=1 header-mode=1 bps={bitrate} bps-max={bitrate + 1000000} rc-mode=vbr ! h264parse config-interval=1 ! queue ! flvmux name=mux{camera_num} streamable=1 ! rtmp2sink sync=0 name=rtmpsink{camera_num}{self.label} location="{rtmp_url}"
-            """
-
-        # Setup audio pipeline
-        if self.audio_device:
-            audio_input = f'alsasrc device={self.audio_device} ! audioresample ! audio/x-raw,rate=48000 ! voaacenc bitrate=96000 ! aacparse ! audio/mpeg, mpegversion=4 '
-        else:
-            audio_input = f'audiotestsrc is-live=1 wave=silence ! audioresample ! audio/x-raw,rate=48000 ! voaacenc bitrate=96000 ! aacparse ! audio/mpeg, mpegversion=4 '
-
-        # Link audio to mux elements based on the number of streams
-        if num_streams == 1:
-            gcommand += f"{audio_input} ! queue ! mux1.audio"
-        elif num_streams > 1:
-            gcommand += f"{audio_input} ! tee name=audiotee "
-            for idx in range(num_streams):
-                camera_num = idx + 1
-                gcommand += f"audiotee. ! queue ! mux{camera_num}.audio "
-        else:
-            logger.info("No video streams defined in stream settings.")
-            self.current_video_streams = []
-            return
+        # Each stream lives in its own bins so it can be rebuilt without touching the others:
+        #   stream{N}: fallback source, input-selector (plus the camera chain), encoder, parser, tee
+        #   output{N}: muxer and RTMP, SRT or RIST sink
+        #   dvr{N}: optional segmented recording to the local ring buffer
+        # Streams sharing another stream's encode only have an output, fed from its tee,
+        # and streams sharing a camera are fed from the capture tee of the first one.
+        # Each distinct audio source is encoded once and shared through a tee.
+        self.pipeline = Gst.Pipeline.new(f'pipeline{self.label}')
 
-        logger.info(f'GStreamer pipeline:\n{gcommand}\n')
+        # Get the bus to handle messages
+        self.bus = self.pipeline.get_bus()
+        self.bus.add_signal_watch()
+        self.bus.connect("message", self.on_bus_message)
+        self.bus.enable_sync_message_emission()
+        self.bus.connect("sync-message::error", self.on_sync_error)
 
         # Create and set up the pipeline
         try:
-            self.pipeline = Gst.parse_launch(gcommand)
+            for idx in range(num_streams):
+                self.add_stream(idx)
         except Exception as e:
             logger.error(f"Failed to create pipeline: {e}")
+            self.pipeline.set_state(Gst.State.NULL)
+            self.pipeline = None
             return
 
-        # Get the bus to handle messages
-        self.bus = self.pipeline.get_bus()
-        self.bus.add_signal_watch()
-        self.bus.connect("message", self.on_bus_message)
+        self.pipeline.set_state(Gst.State.PLAYING)
+
+        # Copy current configuration
+        self.current_video_streams = copy.deepcopy(self.desired_video_streams)
+        self.current_audio_device = self.audio_device  # Update current audio device
 
-        # Set the input-selector to initially use the videotestsrc
-        for idx in range(num_streams):
+    def stream_graph(self, camera_num, channel):
+        # User provides bitrate in Kbps; convert to bps
+        bitrate_kbps = channel.get('bitrate', 2000)  # default 2000 Kbps
+        bitrate = bitrate_kbps * 1000  # Convert Kbps to bps
+        width, height, framerate = stream_size(channel)
+        latency = get_latency_profile(channel)
+        factory = self.element_profile['encoder']
+        builder = GraphBuilder(f'stream{camera_num}', self.element_pool)
+
+        # Create the fallback source, the stream's slate or else the test pattern. Every input
+        # of the selector already produces NV12 at the stream size, so the encoder needs no conversion.
+        slate = make_slate_source(channel['slate'], width, height, framerate) if channel.get('slate') else None
+        if slate:
+            builder.bin.add(slate.bin)
+            fallback = slate.bin
+        else:
+            source = builder.add('videotestsrc', f'videotestsrc{camera_num}', {'pattern': 0, 'is-live': True})
+            fallback = builder.caps(output_caps(width, height, framerate))
+            builder.chain(source, fallback)
+        selector = builder.add('input-selector', f'source_compositor{camera_num}', {'sync-mode': 1})
+        encoder = builder.add(factory, f'encoder{camera_num}',
+                              encoder_properties(factory, bitrate, latency, framerate))
+        parser = builder.add('h264parse', f'parser{camera_num}', {'config-interval': 1})
+        video_tee = builder.add('tee', f'videotee{camera_num}', {'allow-not-linked': True})
+        builder.link_pads(fallback, 'src', selector, 'sink_0')
+        builder.chain(selector, encoder, parser)
+        if channel.get('latencyStamps'):
+            # Diagnostic mode: capture and encode times ride along in SEI NALs
+            hop_sink, hop_src = add_stamp_hop(builder, camera_num)
+            builder.chain(parser, hop_sink)
+            builder.chain(hop_src, video_tee)
+        else:
+            builder.chain(parser, video_tee)
+        builder.ghost('video', video_tee.get_request_pad('src_%u'))
+        return builder.bin, slate
+
+    def output_graph(self, camera_num, channel):
+        latency = get_latency_profile(channel)
+        name = transport_name(channel.get('streamEndpoint', ''))
+        transport = TRANSPORTS[name]
+        builder = GraphBuilder(f'output{camera_num}', self.element_pool)
+        mux = builder.add(transport['muxer'], f'mux{camera_num}', muxer_properties(name, latency))
+        for pad_name, mux_pad in zip(('video', 'audio'), transport['mux_pads']):
+            # Leaky queues let a stalled sink drop its oldest data instead of blocking the encoder,
+            # the latency profile bounds how much media they (and the muxer) hold back
+            queue = builder.add('queue', f'{pad_name}queue{camera_num}', {
+                'leaky': 'downstream',
+                'max-size-buffers': 0,
+                'max-size-bytes': 0,
+                'max-size-time': latency['output_queue_time'],
+            })
+            builder.link_pads(queue, 'src', mux, mux_pad)
+            builder.ghost(pad_name, queue.get_static_pad('sink'))
+        elements = [mux]
+        if transport['payloader']:
+            elements.append(builder.add(transport['payloader'], f'pay{camera_num}'))
+        builder.chain(*elements, self.output_sink(builder, camera_num, channel))
+        return builder.bin
+
+    def output_sink(self, builder, camera_num, channel):
+        # Sinks of every transport are named rtmpsink{camera_num}{label}, the error handling
+        # and reconnection find them by that name. The endpoint is set as a property, it never needs quoting.
+        name = transport_name(channel.get('streamEndpoint', ''))
+        return builder.add(TRANSPORTS[name]['sink'], f'rtmpsink{camera_num}{self.label}',
+                           sink_properties(name, channel, get_latency_profile(channel)))
+
+    def dvr_graph(self, camera_num, dvr, ring):
+        # MPEG-TS segments stay playable when the device loses power mid-segment.
+        # The queues are bounded and leaky so a slow disk never holds more than
+        # a couple of seconds of media in memory or stalls the encoder.
+        builder = GraphBuilder(f'dvr{camera_num}', self.element_pool)
+        sink = builder.add('splitmuxsink', f'dvrsink{camera_num}', {
+            'muxer-factory': 'mpegtsmux',
+            'send-keyframe-requests': True,
+            'max-size-time': dvr['segmentSeconds'] * Gst.SECOND,
+        })
+        sink.connect('format-location', lambda splitmux, fragment_id: ring.next_location(fragment_id))
+        for pad_name, sink_pad in (('video', 'video'), ('audio', 'audio_%u')):
+            queue = builder.add('queue', f'dvr{pad_name}queue{camera_num}', {
+                'leaky': 'downstream',
+                'max-size-buffers': 0,
+                'max-size-bytes': 0,
+                'max-size-time': OUTPUT_QUEUE_TIME,
+            })
+            builder.link_pads(queue, 'src', sink, sink_pad)
+            builder.ghost(pad_name, queue.get_static_pad('sink'))
+        return builder.bin
+
+    def record_graph(self, camera_num, record, ring):
+        # Each pad gets a queue of its own, the queue threads do the muxing and
+        # file writes. They are bounded and leaky so a slow disk drops recorded
+        # media instead of stalling the encoder feeding the RTMP output.
+        builder = GraphBuilder(f'record{camera_num}', self.element_pool)
+        muxer, extension = RECORD_FORMATS[record['format']]
+        properties = {
+            'muxer-factory': muxer,
+            'send-keyframe-requests': True,
+            'max-size-time': record['segmentSeconds'] * Gst.SECOND,
+            'max-size-bytes': record['segmentBytes'],
+        }
+        if muxer == 'mp4mux':
+            # Keep the index up to date on disk so a power cut does not lose the whole file
+            properties['muxer-properties'] = Gst.Structure.new_from_string(
+                f"properties,reserved-max-duration=(guint64){(record['segmentSeconds'] + 60) * Gst.SECOND},"
+                f"reserved-moov-update-period=(guint64){MOOV_UPDATE_SECONDS * Gst.SECOND}")
+        writer = Gst.ElementFactory.make('filesink', f'recordfile{camera_num}')
+        if writer is None:
+            raise RuntimeError("Failed to create filesink element")
+        set_properties(writer, {'buffer-mode': 'full', 'buffer-size': WRITE_BUFFER_BYTES})
+        properties['sink'] = writer
+        sink = builder.add('splitmuxsink', f'recordsink{camera_num}', properties)
+        sink.connect('format-location', lambda splitmux, fragment_id: ring.next_location(fragment_id))
+        queues = []
+        for pad_name, sink_pad in (('video', 'video'), ('audio', 'audio_%u')):
+            queue = builder.add('queue', f'record{pad_name}queue{camera_num}', {
+                'leaky': 'downstream',
+                'max-size-buffers': 0,
+                'max-size-bytes': RECORD_QUEUE_BYTES,
+                'max-size-time': 0,
+            })
+            builder.link_pads(queue, 'src', sink, sink_pad)
+            builder.ghost(pad_name, queue.get_static_pad('sink'))
+            queues.append(queue)
+        self.telemetry.watch_recording(camera_num, writer.get_static_pad('sink'), queues)
+        return builder.bin
+
+    def discard_bin(self, bin):
+        # Keep the costly elements for the next rebuild, without the probes of their last use.
+        # The bin must be stopped and out of the pipeline already.
+        self.telemetry.untrace(bin)
+        self.element_pool.recycle(bin)
+
+    def audio_key(self, idx):
+        return stream_audio_key(self.stream_settings, self.desired_video_streams[idx]['channel'])
+
+    def get_audio_tee(self, key):
+        # Streams with the same sources and bitrate share one encode
+        group = self.audio_groups.get(key)
+        if group is None:
+            self.audio_group_count += 1
+            audio_bin, silence = make_audio_source(key)
+            audio_bin.set_name(f'audiosrc{self.audio_group_count}')
+            tee = Gst.ElementFactory.make('tee', f'audiotee{self.audio_group_count}')
+            tee.set_property('allow-not-linked', True)
+            self.pipeline.add(audio_bin)
+            self.pipeline.add(tee)
+            if not audio_bin.link(tee):
+                raise RuntimeError("Failed to link audio source to audio tee")
+            tee.sync_state_with_parent()
+            audio_bin.sync_state_with_parent()
+            group = {'bin': audio_bin, 'tee': tee, 'silence': silence}
+            self.audio_groups[key] = group
+            logger.info(f"Added audio source {audio_bin.get_name()} for {'silence' if silence else key}")
+        return group['tee']
+
+    def prune_audio_sources(self):
+        # Drop the encodes no stream uses any more
+        in_use = set(self.audio_keys)
+        for key in [key for key in self.audio_groups if key not in in_use]:
+            group = self.audio_groups.pop(key)
+            group['bin'].set_state(Gst.State.NULL)
+            group['bin'].unlink(group['tee'])
+            group['tee'].set_state(Gst.State.NULL)
+            self.pipeline.remove(group['bin'])
+            self.pipeline.remove(group['tee'])
+            logger.info(f"Removed audio source {group['bin'].get_name()}")
+
+    def reroute_audio(self, idx):
+        # Outputs, DVR and recordings request their audio pads from the tee of the stream's key
+        self.remove_dvr(idx)
+        self.remove_recording(idx)
+        self.replace_output(idx)
+        self.add_dvr(idx)
+        self.add_recording(idx)
+
+    def allocate_stream_slots(self, idx):
+        # Grow the per-stream lists so that idx is a valid index
+        while len(self.stream_bins) <= idx:
+            self.stream_bins.append(None)
+            self.output_bins.append(None)
+            self.audio_tee_pads.append(None)
+            self.audio_keys.append(None)
+            self.compositors.append(None)
             self.camera_connected.append(False)
             self.camera_elements.append(None)
             self.camera_sink_pads.append(None)
-            self.v4l2src_elements.append(None)
+            self.camera_bins.append(None)
+            self.camera_starts.append(None)
+            self.capture_sources.append(None)
+            self.camera_feeds.append(None)
+            self.stream_sizes.append(None)
+            self.capture_sizes.append(None)
+            self.encode_sources.append(None)
+            self.video_pads.append(None)
+            self.rtmp_sink_elements.append(None)
+            self.camera_candidates.append(None)
+            self.active_cameras.append(None)
+            self.slates.append(None)
+            self.composite_tiles.append(None)
+            self.output_states.append(None)
+            self.dvr_bins.append(None)
+            self.dvr_rings.append(None)
+            self.dvr_video_pads.append(None)
+            self.dvr_audio_tee_pads.append(None)
+            self.record_bins.append(None)
+            self.record_rings.append(None)
+            self.record_video_pads.append(None)
+            self.record_audio_tee_pads.append(None)
+            self.bitrate_controllers.append(None)
+            self.latency_stampers.append(None)
+            self.bonders.append(None)
+
+    def release_stream_slots(self, idx):
+        # Only the last stream can be dropped, as elements are numbered by position
+        for slots in (self.stream_bins, self.output_bins, self.audio_tee_pads, self.audio_keys, self.compositors,
+                      self.camera_connected, self.camera_elements, self.camera_sink_pads,
+                      self.camera_bins, self.camera_starts,
+                      self.capture_sources, self.camera_feeds, self.stream_sizes, self.capture_sizes,
+                      self.encode_sources, self.video_pads,
+                      self.rtmp_sink_elements, self.camera_candidates, self.active_cameras, self.slates,
+                      self.composite_tiles,
+                      self.output_states,
+                      self.dvr_bins, self.dvr_rings, self.dvr_video_pads, self.dvr_audio_tee_pads,
+                      self.record_bins, self.record_rings, self.record_video_pads, self.record_audio_tee_pads,
+                      self.bitrate_controllers, self.latency_stampers, self.bonders):
+            del slots[idx]
+
+    def add_stream(self, idx):
+        camera_num = idx + 1
+        stream = self.desired_video_streams[idx]
+        channel = stream['channel']
+        self.allocate_stream_slots(idx)
+        self.capture_sources[idx] = stream.get('capture', idx)
+        self.encode_sources[idx] = stream.get('encode', idx)
+        if self.encode_sources[idx] != idx:
+            # Same encode settings as an earlier rendition: only an output of our own
+            self.add_output(idx)
+            return
 
-            camera_num = idx + 1
-            compositor = self.pipeline.get_by_name(f'source_compositor{camera_num}')
-            self.compositors.append(compositor)
+        stream_bin, self.slates[idx] = self.stream_graph(camera_num, channel)
+        self.pipeline.add(stream_bin)
+
+        compositor = stream_bin.get_by_name(f'source_compositor{camera_num}')
+        self.stream_bins[idx] = stream_bin
+        self.telemetry.watch_stream(camera_num, stream_bin.get_by_name(f'videotee{camera_num}').get_static_pad('sink'))
+        # A new encoder starts at the channel bitrate, and so does its controller
+        bounds = abr_settings(channel)
+        self.bitrate_controllers[idx] = BitrateController(*bounds) if bounds else None
+        self.latency_stampers[idx] = LatencyStamper(stream_bin, camera_num) if channel.get('latencyStamps') else None
+        self.compositors[idx] = compositor
+        self.camera_connected[idx] = False
+        self.camera_candidates[idx] = []
+        self.stream_sizes[idx] = stream_size(channel)
+
+        # Set the input-selector to initially use the fallback source
+        sink_pad = compositor.get_static_pad('sink_0')
+        if sink_pad:
+            compositor.set_property("active-pad", sink_pad)
+        else:
+            logger.warning(f"Warning: Could not find sink_0 pad on source_compositor{camera_num}")
+
+        self.add_output(idx)
+        self.add_dvr(idx)
+        self.add_recording(idx)
+        stream_bin.sync_state_with_parent()
+
+        # Outputs sharing this encode lost their source when it was last removed
+        for shared in self.encode_outputs(idx):
+            if shared != idx and self.output_bins[shared] is None:
+                self.add_output(shared)
+
+    def encode_outputs(self, idx):
+        # Outputs fed by the encoder of stream idx, its own included
+        return [out for out, source in enumerate(self.encode_sources) if source == idx]
+
+    def capture_consumers(self, idx):
+        # Streams with an encoder of their own fed by the camera opened by stream idx
+        return [consumer for consumer, source in enumerate(self.capture_sources)
+                if source == idx and self.stream_bins[consumer]]
+
+    def remove_stream(self, idx):
+        state = self.output_states[idx]
+        if state and state['retry_source']:
+            GLib.source_remove(state['retry_source'])
+        self.output_states[idx] = None
+
+        # Other streams may be fed from this stream's capture or encoder tees
+        self.remove_camera_pipeline(idx)
+        for shared in self.encode_outputs(idx):
+            if shared != idx:
+                self.remove_output(shared)
+
+        stream_bin = self.stream_bins[idx]
+        if stream_bin:
+            # Stop the producer first so nothing is pushed into the output being removed
+            stream_bin.set_state(Gst.State.NULL)
+        self.remove_output(idx)
+        self.stop_bonder(idx)
+        self.remove_dvr(idx)
+        self.remove_recording(idx)
+        if stream_bin:
+            self.pipeline.remove(stream_bin)
+            self.discard_bin(stream_bin)
+        self.stream_bins[idx] = None
+        self.bitrate_controllers[idx] = None
+        self.latency_stampers[idx] = None
+        self.compositors[idx] = None
+        self.camera_connected[idx] = False
+        self.camera_elements[idx] = None
+        self.camera_sink_pads[idx] = None
+        self.slates[idx] = None
+        self.stream_sizes[idx] = None
+        logger.info(f"Removed stream {idx+1}.")
+
+    def add_output(self, idx):
+        camera_num = idx + 1
+        channel = self.desired_video_streams[idx]['channel']
+        bonder = self.update_bonder(idx, channel)
+        if bonder:
+            # The sink sends to the bonder, which stripes the stream over every uplink
+            channel = dict(channel, streamEndpoint=bonder.local_endpoint(channel.get('streamEndpoint', '')))
+
+        output_bin = self.output_graph(camera_num, channel)
+        self.pipeline.add(output_bin)
+
+        source = self.encode_sources[idx]
+        stream_bin = self.stream_bins[source]
+        if source == idx:
+            stream_pad = stream_bin.get_static_pad('video')
+        else:
+            # Fan the shared encode out through another pad of its tee
+            video_tee = stream_bin.get_by_name(f'videotee{source+1}')
+            stream_pad = Gst.GhostPad.new(f'video{camera_num}', video_tee.get_request_pad('src_%u'))
+            stream_pad.set_active(True)
+            stream_bin.add_pad(stream_pad)
+        if stream_pad.link(output_bin.get_static_pad('video')) != Gst.PadLinkReturn.OK:
+            raise RuntimeError(f"Failed to link stream {source+1} to output {camera_num}")
+        self.video_pads[idx] = stream_pad
+        key = self.audio_key(idx)
+        tee_pad = self.get_audio_tee(key).get_request_pad('src_%u')
+        if tee_pad.link(output_bin.get_static_pad('audio')) != Gst.PadLinkReturn.OK:
+            raise RuntimeError(f"Failed to link audio to output {camera_num}")
+        self.audio_keys[idx] = key
+
+        self.output_bins[idx] = output_bin
+        self.audio_tee_pads[idx] = tee_pad
+        rtmp_sink = output_bin.get_by_name(f'rtmpsink{camera_num}{self.label}')
+        self.rtmp_sink_elements[idx] = rtmp_sink
+        if self.output_states[idx] is None:
+            self.output_states[idx] = {
+                'backoff': Backoff(initial=1, maximum=60),
+                'retry_source': None,
+                'checking_network': False,
+                'drop_probes': [],
+                'down_since': None,
+                'frames_lost': 0,
+                'reconnects': 0,
+                'last_reconnect_latency': None,
+            }
+        rtmp_sink.get_static_pad('sink').add_probe(Gst.PadProbeType.BUFFER, self.on_first_output_buffer, idx)
+        output_bin.sync_state_with_parent()
+
+    def remove_output(self, idx):
+        output_bin = self.output_bins[idx]
+        if not output_bin:
+            return
+        video_pad = output_bin.get_static_pad('video')
+        peer = video_pad.get_peer()
+        if peer:
+            peer.unlink(video_pad)
+        tee_pad = self.audio_tee_pads[idx]
+        if tee_pad:
+            tee_pad.unlink(output_bin.get_static_pad('audio'))
+        output_bin.set_state(Gst.State.NULL)
+        self.pipeline.remove(output_bin)
+        self.discard_bin(output_bin)
+        if tee_pad:
+            tee_pad.get_parent_element().release_request_pad(tee_pad)
+        stream_pad = self.video_pads[idx]
+        if stream_pad and self.encode_sources[idx] != idx:
+            # Give the shared encoder's tee pad back
+            stream_bin = stream_pad.get_parent_element()
+            tee_src_pad = stream_pad.get_target()
+            stream_bin.remove_pad(stream_pad)
+            tee_src_pad.get_parent_element().release_request_pad(tee_src_pad)
+        self.video_pads[idx] = None
+        self.output_bins[idx] = None
+        self.audio_tee_pads[idx] = None
+        self.audio_keys[idx] = None
+        self.rtmp_sink_elements[idx] = None
+
+    def replace_output(self, idx):
+        # Drop the encoded stream while the output is swapped so the encoder never sees not-linked
+        self.isolate_output(idx)
+        try:
+            self.remove_output(idx)
+            self.add_output(idx)
+        finally:
+            self.restore_output(idx)
+
+    def update_bonder(self, idx, channel):
+        # Bonders outlive output replacements and reconnects, they only change with their settings
+        bonding = bonding_settings(channel)
+        if bonding and transport_name(channel.get('streamEndpoint', '')) != SRT:
+            logger.warning(f"Bonding only applies to SRT outputs, stream {idx+1} sends over the default route")
+            bonding = None
+        bonder = self.bonders[idx]
+        if bonder and (bonding is None or (bonder.receiver, bonder.interfaces) != (bonding['receiver'],
+                                                                                  bonding['interfaces'])):
+            self.stop_bonder(idx)
+            bonder = None
+        if bonding and bonder is None:
+            bonder = LinkBonder(bonding['receiver'], bonding['interfaces'])
+            bonder.start()
+            get_link_monitor().add_listener(bonder.set_links)
+            self.bonders[idx] = bonder
+            self.telemetry.watch_bonder(idx + 1, bonder)
+        return bonder
+
+    def stop_bonder(self, idx):
+        bonder = self.bonders[idx]
+        if bonder is None:
+            return
+        get_link_monitor().remove_listener(bonder.set_links)
+        bonder.stop()
+        self.telemetry.unwatch_bonder(idx + 1)
+        self.bonders[idx] = None
 
-            # Set to use the fallback (videotestsrc)
-            sink_pad = compositor.get_static_pad('sink_0')
-            if sink_pad:
-                compositor.set_property("active-pad", sink_pad)
-            else:
-                logger.warning(f"Warning: Could not find sink_0 pad on source_compositor{camera_num}")
+    def get_bonding_stats(self):
+        """Get the round trip time, throughput, loss and weight of each bonded stream's links."""
+        return {idx + 1: bonder.stats() for idx, bonder in enumerate(self.bonders) if bonder}
 
-            # Store RTMP sink element for dynamic updates
-            rtmp_sink = self.pipeline.get_by_name(f'rtmpsink{camera_num}{self.label}')
-            self.rtmp_sink_elements.append(rtmp_sink)
+    def add_dvr(self, idx):
+        camera_num = idx + 1
+        dvr = dvr_settings(self.desired_video_streams[idx]['channel'])
+        if dvr is None or self.encode_sources[idx] != idx:
+            # Each encode is recorded once, by the stream that runs it
+            self.dvr_rings[idx] = None
+            return
 
-        self.pipeline.set_state(Gst.State.PLAYING)
+        # The ring outlives its bin so an outage in progress survives a rebuild
+        ring = self.dvr_rings[idx]
+        if ring is None:
+            directory = os.path.join(get_dvr_dir(), f'stream{camera_num}')
+            ring = SegmentRing(directory, dvr['maxBytes'], dvr['maxSeconds'], self.dvr_uploader)
+            self.dvr_rings[idx] = ring
+        else:
+            ring.set_limits(dvr['maxBytes'], dvr['maxSeconds'])
+
+        dvr_bin = self.dvr_graph(camera_num, dvr, ring)
+        self.pipeline.add(dvr_bin)
+
+        stream_bin = self.stream_bins[idx]
+        video_tee = stream_bin.get_by_name(f'videotee{camera_num}')
+        video_pad = Gst.GhostPad.new('dvr', video_tee.get_request_pad('src_%u'))
+        video_pad.set_active(True)
+        stream_bin.add_pad(video_pad)
+        if video_pad.link(dvr_bin.get_static_pad('video')) != Gst.PadLinkReturn.OK:
+            raise RuntimeError(f"Failed to link stream {camera_num} to its DVR")
+        tee_pad = self.get_audio_tee(self.audio_keys[idx]).get_request_pad('src_%u')
+        if tee_pad.link(dvr_bin.get_static_pad('audio')) != Gst.PadLinkReturn.OK:
+            raise RuntimeError(f"Failed to link audio to DVR {camera_num}")
+
+        self.dvr_bins[idx] = dvr_bin
+        self.dvr_video_pads[idx] = video_pad
+        self.dvr_audio_tee_pads[idx] = tee_pad
+        dvr_bin.sync_state_with_parent()
+        logger.info(f"Recording stream {camera_num} to the DVR ring in {ring.directory}")
+
+    def remove_dvr(self, idx):
+        dvr_bin = self.dvr_bins[idx]
+        if not dvr_bin:
+            return
+        # Unlink first: the tees allow not-linked pads, so the stream keeps flowing
+        video_pad = self.dvr_video_pads[idx]
+        video_pad.unlink(dvr_bin.get_static_pad('video'))
+        tee_pad = self.dvr_audio_tee_pads[idx]
+        tee_pad.unlink(dvr_bin.get_static_pad('audio'))
+        dvr_bin.set_state(Gst.State.NULL)
+        self.pipeline.remove(dvr_bin)
+        self.discard_bin(dvr_bin)
+        tee_pad.get_parent_element().release_request_pad(tee_pad)
+
+        stream_bin = self.stream_bins[idx]
+        tee_src_pad = video_pad.get_target()
+        stream_bin.remove_pad(video_pad)
+        stream_bin.get_by_name(f'videotee{idx+1}').release_request_pad(tee_src_pad)
+
+        # The segment being written was cut short but is still playable
+        if self.dvr_rings[idx]:
+            self.dvr_rings[idx].close_open_segments()
+        self.dvr_bins[idx] = None
+        self.dvr_video_pads[idx] = None
+        self.dvr_audio_tee_pads[idx] = None
+
+    def replace_dvr(self, idx):
+        self.remove_dvr(idx)
+        self.add_dvr(idx)
+
+    def add_recording(self, idx):
+        camera_num = idx + 1
+        record = record_settings(self.desired_video_streams[idx]['channel'])
+        if record is None or self.encode_sources[idx] != idx:
+            # Each encode is recorded once, by the stream that runs it
+            self.record_rings[idx] = None
+            return
 
-        # Copy current configuration
-        self.current_video_streams = copy.deepcopy(self.desired_video_streams)
-        self.current_audio_device = self.audio_device  # Update current audio device
+        extension = RECORD_FORMATS[record['format']][1]
+        ring = self.record_rings[idx]
+        if ring is None or ring.extension != extension:
+            directory = os.path.join(get_record_dir(), f'stream{camera_num}')
+            ring = RecordingRing(directory, extension, record['maxBytes'], record['minFreeBytes'])
+            self.record_rings[idx] = ring
+        else:
+            ring.set_quota(record['maxBytes'], record['minFreeBytes'])
+
+        record_bin = self.record_graph(camera_num, record, ring)
+        self.pipeline.add(record_bin)
+
+        stream_bin = self.stream_bins[idx]
+        video_tee = stream_bin.get_by_name(f'videotee{camera_num}')
+        video_pad = Gst.GhostPad.new('record', video_tee.get_request_pad('src_%u'))
+        video_pad.set_active(True)
+        stream_bin.add_pad(video_pad)
+        if video_pad.link(record_bin.get_static_pad('video')) != Gst.PadLinkReturn.OK:
+            raise RuntimeError(f"Failed to link stream {camera_num} to its recording")
+        tee_pad = self.get_audio_tee(self.audio_keys[idx]).get_request_pad('src_%u')
+        if tee_pad.link(record_bin.get_static_pad('audio')) != Gst.PadLinkReturn.OK:
+            raise RuntimeError(f"Failed to link audio to recording {camera_num}")
+
+        self.record_bins[idx] = record_bin
+        self.record_video_pads[idx] = video_pad
+        self.record_audio_tee_pads[idx] = tee_pad
+        record_bin.sync_state_with_parent()
+        logger.info(f"Recording stream {camera_num} to {record['format']} files in {ring.directory}")
+
+    def remove_recording(self, idx):
+        record_bin = self.record_bins[idx]
+        if not record_bin:
+            return
+        # Unlink first: the tees allow not-linked pads, so the stream keeps flowing
+        video_pad = self.record_video_pads[idx]
+        video_pad.unlink(record_bin.get_static_pad('video'))
+        tee_pad = self.record_audio_tee_pads[idx]
+        tee_pad.unlink(record_bin.get_static_pad('audio'))
+        record_bin.set_state(Gst.State.NULL)
+        self.pipeline.remove(record_bin)
+        self.discard_bin(record_bin)
+        self.telemetry.unwatch_recording(idx + 1)
+        tee_pad.get_parent_element().release_request_pad(tee_pad)
+
+        stream_bin = self.stream_bins[idx]
+        tee_src_pad = video_pad.get_target()
+        stream_bin.remove_pad(video_pad)
+        stream_bin.get_by_name(f'videotee{idx+1}').release_request_pad(tee_src_pad)
+
+        # The file being written was cut short, it counts towards the quota all the same
+        if self.record_rings[idx]:
+            self.record_rings[idx].close_open_segments()
+        self.record_bins[idx] = None
+        self.record_video_pads[idx] = None
+        self.record_audio_tee_pads[idx] = None
+
+    def replace_recording(self, idx):
+        self.remove_recording(idx)
+        self.add_recording(idx)
+
+    def get_recording_stats(self):
+        """Get the quota use of each stream's local recordings.
+
+        Returns:
+            Dictionary with one entry per recording stream
+        """
+        return {idx + 1: ring.stats() for idx, ring in enumerate(self.record_rings) if ring}
+
+    def get_dvr_stats(self):
+        """Get the fill level and eviction counters of each stream's DVR ring.
+
+        Returns:
+            Dictionary with one entry per recording stream and the backfill upload counters
+        """
+        streams = {}
+        for idx, ring in enumerate(self.dvr_rings):
+            if ring:
+                streams[idx + 1] = ring.stats()
+        return {'streams': streams, 'backfill': self.dvr_uploader.stats()}
+
+    def reconnect_camera(self, idx):
+        if not self.stream_bins[idx]:
+            # The stream shares another stream's encode and has no camera of its own
+            return
+        if self.camera_connected[idx]:
+            self.switch_to_videotestsrc(idx)
+            self.camera_connected[idx] = False
+        self.remove_camera_pipeline(idx)
+        if any(self.camera_addresses(idx)):
+            self.try_connect_camera(idx)
 
     def check_stream_info(self):
+        # Nothing to diff when the settings did not move since the last check
+        if self.get_settings_version and self.get_settings_version() == self.settings_version:
+            return True
+
         # Store previous enabled state
         was_enabled = self.is_enabled
         # Store previous audio device
@@ -197,146 +933,247 @@ class StreamManager:
                 self.build_pipeline()
             else:
                 logger.info(f'Stopping stream')
-                if self.pipeline:
-                    self.pipeline.set_state(Gst.State.NULL)
-                    self.pipeline = None
+                self.destroy_pipeline()
             return True
 
         # Only check for other changes if streaming is enabled
         if not self.is_enabled:
             return True
 
-        changes_require_rebuild = False
+        # Nothing running to reconfigure, build from scratch
+        if not self.pipeline or not self.desired_video_streams:
+            if self.desired_video_streams or self.current_video_streams:
+                self.build_pipeline()
+            return True
 
-        # Check if the audio device has changed
-        if prev_audio_device != self.audio_device:
-            logger.info(f"Audio device changed from {prev_audio_device} to {self.audio_device}. Rebuilding pipeline.")
-            changes_require_rebuild = True
-
-        # Check if the number of streams has changed
-        if len(self.desired_video_streams) != len(self.current_video_streams):
-            logger.info("Number of video streams has changed.")
-            changes_require_rebuild = True
-        else:
-            # Loop through each stream
-            for idx, stream in enumerate(self.desired_video_streams):
-                current_stream = self.current_video_streams[idx]
-                # Compare RTMP URLs (streamEndpoint)
-                desired_rtmp_url = stream['channel'].get('streamEndpoint', '')
-                current_rtmp_url = current_stream['channel'].get('streamEndpoint', '')
-                if desired_rtmp_url != current_rtmp_url:
-                    logger.info(f"RTMP URL for stream {idx+1} has changed. Rebuilding pipeline.")
-                    changes_require_rebuild = True
-                    break
-                # Compare camera paths
-                desired_camera = stream['camera']
-                current_camera = current_stream['camera']
-                if desired_camera != current_camera:
-                    logger.info(f"Camera for stream {idx+1} has changed. Rebuilding pipeline.")
-                    changes_require_rebuild = True
-                    break
-                # Compare resolution
-                desired_resolution = stream['channel'].get('resolution', {})
-                current_resolution = current_stream['channel'].get('resolution', {})
-                if desired_resolution != current_resolution:
-                    logger.info(f"Resolution for stream {idx+1} has changed. Rebuilding pipeline.")
-                    changes_require_rebuild = True
-                    break
-                # Compare framerate
-                desired_framerate = stream['channel'].get('frameRate')  # Updated from framerate to frameRate
-                current_framerate = current_stream['channel'].get('frameRate')  # Updated from framerate to frameRate
-                if desired_framerate != current_framerate:
-                    logger.info(f"Framerate for stream {idx+1} has changed. Rebuilding pipeline.")
-                    changes_require_rebuild = True
-                    break
-
-        if changes_require_rebuild:
-            logger.info("Rebuilding pipeline with new configuration.")
-            if self.pipeline:
-                self.pipeline.set_state(Gst.State.NULL)
-            self.build_pipeline()
-        else:
-            # Update RTMP URLs dynamically
-            for idx, stream in enumerate(self.desired_video_streams):
-                current_stream = self.current_video_streams[idx]
-                new_rtmp_url = stream['channel'].get('streamEndpoint', '')  # Updated from rtmp_url to streamEndpoint
-                old_rtmp_url = current_stream['channel'].get('streamEndpoint', '')  # Updated from rtmp_url to streamEndpoint
-                if new_rtmp_url != old_rtmp_url:
-                    logger.info(f"Updating RTMP URL for stream {idx+1}.")
-                    rtmp_sink = self.rtmp_sink_elements[idx]
-                    if rtmp_sink:
-                        rtmp_sink.set_property('location', new_rtmp_url)
-                    self.current_video_streams[idx]['channel']['streamEndpoint'] = new_rtmp_url  # Updated from rtmp_url to streamEndpoint
-
-            # Update camera settings dynamically if possible
-            for idx, stream in enumerate(self.desired_video_streams):
-                current_stream = self.current_video_streams[idx]
-                # Determine which settings have changed
-                changed_settings = {}
-                # Check for bitrate change
-                if stream['channel'].get('bitrate') != current_stream['channel'].get('bitrate'):
-                    changed_settings['bitrate'] = stream['channel'].get('bitrate')
-                # Check for white balance change
-                if stream['channel'].get('whiteBalance') != current_stream['channel'].get('whiteBalance'):  # Updated from white_balance to whiteBalance
-                    changed_settings['whiteBalance'] = stream['channel'].get('whiteBalance')  # Updated from white_balance to whiteBalance
-
-                if changed_settings:
-                    logger.info(f"Updating channel settings for stream {idx+1}.")
-                    self.update_camera_settings(idx, stream['channel'], changed_settings)
-                    # Update only the dynamic settings in current_video_streams
-                    for key in changed_settings:
-                        current_stream['channel'][key] = stream['channel'].get(key)
+        plan = diff_streams(self.current_video_streams, self.desired_video_streams,
+                            prev_audio_device, self.audio_device)
+        if not plan.is_empty():
+            logger.info(f"Reconfiguring pipeline: {plan}")
+            self.apply_reconfigure_plan(plan)
 
         return True  # Continue calling this function periodically
 
+    def apply_reconfigure_plan(self, plan):
+        if plan.audio_changed:
+            logger.info(f"Audio device changed from {self.current_audio_device} to {self.audio_device}.")
+            self.current_audio_device = self.audio_device
+
+        for idx in plan.removed:
+            logger.info(f"Stream {idx+1} was removed.")
+            self.remove_stream(idx)
+            self.release_stream_slots(idx)
+
+        for idx, branches in plan.rebuild.items():
+            if ENCODER in branches:
+                logger.info(f"Encoder settings for stream {idx+1} have changed. Rebuilding stream.")
+                self.remove_stream(idx)
+                self.add_stream(idx)
+                if any(self.camera_addresses(idx)):
+                    self.try_connect_camera(idx)
+                continue
+            if OUTPUT in branches:
+                logger.info(f"Output settings for stream {idx+1} have changed. Replacing output.")
+                self.replace_output(idx)
+            if DVR in branches:
+                logger.info(f"DVR settings for stream {idx+1} have changed. Replacing DVR.")
+                self.replace_dvr(idx)
+            if RECORD in branches:
+                logger.info(f"Recording settings for stream {idx+1} have changed. Replacing recording.")
+                self.replace_recording(idx)
+            if CAMERA in branches:
+                logger.info(f"Camera for stream {idx+1} has changed. Reconnecting camera.")
+                self.reconnect_camera(idx)
+
+        for idx in plan.added:
+            logger.info(f"Stream {idx+1} was added.")
+            self.add_stream(idx)
+            if any(self.camera_addresses(idx)):
+                self.try_connect_camera(idx)
+
+        # Update camera settings dynamically
+        for idx, changed_settings in plan.updates.items():
+            logger.info(f"Updating channel settings for stream {idx+1}.")
+            self.update_camera_settings(idx, self.desired_video_streams[idx]['channel'], changed_settings)
+
+        # Move streams whose audio sources or bitrate changed to the matching encode
+        for idx, key in enumerate(self.audio_keys):
+            if self.output_bins[idx] and key != self.audio_key(idx):
+                logger.info(f"Audio for stream {idx+1} has changed. Rerouting audio.")
+                self.reroute_audio(idx)
+        self.prune_audio_sources()
+
+        self.current_video_streams = copy.deepcopy(self.desired_video_streams)
+
     def update_camera_settings(self, idx, channel_settings, changed_settings):
         camera_num = idx + 1
         # Update encoder settings
         encoder = self.pipeline.get_by_name(f'encoder{camera_num}')
-        if encoder and 'bitrate' in changed_settings:
+        if encoder and ('bitrate' in changed_settings or 'abr' in changed_settings):
             # User provides bitrate in Kbps; convert to bps
             bitrate_kbps = channel_settings.get('bitrate', 2000)  # default 2000 Kbps
             bitrate = bitrate_kbps * 1000  # Convert Kbps to bps
-            encoder.set_property('bps', bitrate)
-            encoder.set_property('bps-max', bitrate + 1000000)
-            logger.info(f"Set bitrate to {bitrate_kbps} Kbps for stream {camera_num}")
+            # With ABR the channel bitrate is the ceiling the controller works under
+            bounds = abr_settings(channel_settings)
+            controller = self.bitrate_controllers[idx]
+            if bounds is None:
+                self.bitrate_controllers[idx] = None
+            elif controller is None:
+                self.bitrate_controllers[idx] = BitrateController(*bounds)
+            else:
+                bitrate = controller.set_bounds(*bounds)
+            set_encoder_bitrate(encoder, bitrate)
+            logger.info(f"Set bitrate to {bitrate // 1000} Kbps for stream {camera_num}")
 
-        # Update white balance directly on v4l2src
+        # Update white balance directly on v4l2src, owned by the stream that opened the camera
         if self.camera_connected[idx] and 'whiteBalance' in changed_settings:  # Updated from white_balance to whiteBalance
-            v4l2src = self.v4l2src_elements[idx]
-            if v4l2src:
-                white_balance = channel_settings.get('whiteBalance', 5000)  # Updated from white_balance to whiteBalance
-                structure = Gst.Structure.new_empty("extra_controls")
-                structure.set_value("white_balance_temperature_auto", 0)
-                structure.set_value("white_balance_temperature", white_balance)
-                v4l2src.set_property('extra-controls', structure)
-                logger.info(f"Set white balance to {white_balance} for stream {camera_num}")
+            white_balance = channel_settings.get('whiteBalance', 5000)  # Updated from white_balance to whiteBalance
+            structure = Gst.Structure.new_empty("extra_controls")
+            structure.set_value("white_balance_temperature_auto", 0)
+            structure.set_value("white_balance_temperature", white_balance)
+            # Backup cameras get it too, so a failover keeps the same look
+            for candidate in self.camera_candidates[self.capture_sources[idx]] or []:
+                if candidate:
+                    candidate['source'].set_property('extra-controls', structure)
+            logger.info(f"Set white balance to {white_balance} for stream {camera_num}")
+
+        # Move the cameras of a composite to their places in the new layout, without a rebuild
+        owner = self.capture_sources[idx]
+        if 'layout' in changed_settings and self.composite_tiles[owner] is not None:
+            self.place_tiles(owner)
+            logger.info(f"Set layout to {channel_settings.get('layout')} for stream {camera_num}")
+
+    def check_bitrates(self):
+        # Sample the send pressure of each ABR stream and let its controller react
+        if not self.pipeline:
+            return True
+        for idx, controller in enumerate(self.bitrate_controllers):
+            if controller is None:
+                continue
+            # A shared encode follows the most congested of its outputs
+            samples = []
+            for out in self.encode_outputs(idx):
+                state = self.output_states[out]
+                if not self.output_bins[out] or state is None or state['drop_probes']:
+                    continue
+                queue = self.output_bins[out].get_by_name(f'videoqueue{out+1}')
+                samples.append((queue.get_property('current-level-time') / Gst.SECOND, self.acked_throughput(out)))
+            if not samples:
+                continue
+            camera_num = idx + 1
+            level, acked = max(samples, key=lambda sample: sample[0])
+            bitrate = controller.sample(level, acked)
+            if bitrate is not None:
+                encoder = self.stream_bins[idx].get_by_name(f'encoder{camera_num}')
+                set_encoder_bitrate(encoder, bitrate)
+                logger.info(f"ABR set bitrate to {bitrate // 1000} Kbps for stream {camera_num} "
+                            f"(output queue {level:.2f} s)")
+        return True
+
+    def acked_throughput(self, idx):
+        # Bits per second the RTMP server acknowledged since the last sample, None when unknown
+        # (SRT and RIST sinks report no acknowledged bytes, their ABR works from the queue level alone)
+        state = self.output_states[idx]
+        rtmp_sink = self.rtmp_sink_elements[idx]
+        if rtmp_sink is None or rtmp_sink.find_property('stats') is None:
+            return None
+        stats = rtmp_sink.get_property('stats')
+        found, acked = stats.get_uint64('out-bytes-acked') if stats else (False, 0)
+        if not found:
+            return None
+        now = time.monotonic()
+        previous = state.get('acked')
+        state['acked'] = (now, acked, rtmp_sink)
+        # A replaced sink starts counting from zero
+        if previous is None or previous[2] != rtmp_sink or now <= previous[0]:
+            return None
+        return (acked - previous[1]) * 8 / (now - previous[0])
+
+    def get_bitrate_stats(self):
+        """Get the bitrate and recent decisions of each ABR stream."""
+        return {idx + 1: controller.stats() for idx, controller in enumerate(self.bitrate_controllers) if controller}
+
+    def sample_telemetry(self):
+        rtmp_sinks = {idx + 1: sink for idx, sink in enumerate(self.rtmp_sink_elements) if sink}
+        self.telemetry.sample(self.pipeline, rtmp_sinks)
+        return True
+
+    def set_tracing(self, enabled):
+        """Turn per-buffer processing time tracing of every element on or off."""
+        self.telemetry.set_tracing(self.pipeline, enabled)
+        return False  # Also used as a one-shot idle callback
 
     def check_camera_devices(self):
-        # Only check camera devices if streaming is enabled
-        if not self.is_enabled:
+        # Only check camera devices if streaming is enabled and the pipeline is running
+        if not self.is_enabled or not self.pipeline:
             return True
         
         for idx, stream in enumerate(self.desired_video_streams):
-            camera_address = stream['camera']
-            # If camera address is None or invalid, remove any existing camera pipeline and switch to videotestsrc
-            if self.camera_needs_update(idx, camera_address):
+            if idx >= len(self.stream_bins) or not self.stream_bins[idx]:
+                # Streams sharing another stream's encode have no camera of their own
+                continue
+            # If no candidate camera is available, remove any existing camera pipeline and switch to the fallback
+            if self.camera_needs_update(idx):
                 if self.camera_connected[idx]:
-                    logger.info(f"Camera {idx+1} is not available or address is None. Switching to videotestsrc.")
+                    logger.info(f"Camera {idx+1} is not available or address is None. Switching to the fallback source.")
                     self.switch_to_videotestsrc(idx)
                     self.camera_connected[idx] = False
                     self.remove_camera_pipeline(idx)
-            elif camera_address is not None and not self.camera_connected[idx]:
-                # Attempt to connect to the camera
-                logger.info(f"Attempting to connect to camera {idx+1} at {camera_address}")
+            elif not self.camera_connected[idx] or self.capture_sources[idx] == idx:
+                # Connect the camera, or open the candidates that are not open yet
                 self.try_connect_camera(idx)
         return True  # Continue calling this function periodically
 
-    def camera_needs_update(self, idx, camera_address):
-        # Return True if the camera is not connected or the address is invalid
-        if camera_address is None:
+    def on_camera_event(self, action, camera):
+        """Connect cameras right away when one is plugged in, unplugged or changes path.
+
+        The device registry already moved the settings version and had the new
+        plan applied through the settings listeners, only the cameras are left.
+
+        Args:
+            action: 'add', 'remove' or 'change'
+            camera: Camera dictionary with name and path
+        """
+        self.check_camera_devices()
+
+    def camera_needs_update(self, idx):
+        # Return True if none of the stream's candidate cameras is connected
+        return not any(self.camera_addresses(idx))
+
+    def camera_addresses(self, idx):
+        # Candidate cameras of a stream in order of preference, None for the disconnected ones.
+        # Those of a composite are its tiles, the ones shown by other streams included.
+        stream = self.desired_video_streams[idx]
+        if 'tiles' in stream:
+            return [tile['camera'] for tile in stream['tiles']]
+        # The stream opening a camera also opens the backups of the streams sharing its capture
+        return list(stream.get('captureCameras') or self.stream_cameras(idx))
+
+    def stream_cameras(self, idx):
+        # The stream's own camera and backups, the only ones it goes on air with
+        stream = self.desired_video_streams[idx]
+        return [stream['camera']] + list(stream.get('backupCameras') or [])
+
+    def camera_allowed(self, idx):
+        # Whether stream idx may show the camera its capture has on air
+        owner = self.capture_sources[idx]
+        if self.composite_tiles[owner] is not None:
             return True
-        return False
+        own = self.stream_cameras(idx)
+        addresses = self.camera_addresses(owner)
+        active = self.active_cameras[owner]
+        if active is None:
+            # Nothing selected yet, the selector shows whichever candidate came up first
+            return all(address in own for address in addresses if address)
+        return addresses[active] in own
+
+    def camera_candidate_for(self, src):
+        # Find the (stream index, candidate) a v4l2src belongs to
+        for idx, candidates in enumerate(self.camera_candidates):
+            for position, candidate in enumerate(candidates or []):
+                if candidate and candidate['source'] == src:
+                    return idx, position
+        return None
 
     def on_bus_message(self, bus, message):
         t = message.type
@@ -344,17 +1181,25 @@ class StreamManager:
             err, debug = message.parse_error()
             logger.error(f"ERROR: {err}, {debug}")
             src = message.src
-            # Handle errors from v4l2src elements
-            if src.get_name().startswith('v4l2src'):
-                camera_num = int(src.get_name().replace('v4l2src', ''))
-                idx = camera_num - 1
-                logger.info(f"Camera {camera_num} error detected. Switching to videotestsrc.")
-                self.switch_to_videotestsrc(idx)
-                self.camera_connected[idx] = False
-                # Remove the camera pipeline elements
-                self.remove_camera_pipeline(idx)
+            # Handle errors from v4l2src elements, the stream fails over to its next camera
+            candidate = self.camera_candidate_for(src)
+            if candidate is not None:
+                idx, position = candidate
+                logger.info(f"Camera {src.get_name()} error detected. Failing over.")
+                self.remove_camera_candidate(idx, position)
                 # Continue running
                 return True
+            # Handle errors from DVR recordings, the stream and its RTMP output keep running
+            idx = self.dvr_index_for(src)
+            if idx is not None:
+                logger.info(f"DVR {idx+1} error detected. Stopping the recording.")
+                self.remove_dvr(idx)
+                return True
+            idx = self.record_index_for(src)
+            if idx is not None:
+                logger.info(f"Recording {idx+1} error detected. Stopping the recording.")
+                self.remove_recording(idx)
+                return True
             # Handle errors from RTMP sinks
             if src.get_name().startswith('rtmpsink'):
                 self.handle_rtmp_error(src)
@@ -364,175 +1209,555 @@ class StreamManager:
                 logger.error(f"Error from element {src.get_name()}: {err}, {debug}")
                 return True
         elif t == Gst.MessageType.EOS:
-            src = message.src
-            if src.get_name().startswith('v4l2src'):
-                camera_num = int(src.get_name().replace('v4l2src', ''))
-                idx = camera_num - 1
-                logger.info(f"Camera {camera_num} EOS detected. Switching to videotestsrc.")
-                self.switch_to_videotestsrc(idx)
-                self.camera_connected[idx] = False
-                # Remove the camera pipeline elements
-                self.remove_camera_pipeline(idx)
+            candidate = self.camera_candidate_for(message.src)
+            if candidate is not None:
+                idx, position = candidate
+                logger.info(f"Camera {message.src.get_name()} EOS detected. Failing over.")
+                self.remove_camera_candidate(idx, position)
+        elif t == Gst.MessageType.ELEMENT:
+            structure = message.get_structure()
+            if structure and structure.get_name() == 'splitmuxsink-fragment-closed':
+                idx = self.dvr_index_for(message.src)
+                if idx is not None and self.dvr_rings[idx]:
+                    self.dvr_rings[idx].segment_closed(structure.get_string('location'))
+                idx = self.record_index_for(message.src)
+                if idx is not None and self.record_rings[idx]:
+                    self.record_rings[idx].segment_closed(structure.get_string('location'))
         return True
 
     def switch_to_videotestsrc(self, idx):
         compositor = self.compositors[idx]
-        sink_pad = compositor.get_static_pad('sink_0')  # videotestsrc pad
+        sink_pad = compositor.get_static_pad('sink_0')  # slate or test pattern pad
         compositor.set_property("active-pad", sink_pad)
-        logger.info(f"Switched compositor {idx+1} to videotestsrc.")
+        logger.info(f"Switched compositor {idx+1} to the fallback source.")
         # Release the requested pad
         if self.camera_sink_pads[idx]:
             compositor.release_request_pad(self.camera_sink_pads[idx])
             self.camera_sink_pads[idx] = None
 
-    def switch_to_camera(self, idx):
-        compositor = self.compositors[idx]
-        sink_pad = self.camera_sink_pads[idx]
-        if sink_pad:
-            compositor.set_property("active-pad", sink_pad)
-            logger.info(f"Switched compositor {idx+1} to camera feed.")
-
     def try_connect_camera(self, idx):
         camera_num = idx + 1
-        stream = self.desired_video_streams[idx]
-        camera_address = stream['camera']
+        addresses = self.camera_addresses(idx)
 
-        # If camera_address is None, do not attempt to connect
-        if camera_address is None:
+        # If no candidate camera has an address, do not attempt to connect
+        if not any(addresses):
             logger.info(f"Camera {camera_num} address is None. Skipping connection attempt.")
             return False
 
-        # Remove any existing camera pipeline elements
-        self.remove_camera_pipeline(idx)
+        # Renditions of a camera are fed from the capture of the first stream using it
+        owner = self.capture_sources[idx]
+        if owner != idx:
+            if self.camera_elements[owner]:
+                self.attach_capture(owner, idx)
+            else:
+                self.try_connect_camera(owner)
+            return False
+
+        # Every candidate is opened and kept running, so failing over never waits for a device
+        started = time.monotonic()
+        tiles = self.desired_video_streams[idx].get('tiles')
+        if not self.camera_bins[idx]:
+            self.camera_candidates[idx] = [None] * len(addresses)
+            # A composite goes on air with whichever of its cameras come up first
+            if tiles is not None and not self.start_camera(idx, started):
+                return False
+        if tiles is not None:
+            self.connect_shared_tiles(idx)
+        candidates = self.camera_candidates[idx]
+        for position, camera_address in enumerate(addresses):
+            if camera_address is None or candidates[position] or (idx, position) in self.camera_probes:
+                continue
+            if tiles is not None and tiles[position]['capture'] is not None:
+                # Shown by another stream, fed from its capture
+                continue
+            # A device that did not answer its last open is left alone until it does
+            if camera_address in self.busy_cameras:
+                logger.info(f"Camera {camera_num} at {camera_address} is still being opened.")
+                continue
+            self.open_camera_candidate(idx, position, camera_address, started)
+        self.telemetry.record_main_loop_block(time.monotonic() - started)
+        return False  # Stop trying to connect this camera for now
 
+    def open_camera_candidate(self, idx, position, camera_address, started):
+        camera_num = idx + 1
         # Recreate the v4l2src element
         logger.info(f"Attempting to connect camera {camera_num} at {camera_address}")
-        camera_source = Gst.ElementFactory.make('v4l2src', f'v4l2src{camera_num}')
+        name = f'v4l2src{camera_num}' if position == 0 else f'v4l2src{camera_num}backup{position}'
+        camera_source = Gst.ElementFactory.make('v4l2src', name)
         if not camera_source:
             logger.error(f"Failed to create v4l2src element for camera {camera_num}")
-            return False
+            return
 
         camera_source.set_property('device', camera_address)
 
-        # Test if the device can be set to READY state
-        try:
-            camera_source.set_state(Gst.State.READY)
-            state_change_return, state, pending = camera_source.get_state(Gst.CLOCK_TIME_NONE)
-            if state_change_return == Gst.StateChangeReturn.FAILURE:
-                logger.error(f"Device {camera_address} cannot be set to READY state. It may not be a valid video capture device.")
-                camera_source.set_state(Gst.State.NULL)
-                return False
-            # Set to NULL state before adding to pipeline
-            camera_source.set_state(Gst.State.NULL)
-        except Exception as e:
-            logger.error(f"Exception while setting up v4l2src for camera {camera_num}: {e}")
-            camera_source.set_state(Gst.State.NULL)
-            return False
-
-        # Proceed with adding elements to pipeline
         # Set initial white balance using extra-controls as Gst.Structure
-        channel = stream['channel']
+        channel = self.desired_video_streams[idx]['channel']
         white_balance = channel.get('whiteBalance', 5000)  # Fixed: use whiteBalance instead of white_balance
         structure = Gst.Structure.new_empty("extra_controls")
         structure.set_value("white_balance_temperature_auto", 0)
         structure.set_value("white_balance_temperature", white_balance)
         camera_source.set_property('extra-controls', structure)
 
-        # Build the rest of the camera pipeline
-        bitrate_kbps = channel.get('bitrate', 2000)  # default 2000 Kbps
-        bitrate = bitrate_kbps * 1000  # Convert Kbps to bps
-        resolution = channel.get('resolution', {'width': 1920, 'height': 1080})
-        width = resolution.get('width', 1920)
-        height = resolution.get('height', 1080)
-        framerate = channel.get('framerate', 30)
-
-        # Set caps filter
-        caps = Gst.Caps.from_string(f"image/jpeg, framerate={framerate}/1, width={width}, height={height}")
-        caps_filter = Gst.ElementFactory.make('capsfilter', None)
-        caps_filter.set_property('caps', caps)
-
-        # Build the rest of the pipeline
-        jpegdec = Gst.ElementFactory.make('jpegdec', None)
-        videoconvert = Gst.ElementFactory.make('videoconvert', None)
-        videoscale = Gst.ElementFactory.make('videoscale', None)
-        scale_caps = Gst.Caps.from_string(f"video/x-raw,width={width},height={height}")
-        scale_caps_filter = Gst.ElementFactory.make('capsfilter', None)
-        scale_caps_filter.set_property('caps', scale_caps)
-        queue = Gst.ElementFactory.make('queue', None)
-
-        # Add elements to the pipeline
-        elements = [camera_source, caps_filter, jpegdec, videoconvert, videoscale, scale_caps_filter, queue]
-        for elem in elements:
-            if not elem:
-                logger.error(f"Failed to create one of the elements in camera {camera_num} pipeline.")
-                # Clean up
-                for e in elements:
-                    if e:
-                        e.set_state(Gst.State.NULL)
-                        self.pipeline.remove(e)
-                return False
-            self.pipeline.add(elem)
+        # Opening the device can block, it is done on a thread of its own. The
+        # stream keeps showing its current input until the camera's first frame.
+        probe = {'key': (idx, position), 'address': camera_address, 'source': camera_source,
+                 'started': started, 'timeout': None}
+        self.camera_probes[probe['key']] = probe
+        self.busy_cameras.add(camera_address)
+        probe['timeout'] = GLib.timeout_add_seconds(CAMERA_OPEN_TIMEOUT, self.on_camera_open_timeout, probe)
+        threading.Thread(target=self.open_camera_thread, args=(probe,), name=name, daemon=True).start()
+
+    def open_camera_thread(self, probe):
+        # Worker thread: only touches the v4l2src, which is in no bin yet
+        caps = open_camera(probe['source'])
+        GLib.idle_add(self.on_camera_opened, probe, caps)
+
+    def on_camera_open_timeout(self, probe):
+        probe['timeout'] = None
+        if self.camera_probes.get(probe['key']) is probe:
+            del self.camera_probes[probe['key']]
+            logger.error(f"Camera {probe['key'][0]+1} at {probe['address']} did not open within "
+                         f"{CAMERA_OPEN_TIMEOUT} s, giving up on this attempt.")
+        return False
 
-        # Link elements
+    def on_camera_opened(self, probe, device_caps):
+        self.busy_cameras.discard(probe['address'])
+        if probe['timeout']:
+            GLib.source_remove(probe['timeout'])
+            probe['timeout'] = None
+        idx, position = probe['key']
+        camera_source = probe['source']
+        # The attempt was given up on, or the stream changed while the device was opening
+        if self.camera_probes.get(probe['key']) is not probe or not self.pipeline:
+            camera_source.set_state(Gst.State.NULL)
+            return False
+        del self.camera_probes[probe['key']]
+        if device_caps is None:
+            logger.error(f"Device {probe['address']} cannot be set to READY state. It may not be a valid video capture device.")
+            return False
+
+        started = time.monotonic()
+        if not self.add_camera_candidate(idx, position, camera_source, device_caps, probe['started']):
+            camera_source.set_state(Gst.State.NULL)
+        self.telemetry.record_main_loop_block(time.monotonic() - started)
+        return False
+
+    def start_camera(self, idx, started):
+        # Build the bin the camera candidates are selected in, and feed the streams using the camera from it
+        camera_num = idx + 1
+        stream = self.desired_video_streams[idx]
+
+        # Capture at the largest size and frame rate any rendition of the camera needs
+        capture_size = stream.get('captureSize')
+        if capture_size:
+            width, height, framerate = capture_size['width'], capture_size['height'], capture_size['frameRate']
+        else:
+            width, height, framerate = stream_size(stream['channel'])
+
+        # The candidates meet in a selector, or the cameras of a composite in a
+        # compositor. The capture ends in a tee and each stream using it takes a branch.
+        tiles = stream.get('tiles')
+        tee = Gst.ElementFactory.make('tee', f'capturetee{camera_num}')
+        if tiles is not None:
+            elements = [Gst.ElementFactory.make('compositor', f'cameramix{camera_num}'),
+                        Gst.ElementFactory.make('capsfilter', None), tee]
+        else:
+            elements = [Gst.ElementFactory.make('input-selector', f'camerasel{camera_num}'), tee]
+        if not all(elements):
+            logger.error(f"Failed to create the capture tee of camera {camera_num}")
+            return False
+        if tiles is not None:
+            # Output timestamps start at the first tile's first frame, the pipeline is already running
+            set_properties(elements[0], {'background': 'black', 'start-time-selection': 'first'})
+            elements[1].set_property('caps', Gst.Caps.from_string(output_caps(width, height, framerate)))
+        else:
+            elements[0].set_property('sync-mode', 1)  # clock, a stalled candidate must not hold the others
+        tee.set_property('allow-not-linked', True)
+
+        camera_bin = Gst.Bin.new(f'camera{camera_num}')
+        for elem in elements:
+            camera_bin.add(elem)
         if not self.link_elements(elements):
             logger.error(f"Failed to link camera {camera_num} elements.")
-            for elem in elements:
-                elem.set_state(Gst.State.NULL)
-                self.pipeline.remove(elem)
             return False
+        self.pipeline.add(camera_bin)
+        camera_bin.sync_state_with_parent()
 
-        # Request a new sink pad from the compositor
-        compositor = self.compositors[idx]
-        sink_pad = compositor.get_request_pad('sink_%u')
-        if not sink_pad:
-            logger.error(f"Failed to get request pad for camera {camera_num}")
+        self.camera_bins[idx] = camera_bin
+        self.camera_elements[idx] = elements
+        self.capture_sizes[idx] = (width, height, framerate)
+        self.camera_starts[idx] = started
+        self.composite_tiles[idx] = [None] * len(tiles) if tiles is not None else None
+
+        # Feed this stream and the other renditions of the camera
+        for consumer in self.capture_consumers(idx):
+            self.attach_capture(idx, consumer)
+        # And the running composites showing the camera
+        for composite, position in self.tile_consumers(idx):
+            self.attach_tile(composite, position)
+        return True
+
+    def add_camera_candidate(self, idx, position, camera_source, device_caps, started):
+        # Pre-roll an opened camera next to the other candidates of the stream
+        camera_num = idx + 1
+        channel = self.desired_video_streams[idx]['channel']
+        if not self.camera_bins[idx] and not self.start_camera(idx, started):
+            return False
+        camera_bin = self.camera_bins[idx]
+
+        # Pick the cheapest chain from the camera's native formats to NV12
+        chain = plan_capture_chain(device_caps, *self.capture_sizes[idx], self.element_profile)
+        logger.info(f"Camera {camera_source.get_name()} capture chain: {chain}")
+        chain_elements = chain.make_elements()
+        if not chain_elements:
+            logger.error(f"Failed to create one of the elements in camera {camera_num} pipeline.")
+            return False
+        self.limit_capture_queue(chain_elements[-1], channel)
+
+        elements = [camera_source] + chain_elements
+        for elem in elements:
+            camera_bin.add(elem)
+        pad = self.request_camera_pad(idx, position)
+        linked = (pad is not None and self.link_elements(elements)
+                  and elements[-1].get_static_pad('src').link(pad) == Gst.PadLinkReturn.OK)
+        if not linked:
+            logger.error(f"Failed to link camera {camera_num} elements.")
+            self.release_camera_pad(idx, position, pad)
             for elem in elements:
                 elem.set_state(Gst.State.NULL)
-                self.pipeline.remove(elem)
+                camera_bin.remove(elem)
             return False
 
-        # Store the sink pad for future reference
-        self.camera_sink_pads[idx] = sink_pad
+        # The device is already open, going to PLAYING only starts the capture
+        for elem in elements:
+            if not elem.sync_state_with_parent():
+                logger.error(f"Failed to set camera {camera_num} to PLAYING state.")
+                self.release_camera_pad(idx, position, pad)
+                for elem in elements:
+                    elem.set_state(Gst.State.NULL)
+                    camera_bin.remove(elem)
+                return False
 
-        # Get the source pad of the last element
-        src_pad = queue.get_static_pad('src')
-        if not src_pad.link(sink_pad) == Gst.PadLinkReturn.OK:
-            logger.error(f"Failed to link camera {camera_num} to compositor.")
-            compositor.release_request_pad(sink_pad)
-            self.camera_sink_pads[idx] = None
+        candidate = {'source': camera_source, 'elements': elements, 'pad': pad, 'last_buffer': None}
+        self.camera_candidates[idx][position] = candidate
+        # The watchdog follows the frames leaving the device
+        camera_source.get_static_pad('src').add_probe(Gst.PadProbeType.BUFFER, self.on_camera_buffer, candidate)
+        logger.info(f"Camera {camera_source.get_name()} is open, streams fail over to it once it delivers frames.")
+        return True
+
+    def request_camera_pad(self, idx, position):
+        # Pad a candidate camera feeds: a selector input, or the tile of a composite
+        if self.composite_tiles[idx] is not None:
+            tile = self.add_tile(idx, position)
+            return tile['elements'][0].get_static_pad('sink') if tile else None
+        return self.camera_elements[idx][0].get_request_pad('sink_%u')
+
+    def release_camera_pad(self, idx, position, pad):
+        if pad is None:
+            return
+        if self.composite_tiles[idx] is not None:
+            self.remove_tile(idx, position)
+        else:
+            self.camera_elements[idx][0].release_request_pad(pad)
+
+    def on_camera_buffer(self, pad, info, candidate):
+        # Streaming thread: one attribute store per frame
+        candidate['last_buffer'] = time.monotonic()
+        return Gst.PadProbeReturn.OK
+
+    def check_camera_watchdogs(self):
+        # Fail over as soon as the active camera stops delivering frames
+        if not self.pipeline:
+            return True
+        for idx, candidates in enumerate(self.camera_candidates):
+            if candidates and self.camera_bins[idx]:
+                self.select_camera(idx)
+        return True
+
+    def select_camera(self, idx):
+        # Put the first camera that delivered a frame within the watchdog timeout on air
+        now = time.monotonic()
+        timeout = self.watchdog_timeout / 1000
+        if self.composite_tiles[idx] is not None:
+            # A composite stays on air (0) while any of its cameras delivers, stalled tiles are hidden
+            best = 0 if self.show_live_tiles(idx, now - timeout) else None
+        else:
+            healthy = [position for position, candidate in enumerate(self.camera_candidates[idx])
+                       if candidate and candidate['last_buffer'] and now - candidate['last_buffer'] < timeout]
+            best = healthy[0] if healthy else None
+        active = self.active_cameras[idx]
+        if best == active:
+            return
+        self.active_cameras[idx] = best
+        if best is None:
+            logger.warning(f"No camera of stream {idx+1} delivers frames, showing the fallback source.")
+            for consumer in self.capture_consumers(idx):
+                compositor = self.compositors[consumer]
+                compositor.set_property('active-pad', compositor.get_static_pad('sink_0'))
+            return
+
+        if self.composite_tiles[idx] is None:
+            candidate = self.camera_candidates[idx][best]
+            self.camera_elements[idx][0].set_property('active-pad', candidate['pad'])
+            logger.info(f"Stream {idx+1} switched to camera {candidate['source'].get_name()}.")
+        else:
+            logger.info(f"Composite stream {idx+1} has a camera delivering frames again.")
+        # Streams that already had a frame show the new camera if it is one of theirs, the fallback otherwise
+        for consumer in self.capture_consumers(idx):
+            feed = self.camera_feeds[consumer]
+            if not feed or not feed['live']:
+                continue
+            compositor = self.compositors[consumer]
+            if self.camera_allowed(consumer):
+                compositor.set_property('active-pad', self.camera_sink_pads[consumer])
+            else:
+                logger.warning(f"Stream {consumer+1} has no backup camera delivering frames, showing the fallback source.")
+                compositor.set_property('active-pad', compositor.get_static_pad('sink_0'))
+
+    def remove_camera_candidate(self, idx, position):
+        candidates = self.camera_candidates[idx]
+        candidate = candidates[position] if candidates else None
+        if candidate is None:
+            return
+        candidates[position] = None
+        camera_bin = self.camera_bins[idx]
+        for elem in candidate['elements']:
+            elem.set_state(Gst.State.NULL)
+            camera_bin.remove(elem)
+        self.release_camera_pad(idx, position, candidate['pad'])
+        logger.info(f"Removed camera {candidate['source'].get_name()}.")
+        self.select_camera(idx)
+
+    def tile_consumers(self, idx):
+        # (composite, position) of the tiles of running composites showing the camera opened by stream idx
+        return [(composite, position)
+                for composite, tiles in enumerate(self.composite_tiles)
+                if tiles is not None and composite < len(self.desired_video_streams)
+                for position, tile in enumerate(self.desired_video_streams[composite].get('tiles') or [])
+                if tile['capture'] == idx]
+
+    def connect_shared_tiles(self, idx):
+        # Feed the tiles of composite idx that show other streams' cameras, or get those cameras going
+        for position, tile in enumerate(self.desired_video_streams[idx]['tiles']):
+            owner = tile['capture']
+            if owner is None or self.composite_tiles[idx][position]:
+                continue
+            if self.camera_elements[owner]:
+                self.attach_tile(idx, position)
+            elif owner < len(self.stream_bins) and self.stream_bins[owner]:
+                # The owner attaches the tile once its camera is up
+                self.try_connect_camera(owner)
+
+    def add_tile(self, idx, position, owner=None):
+        # Scale one camera of composite idx to its place and feed it to the compositor
+        camera_bin = self.camera_bins[idx]
+        elements = [Gst.ElementFactory.make(self.element_profile['scale'], None),
+                    Gst.ElementFactory.make('capsfilter', None)]
+        if owner is not None:
+            # Frames from another camera's tee change threads here, late ones are dropped
+            elements.insert(0, Gst.ElementFactory.make('queue', None))
+        if not all(elements):
+            logger.error(f"Failed to create tile {position+1} of composite {idx+1}")
+            return None
+        if owner is not None:
+            self.limit_capture_queue(elements[0], self.desired_video_streams[idx]['channel'])
+        for elem in elements:
+            camera_bin.add(elem)
+        mixer = self.camera_elements[idx][0]
+        pad = mixer.get_request_pad('sink_%u')
+        if not self.link_elements(elements) or elements[-1].get_static_pad('src').link(pad) != Gst.PadLinkReturn.OK:
+            logger.error(f"Failed to link tile {position+1} of composite {idx+1}")
+            mixer.release_request_pad(pad)
             for elem in elements:
-                elem.set_state(Gst.State.NULL)
-                self.pipeline.remove(elem)
+                camera_bin.remove(elem)
+            return None
+
+        # Hidden until its first frame, later tiles are drawn over the earlier ones
+        pad.set_property('zorder', position)
+        tile = {'owner': owner, 'elements': elements, 'pad': pad, 'filter': elements[-1], 'feed': None,
+                'rect': None, 'last_buffer': None, 'live': False}
+        self.composite_tiles[idx][position] = tile
+        self.place_tiles(idx)
+        elements[0].get_static_pad('sink').add_probe(Gst.PadProbeType.BUFFER, self.on_camera_buffer, tile)
+        for elem in elements:
+            elem.sync_state_with_parent()
+        return tile
+
+    def attach_tile(self, idx, position):
+        # Feed a tile of composite idx from the capture tee of the stream showing its camera
+        owner = self.desired_video_streams[idx]['tiles'][position]['capture']
+        if self.composite_tiles[idx][position]:
+            return True
+        tile = self.add_tile(idx, position, owner)
+        if tile is None:
             return False
 
-        # Set the camera source and its elements to PLAYING
-        ret = camera_source.set_state(Gst.State.PLAYING)
-        if ret == Gst.StateChangeReturn.FAILURE:
-            logger.error(f"Failed to set camera {camera_num} to PLAYING state.")
-            # Clean up
-            for elem in elements:
-                elem.set_state(Gst.State.NULL)
-                self.pipeline.remove(elem)
-            self.camera_sink_pads[idx] = None
-            compositor.release_request_pad(sink_pad)
+        # The tee lives in the owner's camera bin, cross over through ghost pads
+        tee_pad = self.camera_elements[owner][-1].get_request_pad('src_%u')
+        feed = {
+            'tee_pad': tee_pad,
+            'src_pad': Gst.GhostPad.new(f'tile{idx+1}_{position}', tee_pad),
+            'sink_pad': Gst.GhostPad.new(f'tile{position}', tile['elements'][0].get_static_pad('sink')),
+        }
+        tile['feed'] = feed
+        for ghost_pad, camera_bin in ((feed['src_pad'], self.camera_bins[owner]), (feed['sink_pad'], self.camera_bins[idx])):
+            ghost_pad.set_active(True)
+            camera_bin.add_pad(ghost_pad)
+        if feed['src_pad'].link(feed['sink_pad']) != Gst.PadLinkReturn.OK:
+            logger.error(f"Failed to link camera {owner+1} to composite {idx+1}.")
+            self.remove_tile(idx, position)
             return False
+        logger.info(f"Composite {idx+1} shows camera {owner+1} in tile {position+1}.")
+        return True
 
-        for elem in elements[1:]:
-            elem.sync_state_with_parent()
+    def remove_tile(self, idx, position):
+        tile = self.composite_tiles[idx][position]
+        if tile is None:
+            return
+        self.composite_tiles[idx][position] = None
+        feed = tile['feed']
+        if feed and feed['src_pad'].get_peer():
+            feed['src_pad'].unlink(feed['sink_pad'])
+        camera_bin = self.camera_bins[idx]
+        for elem in tile['elements']:
+            elem.set_state(Gst.State.NULL)
+            camera_bin.remove(elem)
+        self.camera_elements[idx][0].release_request_pad(tile['pad'])
+        if feed:
+            camera_bin.remove_pad(feed['sink_pad'])
+            feed['src_pad'].get_parent_element().remove_pad(feed['src_pad'])
+            feed['tee_pad'].get_parent_element().release_request_pad(feed['tee_pad'])
+
+    def place_tiles(self, idx):
+        # Put the tiles of composite idx in their places in its current layout, hiding the stalled ones
+        width, height, framerate = self.capture_sizes[idx]
+        tiles = self.composite_tiles[idx]
+        layout = self.desired_video_streams[idx]['channel'].get('layout')
+        for tile, rect in zip(tiles, layout_rects(layout, len(tiles), width, height)):
+            if tile is None:
+                continue
+            if rect is not None and rect != tile['rect']:
+                # Only the tile's scaler renegotiates, the camera keeps its format
+                x, y, tile_width, tile_height = rect
+                tile['filter'].set_property('caps', Gst.Caps.from_string(output_caps(tile_width, tile_height, framerate)))
+                for key, value in (('xpos', x), ('ypos', y), ('width', tile_width), ('height', tile_height)):
+                    tile['pad'].set_property(key, value)
+                tile['rect'] = rect
+            tile['pad'].set_property('alpha', 1.0 if rect is not None and tile['live'] else 0.0)
+
+    def show_live_tiles(self, idx, since):
+        # Show the tiles that delivered a frame since the given time, hide the others
+        changed = False
+        for tile in self.composite_tiles[idx]:
+            if tile:
+                live = tile['last_buffer'] is not None and tile['last_buffer'] > since
+                changed = changed or live != tile['live']
+                tile['live'] = live
+        if changed:
+            self.place_tiles(idx)
+        return any(tile and tile['live'] for tile in self.composite_tiles[idx])
+
+    def attach_capture(self, owner, idx):
+        # Feed stream idx from the capture tee of stream owner, scaled to the stream size
+        camera_num = idx + 1
+        self.detach_capture(idx)
+        stream_bin = self.stream_bins[idx]
+        size = self.stream_sizes[idx]
+        capture_size = self.capture_sizes[owner]
+
+        elements = []
+        if idx != owner or size != capture_size:
+            elements.append(Gst.ElementFactory.make('queue', None))
+            if elements[0]:
+                self.limit_capture_queue(elements[0], self.desired_video_streams[idx]['channel'])
+            if size[:2] != capture_size[:2]:
+                elements.append(Gst.ElementFactory.make(self.element_profile['scale'], None))
+            if size[2] != capture_size[2]:
+                elements.append(Gst.ElementFactory.make('videorate', None))
+            elements.append(Gst.ElementFactory.make('capsfilter', None))
+            if not all(elements):
+                logger.error(f"Failed to create the capture branch of stream {camera_num}")
+                return False
+            elements[-1].set_property('caps', Gst.Caps.from_string(output_caps(*size)))
+            for elem in elements:
+                stream_bin.add(elem)
+            if not self.link_elements(elements):
+                for elem in elements:
+                    stream_bin.remove(elem)
+                return False
 
-        # Store the elements and the v4l2src element for adjustments
-        self.camera_elements[idx] = elements
-        self.v4l2src_elements[idx] = camera_source
+        compositor = self.compositors[idx]
+        sink_pad = compositor.get_request_pad('sink_%u')
+        tee = self.camera_elements[owner][-1]
+        tee_pad = tee.get_request_pad('src_%u')
+        feed = {'elements': elements, 'tee_pad': tee_pad, 'src_pad': None, 'sink_pad': None, 'live': False}
+        self.camera_feeds[idx] = feed
+        self.camera_sink_pads[idx] = sink_pad
 
-        # Switch to camera feed
-        self.switch_to_camera(idx)
+        # The tee lives in the camera's bin, cross over through ghost pads
+        linked = not elements or elements[-1].get_static_pad('src').link(sink_pad) == Gst.PadLinkReturn.OK
+        branch_pad = elements[0].get_static_pad('sink') if elements else sink_pad
+        feed['src_pad'] = Gst.GhostPad.new(f'capture{camera_num}', tee_pad)
+        feed['src_pad'].set_active(True)
+        self.camera_bins[owner].add_pad(feed['src_pad'])
+        feed['sink_pad'] = Gst.GhostPad.new('capture', branch_pad)
+        feed['sink_pad'].set_active(True)
+        stream_bin.add_pad(feed['sink_pad'])
+        linked = linked and feed['src_pad'].link(feed['sink_pad']) == Gst.PadLinkReturn.OK
+        if not linked:
+            logger.error(f"Failed to link camera {owner+1} to stream {camera_num}.")
+            self.detach_capture(idx)
+            return False
 
-        # Mark the camera as connected
+        # Keep the current input on air until a frame made it through the chain
+        sink_pad.add_probe(Gst.PadProbeType.BUFFER, self.on_first_camera_frame, (owner, idx, feed))
+        for elem in elements:
+            elem.sync_state_with_parent()
         self.camera_connected[idx] = True
+        return True
 
-        logger.info(f"Successfully connected camera {camera_num}.")
-
-        return False  # Stop trying to connect this camera for now
+    def on_first_camera_frame(self, pad, info, data):
+        # Streaming thread: input-selector takes its active pad from any thread
+        owner, idx, feed = data
+        if self.camera_feeds[idx] is feed:
+            feed['live'] = True
+            if self.camera_allowed(idx):
+                self.compositors[idx].set_property('active-pad', pad)
+            started = self.camera_starts[owner]
+            if started is not None:
+                elapsed = time.monotonic() - started
+                self.telemetry.record_first_frame(idx + 1, elapsed)
+                logger.info(f"Switched compositor {idx+1} to camera feed, first frame after {elapsed:.2f} s.")
+        return Gst.PadProbeReturn.REMOVE
+
+    def limit_capture_queue(self, queue, channel):
+        # Late frames are dropped rather than delaying the ones behind them
+        queue.set_property('max-size-buffers', get_latency_profile(channel)['capture_queue_buffers'])
+        queue.set_property('max-size-bytes', 0)
+        queue.set_property('max-size-time', 0)
+        queue.set_property('leaky', 2)  # downstream
+
+    def detach_capture(self, idx):
+        feed = self.camera_feeds[idx]
+        if feed is None:
+            return
+        self.switch_to_videotestsrc(idx)
+        self.camera_connected[idx] = False
+        tee_pad = feed['tee_pad']
+        upstream = feed['src_pad'] or tee_pad
+        peer = upstream.get_peer()
+        if peer:
+            upstream.unlink(peer)
+        stream_bin = self.stream_bins[idx]
+        for elem in feed['elements']:
+            elem.set_state(Gst.State.NULL)
+            stream_bin.remove(elem)
+        if feed['sink_pad']:
+            stream_bin.remove_pad(feed['sink_pad'])
+        if feed['src_pad']:
+            feed['src_pad'].get_parent_element().remove_pad(feed['src_pad'])
+        tee_pad.get_parent_element().release_request_pad(tee_pad)
+        self.camera_feeds[idx] = None
 
     def link_elements(self, elements):
         for i in range(len(elements) - 1):
@@ -542,83 +1767,255 @@ class StreamManager:
         return True
 
     def remove_camera_pipeline(self, idx):
+        # Streams fed from this camera fall back to their test source
+        if self.camera_elements[idx]:
+            for consumer in self.capture_consumers(idx):
+                self.detach_capture(consumer)
+        self.detach_capture(idx)
+
+        # Composites showing this camera lose its tile, a composite gives back the captures it shows
+        for composite, tiles in enumerate(self.composite_tiles):
+            for position, tile in enumerate(tiles or []):
+                if tile and (tile['owner'] == idx or composite == idx):
+                    self.remove_tile(composite, position)
+
         # Release the requested pad
         if self.camera_sink_pads[idx]:
             compositor = self.compositors[idx]
             compositor.release_request_pad(self.camera_sink_pads[idx])
             self.camera_sink_pads[idx] = None
 
-        elements = self.camera_elements[idx]
-        if elements:
-            # Set elements to NULL state and remove from pipeline
-            for elem in elements:
-                elem.set_state(Gst.State.NULL)
-                self.pipeline.remove(elem)
+        # Opens still in progress are given up on
+        for key in [key for key in self.camera_probes if key[0] == idx]:
+            del self.camera_probes[key]
+
+        camera_bin = self.camera_bins[idx]
+        if camera_bin:
+            camera_bin.set_state(Gst.State.NULL)
+            self.pipeline.remove(camera_bin)
+            self.camera_bins[idx] = None
             self.camera_elements[idx] = None
-            self.v4l2src_elements[idx] = None
+            self.capture_sizes[idx] = None
+            self.camera_starts[idx] = None
             logger.info(f"Removed camera {idx+1} pipeline.")
+        self.camera_candidates[idx] = []
+        self.active_cameras[idx] = None
+        self.composite_tiles[idx] = None
+
+    def stream_index_for_sink(self, rtmp_sink):
+        # Sink names are rtmpsink{camera_num}{label}
+        number = rtmp_sink.get_name()[len('rtmpsink'):]
+        if number.endswith(self.label):
+            number = number[:-len(self.label)]
+        try:
+            return int(number) - 1
+        except ValueError:
+            return None
+
+    def on_sync_error(self, bus, message):
+        # Called on the streaming thread of the failing element, before the flow error
+        # reaches the encoder or the audio tee. Cut the output off right away so the
+        # rest of the pipeline keeps running.
+        src = message.src
+        if src.get_name().startswith('rtmpsink'):
+            idx = self.stream_index_for_sink(src)
+            if idx is not None and idx < len(self.output_states) and src == self.rtmp_sink_elements[idx]:
+                state = self.drop_output(idx)
+                if state is not None:
+                    # The bookkeeping is left to the main loop
+                    GLib.idle_add(self.on_output_dropped, idx, state)
+            return
+        idx = self.dvr_index_for(src)
+        if idx is not None:
+            # A failed recording (e.g. a full disk) must not stop the stream: unlink
+            # the DVR from the tees, which allow not-linked pads
+            self.dvr_video_pads[idx].unlink(self.dvr_bins[idx].get_static_pad('video'))
+            self.dvr_audio_tee_pads[idx].unlink(self.dvr_bins[idx].get_static_pad('audio'))
+            return
+        idx = self.record_index_for(src)
+        if idx is not None:
+            self.record_video_pads[idx].unlink(self.record_bins[idx].get_static_pad('video'))
+            self.record_audio_tee_pads[idx].unlink(self.record_bins[idx].get_static_pad('audio'))
+
+    def dvr_index_for(self, src):
+        # Errors and fragment messages come from splitmuxsink or the elements inside it
+        return self.bin_index_for(self.dvr_bins, src)
+
+    def record_index_for(self, src):
+        return self.bin_index_for(self.record_bins, src)
+
+    def bin_index_for(self, bins, src):
+        for idx, bin in enumerate(bins):
+            if bin and (src == bin or src.has_as_ancestor(bin)):
+                return idx
+        return None
+
+    def drop_output(self, idx):
+        # Drop everything flowing into the output instead of pushing into a failed sink.
+        # Returns the output's state if this call isolated it, None if it already was.
+        state = self.output_states[idx]
+        if state is None:
+            return None
+        with self.output_lock:
+            if state['drop_probes']:
+                return None
+            probe_type = Gst.PadProbeType.BUFFER | Gst.PadProbeType.BUFFER_LIST
+            stream_pad = self.video_pads[idx]
+            state['drop_probes'].append((stream_pad, stream_pad.add_probe(probe_type, self.drop_output_buffer, state)))
+            tee_pad = self.audio_tee_pads[idx]
+            if tee_pad:
+                state['drop_probes'].append((tee_pad, tee_pad.add_probe(probe_type, self.drop_output_buffer, None)))
+        return state
+
+    def isolate_output(self, idx):
+        # Main loop: isolate the output and note since when it is down
+        state = self.drop_output(idx)
+        if state is None:
+            return False
+        state['down_since'] = time.monotonic()
+        return True
 
-    def handle_rtmp_error(self, rtmp_sink):
-        # Network error detection based on the error type from the message
-        logger.info(f"RTMP connection error detected on {rtmp_sink.get_name()}. Retrying...")
+    def on_output_dropped(self, idx, state):
+        # Main loop, after the streaming thread isolated a failed output
+        if idx < len(self.output_states) and self.output_states[idx] is state and state['drop_probes']:
+            state['down_since'] = time.monotonic()
+            self.begin_dvr_outage(idx)
+        return False
+
+    def restore_output(self, idx):
+        state = self.output_states[idx]
+        if state is None:
+            return
+        with self.output_lock:
+            for pad, probe_id in state['drop_probes']:
+                pad.remove_probe(probe_id)
+            state['drop_probes'] = []
+        # A new muxer can only start on a keyframe, ask the encoder for one now.
+        # There is no pad when adding the output failed.
+        if self.video_pads[idx] is not None:
+            self.video_pads[idx].send_event(force_key_unit_event())
+
+    def drop_output_buffer(self, pad, info, state):
+        # Only video frames are counted as lost
+        if state is not None:
+            state['frames_lost'] += 1
+        return Gst.PadProbeReturn.DROP
+
+    def on_first_output_buffer(self, pad, info, idx):
+        state = self.output_states[idx]
+        if state['down_since'] is not None:
+            latency = time.monotonic() - state['down_since']
+            state['last_reconnect_latency'] = latency
+            state['down_since'] = None
+            logger.info(f"Output {idx+1} is flowing again after {latency:.2f} s, {state['frames_lost']} frames lost so far.")
+            ring = self.dvr_rings[idx]
+            if ring:
+                ring.end_outage(time.time())
+        return Gst.PadProbeReturn.REMOVE
+
+    def begin_dvr_outage(self, idx):
+        # The DVR keeps recording, remember which segments the backend missed
+        ring = self.dvr_rings[idx] if idx < len(self.dvr_rings) else None
+        if ring:
+            ring.begin_outage(time.time())
 
-        # Set a retry interval (in seconds)
-        retry_interval = 10
-        GLib.timeout_add_seconds(retry_interval, self.retry_rtmp_connection, rtmp_sink)
+    def handle_rtmp_error(self, rtmp_sink):
+        idx = self.stream_index_for_sink(rtmp_sink)
+        if idx is None or idx >= len(self.output_states) or self.output_states[idx] is None:
+            return
+        # Ignore late errors from an output that was already replaced
+        if rtmp_sink != self.rtmp_sink_elements[idx]:
+            return
+        state = self.output_states[idx]
+        # rtmp2sink may post several errors for one failure, retry only once
+        if state['retry_source'] or state['checking_network']:
+            return
 
-    def retry_rtmp_connection(self, rtmp_sink):
+        # Network error detection based on the error type from the message. The
+        # output may already be isolated by on_sync_error, which also notes the outage.
+        if self.isolate_output(idx):
+            self.begin_dvr_outage(idx)
+        delay = state['backoff'].next_delay()
+        logger.info(f"RTMP connection error detected on {rtmp_sink.get_name()}. Retrying in {delay:.1f} seconds...")
+        state['retry_source'] = GLib.timeout_add(int(delay * 1000), self.retry_rtmp_connection, idx)
+
+    def retry_rtmp_connection(self, idx):
+        state = self.output_states[idx] if idx < len(self.output_states) else None
+        if state is None:
+            return False
+        state['retry_source'] = None
         # Check if the stream is enabled
-        if not self.is_enabled:
+        if not self.is_enabled or not self.pipeline:
+            logger.info("Stream is disabled. Will not attempt to reconnect to RTMP.")
+            return False
+        # The connectivity check blocks, it runs on a thread of its own
+        state['checking_network'] = True
+        threading.Thread(target=self.check_network_thread, args=(idx, state),
+                         name=f'network-check{idx+1}', daemon=True).start()
+        return False
+
+    def check_network_thread(self, idx, state):
+        # Worker thread: only reports back to the main loop
+        GLib.idle_add(self.on_network_checked, idx, state, self.is_network_available())
+
+    def on_network_checked(self, idx, state, available):
+        state['checking_network'] = False
+        # The stream was removed or rebuilt while the network was checked
+        if idx >= len(self.output_states) or self.output_states[idx] is not state:
+            return False
+        if not self.is_enabled or not self.pipeline:
             logger.info("Stream is disabled. Will not attempt to reconnect to RTMP.")
             return False
         # Check if the network is available
-        if self.is_network_available():
+        if available:
             logger.info("Network is available. Attempting to reconnect to RTMP.")
             try:
                 # Reconnect the RTMP sink
-                self.reconnect_rtmp_sink(rtmp_sink)
-                return False  # Stop retrying after successful reconnection
+                self.reconnect_rtmp_sink(idx)
+                return False
             except Exception as e:
                 logger.error(f"Error reconnecting RTMP sink: {e}")
-                return True  # Retry after the interval if reconnection fails
         else:
             logger.info("Network is still unavailable. Will retry again.")
-            return True  # Keep retrying until network is available
+
+        delay = state['backoff'].next_delay()
+        logger.info(f"Retrying RTMP connection for stream {idx+1} in {delay:.1f} seconds...")
+        state['retry_source'] = GLib.timeout_add(int(delay * 1000), self.retry_rtmp_connection, idx)
+        return False
 
     def is_network_available(self):
-        # Check for network connectivity (can use ping, socket, or any other method)
+        # Check for network connectivity, blocks for up to NETWORK_CHECK_TIMEOUT: call it off the main loop
         try:
             # A simple check like attempting to open a socket to a reliable server
-            import socket
             host = "8.8.8.8"  # Google DNS as an example
-            socket.create_connection((host, 53), timeout=5)
-            return True
-        except socket.error:
+            with socket.create_connection((host, 53), timeout=NETWORK_CHECK_TIMEOUT):
+                return True
+        except OSError:
             return False
 
-    def reconnect_rtmp_sink(self, rtmp_sink):
+    def reconnect_rtmp_sink(self, idx):
         # Attempt to reconnect the RTMP stream
-        rtmp_url = self.get_rtmp_url_for_stream(rtmp_sink)  # Retrieve the RTMP URL
+        rtmp_url = self.desired_video_streams[idx]['channel'].get('streamEndpoint', '')
         # Ensure that the RTMP URL is not empty
         if not rtmp_url:
             logger.error("ERROR: RTMP URL is empty or invalid. Cannot reconnect.")
             return
         logger.info(f"Attempting to reconnect to RTMP stream: {rtmp_url}")
-        # Set the RTMP sink location to the new URL
-        rtmp_sink.set_property('location', rtmp_url)
 
-        # Restart the pipeline or the RTMP element
-        self.pipeline.set_state(Gst.State.NULL)
-        self.pipeline.set_state(Gst.State.PLAYING)
+        # Only this stream's mux and sink are restarted, the encoders keep running
+        self.replace_output(idx)
+        state = self.output_states[idx]
+        state['reconnects'] += 1
+        GLib.timeout_add_seconds(RTMP_STABLE_TIME, self.check_output_stable, idx, state['reconnects'])
         logger.info(f"Reconnected to RTMP stream: {rtmp_url}")
 
-    def get_rtmp_url_for_stream(self, rtmp_sink):
-        # Iterate over the desired video streams
-        for idx, stream in enumerate(self.desired_video_streams):
-            # Since camera_num = idx + 1, check for that in the sink name
-            if f"rtmpsink{idx+1}" in rtmp_sink.get_name():
-                return stream['channel'].get('streamEndpoint', '')
-        return ""
+    def check_output_stable(self, idx, reconnects):
+        # Start the backoff over once the output ran without errors for a while
+        state = self.output_states[idx] if idx < len(self.output_states) else None
+        if (state and state['reconnects'] == reconnects and not state['retry_source']
+                and not state['checking_network']):
+            state['backoff'].reset()
+        return False
 
     def run_pipeline(self):
         self.loop = GLib.MainLoop()
@@ -0,0 +1,135 @@
+"""Diffing of stream configurations into the smallest pipeline changes.
+
+Each video stream is made of three branches that can be rebuilt on their own:
+
+- camera: the capture chains of the stream's candidate cameras feeding its input-selector,
+  or of a composite's cameras feeding its compositor
+- encoder: fallback source (slate or test pattern), input-selector, encoder and parser
+- output: muxer and sink (RTMP, SRT or RIST, after the endpoint's scheme)
+- dvr: optional local ring-buffer recording of the encoded stream
+- record: optional local recording of the encoded stream to MP4/Matroska files
+- audio: the shared audio encode the stream's output, DVR and recording are fed from
+
+Rebuilding the encoder also rebuilds the output, DVR and recording, since their muxers
+cannot pick up new codec data mid-stream. A stream that starts or stops
+sharing another stream's camera or encoder is rebuilt as a whole.
+"""
+
+CAMERA = 'camera'
+ENCODER = 'encoder'
+OUTPUT = 'output'
+DVR = 'dvr'
+RECORD = 'record'
+AUDIO = 'audio'
+
+# Channel settings that need a new encoder (and capture chain) to take effect
+ENCODER_SETTINGS = ('resolution', 'frameRate', 'latencyStamps', 'latencyProfile', 'slate')
+
+# Channel settings selecting the stream's audio encode
+AUDIO_SETTINGS = ('audioDevice', 'audioDevices', 'audioBitrate')
+
+# Channel settings applied to running elements
+DYNAMIC_SETTINGS = ('bitrate', 'whiteBalance', 'abr', 'layout')
+
+
+class ReconfigurePlan:
+    """Changes needed to go from the current to the desired configuration."""
+
+    def __init__(self):
+        self.added = []      # Stream indices to build
+        self.removed = []    # Stream indices to tear down, highest first
+        self.rebuild = {}    # Stream index -> set of branches to rebuild
+        self.updates = {}    # Stream index -> {setting: value} to apply in place
+        self.audio_changed = False
+
+    def is_empty(self):
+        """Check whether the plan changes nothing."""
+        return not (self.added or self.removed or self.rebuild or self.updates or self.audio_changed)
+
+    def __repr__(self):
+        return (
+            f"ReconfigurePlan(added={self.added}, removed={self.removed}, rebuild={self.rebuild}, "
+            f"updates={self.updates}, audio_changed={self.audio_changed})"
+        )
+
+
+def diff_stream(current, desired):
+    """Work out which branches of one stream are affected by a configuration change.
+
+    Args:
+        current: Stream settings currently running
+        desired: New stream settings
+
+    Returns:
+        Tuple of (set of branches to rebuild, {setting: value} to update in place)
+    """
+    branches = set()
+    current_channel = current.get('channel', {})
+    desired_channel = desired.get('channel', {})
+
+    for key in ENCODER_SETTINGS:
+        if current_channel.get(key) != desired_channel.get(key):
+            branches.update((CAMERA, ENCODER, OUTPUT, DVR, RECORD))
+
+    for key in ('camera', 'backupCameras', 'tiles', 'captureSize', 'captureCameras'):
+        if current.get(key) != desired.get(key):
+            branches.add(CAMERA)
+
+    for key in ('capture', 'encode'):
+        if current.get(key) != desired.get(key):
+            branches.update((CAMERA, ENCODER, OUTPUT, DVR, RECORD))
+
+    if current_channel.get('streamEndpoint', '') != desired_channel.get('streamEndpoint', ''):
+        branches.add(OUTPUT)
+
+    for key in ('transport', 'bonding'):
+        if current_channel.get(key) != desired_channel.get(key):
+            branches.add(OUTPUT)
+
+    if current_channel.get('dvr') != desired_channel.get('dvr'):
+        branches.add(DVR)
+
+    if current_channel.get('record') != desired_channel.get('record'):
+        branches.add(RECORD)
+
+    for key in AUDIO_SETTINGS:
+        if current_channel.get(key) != desired_channel.get(key):
+            branches.add(AUDIO)
+
+    updates = {}
+    if ENCODER not in branches:
+        for key in DYNAMIC_SETTINGS:
+            if current_channel.get(key) != desired_channel.get(key):
+                updates[key] = desired_channel.get(key)
+
+    return branches, updates
+
+
+def diff_streams(current_streams, desired_streams, current_audio=None, desired_audio=None):
+    """Build the plan turning the current stream configuration into the desired one.
+
+    Streams are matched by position, as the pipeline elements are numbered.
+
+    Args:
+        current_streams: List of stream settings currently running
+        desired_streams: List of new stream settings
+        current_audio: Audio device currently in use
+        desired_audio: New audio device
+
+    Returns:
+        ReconfigurePlan
+    """
+    plan = ReconfigurePlan()
+    plan.audio_changed = current_audio != desired_audio
+
+    common = min(len(current_streams), len(desired_streams))
+    for idx in range(common):
+        branches, updates = diff_stream(current_streams[idx], desired_streams[idx])
+        if branches:
+            plan.rebuild[idx] = branches
+        if updates:
+            plan.updates[idx] = updates
+
+    plan.added = list(range(common, len(desired_streams)))
+    plan.removed = list(reversed(range(common, len(current_streams))))
+    return plan
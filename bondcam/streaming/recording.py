@@ -0,0 +1,113 @@
+"""Local high-quality recording of each stream's encode, next to its RTMP output.
+
+Each stream with a ``record`` channel setting writes its already-encoded
+H.264/AAC to MP4 or Matroska files, split by size and time. Nothing is encoded
+a second time. The files of a stream are kept under a size quota, and the
+oldest are deleted when the quota is reached or the disk runs low on space,
+down to the newest one.
+
+Writes go through bounded, leaky queues whose threads do all the muxing and
+file I/O, so a slow SD card loses recorded media instead of holding back the
+live stream.
+"""
+
+import os
+from bondcam.streaming.dvr import SegmentRing
+from bondcam.utils.logger import get_logger
+
+logger = get_logger()
+
+# Defaults for the per-stream 'record' channel setting
+DEFAULT_FORMAT = 'mp4'
+DEFAULT_SEGMENT_SECONDS = 300
+DEFAULT_SEGMENT_BYTES = 1024 * 1024 * 1024
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024 * 1024
+DEFAULT_MIN_FREE_BYTES = 1024 * 1024 * 1024
+
+# Muxer factory and file extension of each recording format
+RECORD_FORMATS = {
+    'mp4': ('mp4mux', '.mp4'),
+    'mkv': ('matroskamux', '.mkv'),
+}
+
+# Most media an I/O queue holds while the disk is slow, before dropping the oldest data
+RECORD_QUEUE_BYTES = 32 * 1024 * 1024
+
+# Seconds between rewrites of an MP4's index, the media lost at most on a power cut
+MOOV_UPDATE_SECONDS = 2
+
+# Size of the file writes, small muxer writes are gathered into these
+WRITE_BUFFER_BYTES = 1024 * 1024
+
+
+class RecordingRing(SegmentRing):
+    """Recording files of one stream, the oldest deleted to stay within the disk quota."""
+
+    def __init__(self, directory, extension, max_bytes=DEFAULT_MAX_BYTES, min_free_bytes=DEFAULT_MIN_FREE_BYTES):
+        """Initialize RecordingRing, picking up files left by a previous run.
+
+        Args:
+            directory: Directory holding this stream's recordings
+            extension: File extension of the recording format
+            max_bytes: Most bytes of recordings kept for the stream
+            min_free_bytes: Free space left on the disk for everything else
+        """
+        self.min_free_bytes = min_free_bytes
+        super().__init__(directory, max_bytes, None, extension=extension)
+
+    def set_quota(self, max_bytes, min_free_bytes):
+        """Change the quota, deleting right away if it shrank."""
+        with self.lock:
+            self.max_bytes = max_bytes
+            self.min_free_bytes = min_free_bytes
+        self.enforce_limits()
+
+    def over_limits(self, oldest, now):
+        # Recordings are kept for as long as there is room for them, and the newest always.
+        # The file being written counts towards the quota. Free space that cannot be read
+        # does not delete anything.
+        if len(self.segments) <= 1:
+            return False
+        if self.total_bytes + self.open_bytes() > self.max_bytes:
+            return True
+        free = free_bytes(self.directory)
+        return free is not None and free < self.min_free_bytes
+
+    def open_bytes(self):
+        """Get the size written so far of the files being recorded. Called with the lock held."""
+        total = 0
+        for location in self.open_segments:
+            try:
+                total += os.path.getsize(location)
+            except OSError:
+                pass  # Not created yet
+        return total
+
+
+def free_bytes(directory):
+    """Get the space left on the disk holding a directory, None when it cannot be read."""
+    try:
+        stat = os.statvfs(directory)
+    except OSError as e:
+        logger.warning(f"Could not read the free space of {directory}: {e}")
+        return None
+    return stat.f_bavail * stat.f_frsize
+
+
+def record_settings(channel):
+    """Get the recording settings of a channel, or None if recording is disabled.
+
+    Returns:
+        Dictionary with format, segmentSeconds, segmentBytes, maxBytes and minFreeBytes
+    """
+    record = channel.get('record') or {}
+    if not record.get('enabled'):
+        return None
+    record_format = record.get('format', DEFAULT_FORMAT)
+    return {
+        'format': record_format if record_format in RECORD_FORMATS else DEFAULT_FORMAT,
+        'segmentSeconds': record.get('segmentSeconds', DEFAULT_SEGMENT_SECONDS),
+        'segmentBytes': record.get('segmentBytes', DEFAULT_SEGMENT_BYTES),
+        'maxBytes': record.get('maxBytes', DEFAULT_MAX_BYTES),
+        'minFreeBytes': record.get('minFreeBytes', DEFAULT_MIN_FREE_BYTES),
+    }
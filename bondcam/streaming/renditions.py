@@ -0,0 +1,123 @@
+"""Expansion of multi-rendition streams into the flat list the pipeline is built from.
+
+A ``videoStreams`` entry may list ``renditions`` in its channel settings, each
+overriding the channel (resolution, frame rate, bitrate...) and sending to one
+``streamEndpoint`` or several ``streamEndpoints``. Without ``renditions`` the
+channel itself is the only rendition, so a plain stream can also fan out to
+several endpoints.
+
+Every endpoint of every rendition becomes one flat stream with a single RTMP
+output, numbered by position like before. Two indices tie the flat streams
+together:
+
+- ``capture``: the stream opening the camera. Streams on the same camera are
+  fed from its capture tee, scaled to their own size, whatever their backups.
+- ``encode``: the stream whose encoder feeds the output. Streams on the same
+  camera with the same backups and encode settings share one encoder.
+
+The capture runs at the largest size and frame rate of its group, recorded
+as ``captureSize`` on the stream opening the camera. That stream also opens
+the backups of the whole group, listed after the camera as ``captureCameras``,
+so each device is opened once; a stream only goes on air with its own.
+
+An entry listing ``cameras`` is a composite of them (see composite.py). Its
+flat streams get ``tiles``, one per camera, each with the stream whose capture
+already shows that camera as ``capture`` (None when the composite opens it).
+"""
+
+import copy
+
+# Channel settings that must match for two renditions to share an encoder
+ENCODE_SETTINGS = ('resolution', 'frameRate', 'bitrate', 'abr', 'latencyStamps', 'latencyProfile', 'slate')
+
+DEFAULT_WIDTH = 1920
+DEFAULT_HEIGHT = 1080
+DEFAULT_FRAMERATE = 30
+
+
+def stream_size(channel):
+    """Get the (width, height, framerate) a channel is encoded at."""
+    resolution = channel.get('resolution', {'width': DEFAULT_WIDTH, 'height': DEFAULT_HEIGHT})
+    return (
+        resolution.get('width', DEFAULT_WIDTH),
+        resolution.get('height', DEFAULT_HEIGHT),
+        channel.get('frameRate', DEFAULT_FRAMERATE),
+    )
+
+
+def rendition_channels(channel):
+    """Get one channel per endpoint of every rendition of a stream's channel."""
+    base = {key: value for key, value in channel.items() if key not in ('renditions', 'streamEndpoints')}
+    renditions = channel.get('renditions') or [{key: channel[key] for key in ('streamEndpoints',) if key in channel}]
+    channels = []
+    for rendition in renditions:
+        merged = copy.deepcopy(base)
+        merged.update({key: copy.deepcopy(value) for key, value in rendition.items() if key != 'streamEndpoints'})
+        endpoints = rendition.get('streamEndpoints') or [merged.get('streamEndpoint', '')]
+        for endpoint in endpoints:
+            flat = copy.deepcopy(merged)
+            flat['streamEndpoint'] = endpoint
+            channels.append(flat)
+    return channels
+
+
+def expand_renditions(video_streams):
+    """Flatten the renditions of each video stream.
+
+    Args:
+        video_streams: Resolved ``videoStreams`` settings
+
+    Returns:
+        List of stream dictionaries with 'camera', 'backupCameras', 'channel',
+        'capture' and 'encode', 'tiles' on composites, plus 'captureSize' and
+        'captureCameras' on the streams opening a camera
+    """
+    flat = []
+    capture_owners = {}
+    encode_owners = {}
+    composites = []
+    for entry, stream in enumerate(video_streams):
+        camera = stream.get('camera')
+        backups = list(stream.get('backupCameras') or [])
+        if 'cameras' in stream:
+            # Composites mix their own cameras, nothing else shares their capture
+            camera, backups = None, []
+            capture_key = ('composite', entry)
+        elif camera is not None:
+            # A device can only be opened once, backups are applied per stream
+            capture_key = ('camera', camera)
+        else:
+            # A camera without a device is only shared between the renditions declaring it
+            capture_key = ('stream', entry)
+        for channel in rendition_channels(stream.get('channel', {})):
+            idx = len(flat)
+            capture = capture_owners.setdefault(capture_key, idx)
+            encode_key = (capture_key, tuple(backups), repr([channel.get(key) for key in ENCODE_SETTINGS]))
+            encode = encode_owners.setdefault(encode_key, idx)
+            flat.append({'camera': camera, 'backupCameras': backups, 'channel': channel, 'capture': capture,
+                         'encode': encode})
+            if 'cameras' in stream:
+                composites.append((flat[-1], stream['cameras'] or []))
+
+    # Tiles showing a camera some stream already captures share that capture
+    shown = {}
+    for stream in flat:
+        if stream['camera'] is not None:
+            shown.setdefault(stream['camera'], stream['capture'])
+    for stream, cameras in composites:
+        stream['tiles'] = [{'camera': camera, 'capture': shown.get(camera) if camera is not None else None}
+                           for camera in cameras]
+
+    for owner in set(capture_owners.values()):
+        sizes = [stream_size(stream['channel']) for stream in flat if stream['capture'] == owner]
+        width, height, _ = max(sizes, key=lambda size: size[0] * size[1])
+        framerate = max(size[2] for size in sizes)
+        flat[owner]['captureSize'] = {'width': width, 'height': height, 'frameRate': framerate}
+        if flat[owner]['camera'] is not None:
+            cameras = [flat[owner]['camera']] + flat[owner]['backupCameras']
+            for stream in flat:
+                if stream['capture'] == owner:
+                    cameras += [camera for camera in stream['backupCameras']
+                                if camera is not None and camera not in cameras]
+            flat[owner]['captureCameras'] = cameras
+    return flat
@@ -0,0 +1,131 @@
+"""Fallback slate shown while none of a stream's cameras delivers frames.
+
+A stream's ``slate`` channel setting names a local image or short clip. It is
+decoded and scaled once, to NV12 at the stream size, and the frames are kept
+in memory: the live source only pushes them again with new timestamps, like
+the AAC silence source, so showing the slate costs no decoding or scaling.
+Clips longer than SLATE_MAX_BYTES of raw frames loop over the part that fits.
+"""
+
+import gi
+gi.require_version('Gst', '1.0')
+
+import os
+import time
+
+from gi.repository import Gst
+from bondcam.streaming.capture import output_caps
+from bondcam.utils.logger import get_logger
+
+logger = get_logger()
+
+# Raw frames kept per slate, about 10 frames of 1080p NV12
+SLATE_MAX_BYTES = 32 * 1024 * 1024
+
+# Seconds a slate gets to decode
+SLATE_DECODE_TIMEOUT = 10
+
+# Seconds between checks of the decoder's bus while waiting for frames
+SLATE_POLL_INTERVAL = 0.05
+
+# Decoded slates by (path, width, height, framerate), shared by streams and rebuilds
+_frames = {}
+
+# Slates that failed to decode, by key, with the modification time of the file then
+_failed = {}
+
+
+def decode_slate(path, width, height, framerate):
+    """Decode an image or clip into NV12 frames at a stream size.
+
+    Returns:
+        List of Gst.Buffer frames, empty if the file cannot be decoded
+    """
+    key = (path, width, height, framerate)
+    if key in _frames:
+        return _frames[key]
+    # Runs on the main loop: fail right away on a missing file, or one that failed before and did not change
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        logger.error(f"Slate {path} does not exist, using the test pattern instead")
+        return []
+    if _failed.get(key) == mtime:
+        return []
+    pipeline = Gst.parse_launch(
+        f"filesrc name=file ! decodebin ! videoconvert ! videoscale ! videorate ! "
+        f"{output_caps(width, height, framerate)} ! appsink name=frames sync=false"
+    )
+    # Set as a property, the path never needs quoting
+    pipeline.get_by_name('file').set_property('location', path)
+    appsink = pipeline.get_by_name('frames')
+    bus = pipeline.get_bus()
+    frames = []
+    size = 0
+    deadline = time.monotonic() + SLATE_DECODE_TIMEOUT
+    pipeline.set_state(Gst.State.PLAYING)
+    try:
+        while size < SLATE_MAX_BYTES:
+            sample = appsink.emit('try-pull-sample', int(SLATE_POLL_INTERVAL * Gst.SECOND))
+            if sample is not None:
+                buffer = sample.get_buffer()
+                frames.append(buffer)
+                size += buffer.get_size()
+                continue
+            # An undecodable file never reaches the appsink, its error only shows on the bus
+            message = bus.pop_filtered(Gst.MessageType.ERROR)
+            if message is not None:
+                error, debug = message.parse_error()
+                logger.error(f"Slate {path}: {error.message}")
+                break
+            if appsink.get_property('eos') or time.monotonic() > deadline:
+                break
+    finally:
+        pipeline.set_state(Gst.State.NULL)
+    if not frames:
+        logger.error(f"Could not decode slate {path}, using the test pattern instead")
+        _failed[key] = mtime
+    else:
+        logger.info(f"Decoded slate {path}: {len(frames)} frames at {width}x{height}")
+        _frames[key] = frames
+    return frames
+
+
+class SlateSource:
+    """Live source looping a slate's decoded frames, paced to the clock."""
+
+    def __init__(self, frames, width, height, framerate):
+        self.bin = Gst.parse_bin_from_description(
+            f'appsrc name=slate is-live=true format=time max-bytes=1 caps="{output_caps(width, height, framerate)}" '
+            f'! identity sync=true',
+            True)
+        self.appsrc = self.bin.get_by_name('slate')
+        self.frames = frames
+        self.duration = Gst.util_uint64_scale(Gst.SECOND, 1, framerate)
+        self.base_time = None
+        self.count = 0
+        self.appsrc.connect('need-data', self.on_need_data)
+
+    def on_need_data(self, appsrc, length):
+        if self.base_time is None:
+            # Start at the current running time, the source may join a running pipeline
+            clock = appsrc.get_clock()
+            self.base_time = clock.get_time() - appsrc.get_base_time() if clock else 0
+        # Shares the frame's memory, only the timestamps are new
+        buffer = self.frames[self.count % len(self.frames)].copy()
+        buffer.pts = self.base_time + self.count * self.duration
+        buffer.duration = self.duration
+        self.count += 1
+        appsrc.emit('push-buffer', buffer)
+
+
+def make_slate_source(path, width, height, framerate):
+    """Build the source showing a slate at a stream size.
+
+    Returns:
+        SlateSource with a 'src' ghost pad on its bin, or None if the slate cannot be decoded
+    """
+    frames = decode_slate(path, width, height, framerate)
+    if not frames:
+        return None
+    return SlateSource(frames, width, height, framerate)
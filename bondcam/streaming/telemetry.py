@@ -0,0 +1,454 @@
+"""Pipeline metrics: frame rate, bitrate, queue levels and drops, output sink and bonded link stats, recording writes, CPU and camera starts.
+
+Cheap counters run all the time: one buffer probe per encoded stream and the
+'overrun' signal of every queue. A GLib timer turns them into samples kept in
+fixed-size rings, one per metric series. Detailed tracing, which probes every
+buffer going in and out of each processing element to measure its processing
+time, is only installed on demand.
+
+The latest samples are published as an immutable snapshot that the metrics
+HTTP endpoint and the heartbeat read without touching the pipeline.
+"""
+
+import gi
+gi.require_version('Gst', '1.0')
+
+import collections
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from gi.repository import GLib, Gst
+from bondcam.streaming.transport import sink_stats
+from bondcam.utils.logger import get_logger
+
+logger = get_logger()
+
+# Seconds between samples
+TELEMETRY_INTERVAL = 5
+
+# Samples kept per series
+RING_SIZE = 120
+
+# Pending buffers remembered per traced element, the oldest are forgotten first:
+# elements changing timestamps (parsers, muxers) leave some unmatched
+TRACE_PENDING_LIMIT = 64
+
+# Factories whose processing time is not worth tracing
+UNTRACED_FACTORIES = ('queue', 'tee', 'capsfilter', 'input-selector', 'videotestsrc', 'v4l2src')
+
+# Help text of each exported metric, and whether it is a counter
+METRICS = {
+    'bondcam_stream_fps': ('Encoded frames per second', False),
+    'bondcam_stream_bitrate_bps': ('Encoder output bitrate', False),
+    'bondcam_queue_level_seconds': ('Media waiting in a queue', False),
+    'bondcam_queue_drops_total': ('Times a queue was full and dropped or blocked', True),
+    'bondcam_rtmp_bytes_sent_total': ('Bytes written by an output sink (RTMP or SRT)', True),
+    'bondcam_output_rtt_seconds': ('Round trip time an SRT output measured', False),
+    'bondcam_output_retransmitted_packets_total': ('Packets an SRT or RIST output sent again', True),
+    'bondcam_output_lost_packets_total': ('Packets an SRT output reported lost', True),
+    'bondcam_link_rtt_seconds': ('Round trip time of a bonded link', False),
+    'bondcam_link_throughput_bps': ('Bits per second a bonded link delivered', False),
+    'bondcam_link_loss_ratio': ('Share of the datagrams a bonded link lost', False),
+    'bondcam_link_weight': ('Weight of a bonded link in the striping, relative to the other links', False),
+    'bondcam_pipeline_latency_seconds': ('Latency reported by the pipeline latency query', False),
+    'bondcam_process_cpu_percent': ('CPU used by the process', False),
+    'bondcam_element_proctime_seconds': ('Mean time a buffer spends in an element (tracing)', False),
+    'bondcam_camera_first_frame_seconds': ('Time from a camera connection attempt to its first frame', False),
+    'bondcam_main_loop_block_seconds': ('Longest main loop block connecting cameras since the last sample', False),
+    'bondcam_recording_bytes_written_total': ('Bytes a local recording handed to its files', True),
+    'bondcam_recording_write_bytes_per_second': ('Write throughput of a local recording', False),
+    'bondcam_recording_queue_high_water_bytes': ('Most data a recording I/O queue held since it started', False),
+}
+
+
+# Per-stream and per-output series reported in the heartbeat summary, by the key they are reported under
+SUMMARY_KEYS = {
+    'bondcam_stream_fps': 'fps',
+    'bondcam_stream_bitrate_bps': 'bitrate',
+    'bondcam_recording_write_bytes_per_second': 'recordingWriteBytesPerSecond',
+    'bondcam_rtmp_bytes_sent_total': 'rtmpBytesSent',
+    'bondcam_output_rtt_seconds': 'rttSeconds',
+    'bondcam_output_retransmitted_packets_total': 'retransmittedPackets',
+    'bondcam_output_lost_packets_total': 'lostPackets',
+}
+
+# Output sink stats and the series they are exported as
+SINK_METRICS = {
+    'bytes_sent': 'bondcam_rtmp_bytes_sent_total',
+    'rtt': 'bondcam_output_rtt_seconds',
+    'retransmitted': 'bondcam_output_retransmitted_packets_total',
+    'lost': 'bondcam_output_lost_packets_total',
+}
+
+
+class MetricRing:
+    """Fixed-size history of (timestamp, value) samples of one series."""
+
+    def __init__(self, size=RING_SIZE):
+        self.samples = collections.deque(maxlen=size)
+
+    def add(self, value, now):
+        self.samples.append((now, value))
+
+    def latest(self):
+        return self.samples[-1][1] if self.samples else None
+
+
+class PipelineTelemetry:
+    """Collects the metrics of one StreamManager's pipeline."""
+
+    def __init__(self, enabled=True, tracing=False):
+        """Initialize PipelineTelemetry.
+
+        Args:
+            enabled: Install the counters, disabled telemetry costs nothing
+            tracing: Trace the processing time of every element from the start
+        """
+        self.enabled = enabled
+        self.tracing = tracing
+        self.rings = {}  # (metric, labels) -> MetricRing
+        self.snapshot = {}  # (metric, labels) -> latest value, replaced as a whole
+        self.stream_counters = {}  # stream number -> [frames, bytes]
+        self.recording_counters = {}  # stream number -> {'written': bytes, 'high_water': {queue name: bytes}}
+        self.bonders = {}  # output number -> LinkBonder
+        self.queue_drops = {}  # queue name -> drops
+        self.watched_queues = set()
+        self.traced = {}  # element -> [(pad, probe id)], pending {pts: time}, [total, count]
+        self.first_frames = {}  # stream number -> seconds from connection attempt to first camera frame
+        self.main_loop_block = 0.0
+        self.last_sample = None
+        self.last_cpu = None
+        self.last_totals = {}
+
+    def watch_stream(self, camera_num, pad):
+        """Count the encoded frames and bytes a stream's tee receives."""
+        if not self.enabled:
+            return
+        counters = [0, 0]
+        self.stream_counters[camera_num] = counters
+        pad.add_probe(Gst.PadProbeType.BUFFER, self._count_buffer, counters)
+
+    def watch_recording(self, camera_num, sink_pad, queues):
+        """Count the bytes a stream's recording writes and the most its I/O queues hold."""
+        if not self.enabled:
+            return
+        counters = {'written': 0, 'high_water': {queue.get_name(): 0 for queue in queues}}
+        self.recording_counters[camera_num] = counters
+        sink_pad.add_probe(Gst.PadProbeType.BUFFER, self._count_written, counters)
+        for queue in queues:
+            queue.get_static_pad('sink').add_probe(Gst.PadProbeType.BUFFER, self._track_high_water,
+                                                   (queue, counters['high_water']))
+
+    def unwatch_recording(self, camera_num):
+        """Stop reporting a recording that was removed."""
+        self.recording_counters.pop(camera_num, None)
+        self.last_totals.pop(('recording', camera_num), None)
+
+    def watch_bonder(self, camera_num, bonder):
+        """Report the links of a stream's bonded output."""
+        if self.enabled:
+            self.bonders[camera_num] = bonder
+
+    def unwatch_bonder(self, camera_num):
+        """Stop reporting a bonder that was stopped."""
+        self.bonders.pop(camera_num, None)
+
+    def record_first_frame(self, camera_num, seconds):
+        """Record how long a stream's camera took from its connection attempt to its first frame."""
+        self.first_frames[camera_num] = seconds
+
+    def record_main_loop_block(self, seconds):
+        """Record time the main loop spent in one piece of camera handling."""
+        self.main_loop_block = max(self.main_loop_block, seconds)
+
+    def _count_buffer(self, pad, info, counters):
+        # Streaming thread: two integer updates, nothing else
+        counters[0] += 1
+        counters[1] += info.get_buffer().get_size()
+        return Gst.PadProbeReturn.OK
+
+    def _count_written(self, pad, info, counters):
+        # I/O thread: bytes the muxer hands to the file sink
+        counters['written'] += info.get_buffer().get_size()
+        return Gst.PadProbeReturn.OK
+
+    def _track_high_water(self, pad, info, data):
+        # Streaming thread, before the buffer is queued: the level it finds plus itself
+        queue, high_water = data
+        level = queue.get_property('current-level-bytes') + info.get_buffer().get_size()
+        name = queue.get_name()
+        if level > high_water[name]:
+            high_water[name] = level
+        return Gst.PadProbeReturn.OK
+
+    def _on_overrun(self, queue):
+        name = queue.get_name()
+        self.queue_drops[name] = self.queue_drops.get(name, 0) + 1
+
+    def set_tracing(self, pipeline, enabled):
+        """Turn per-buffer element tracing on or off."""
+        self.tracing = enabled
+        if not enabled:
+            for element, (probes, pending, totals) in self.traced.items():
+                for pad, probe_id in probes:
+                    pad.remove_probe(probe_id)
+            self.traced = {}
+        elif pipeline:
+            self._trace_new_elements(pipeline)
+        logger.info(f"Element tracing {'enabled' if enabled else 'disabled'}")
+        return False
+
+    def untrace(self, bin):
+        """Remove the tracing probes of the elements of a bin being discarded."""
+        for element in list(self.traced):
+            if element.has_as_ancestor(bin):
+                probes, pending, totals = self.traced.pop(element)
+                for pad, probe_id in probes:
+                    pad.remove_probe(probe_id)
+
+    def _trace_new_elements(self, pipeline):
+        # Elements of rebuilt streams appear between samples
+        for element in self._elements(pipeline):
+            factory = element.get_factory()
+            if element in self.traced or factory is None or factory.get_name() in UNTRACED_FACTORIES:
+                continue
+            sink, src = element.get_static_pad('sink'), element.get_static_pad('src')
+            if sink is None or src is None:
+                continue
+            # Shared by the sink and src streaming threads, OrderedDict.popitem is atomic
+            pending = collections.OrderedDict()
+            totals = [0.0, 0]
+            probes = [
+                (sink, sink.add_probe(Gst.PadProbeType.BUFFER, self._trace_in, pending)),
+                (src, src.add_probe(Gst.PadProbeType.BUFFER, self._trace_out, (pending, totals))),
+            ]
+            self.traced[element] = (probes, pending, totals)
+
+    def _trace_in(self, pad, info, pending):
+        if len(pending) >= TRACE_PENDING_LIMIT:
+            pending.popitem(last=False)
+        pending[info.get_buffer().pts] = time.monotonic()
+        return Gst.PadProbeReturn.OK
+
+    def _trace_out(self, pad, info, data):
+        pending, totals = data
+        started = pending.pop(info.get_buffer().pts, None)
+        if started is not None:
+            totals[0] += time.monotonic() - started
+            totals[1] += 1
+        return Gst.PadProbeReturn.OK
+
+    def _elements(self, pipeline):
+        elements = []
+        iterator = pipeline.iterate_recurse()
+        while True:
+            result, element = iterator.next()
+            if result == Gst.IteratorResult.RESYNC:
+                iterator.resync()
+                elements = []
+            elif result != Gst.IteratorResult.OK:
+                return elements
+            else:
+                elements.append(element)
+
+    def sample(self, pipeline, rtmp_sinks):
+        """Take one sample of every metric.
+
+        Args:
+            pipeline: Running pipeline, or None
+            rtmp_sinks: {output number: output sink element (rtmp2sink, srtsink or ristsink)}
+        """
+        if not self.enabled:
+            return
+        now = time.time()
+        elapsed = now - self.last_sample if self.last_sample else None
+        self.last_sample = now
+        values = {}
+        live = set()  # Labels of the streams, outputs, queues, links and elements that still exist
+
+        cpu = time.process_time()
+        if elapsed and self.last_cpu is not None:
+            values[('bondcam_process_cpu_percent', ())] = round(100 * (cpu - self.last_cpu) / elapsed, 2)
+        self.last_cpu = cpu
+
+        for camera_num, seconds in list(self.first_frames.items()):
+            live.add(('camera', str(camera_num)))
+            values[('bondcam_camera_first_frame_seconds', (('camera', str(camera_num)),))] = round(seconds, 3)
+        values[('bondcam_main_loop_block_seconds', ())] = round(self.main_loop_block, 4)
+        self.main_loop_block = 0.0
+
+        for camera_num, (frames, size) in list(self.stream_counters.items()):
+            live.add(('stream', str(camera_num)))
+            previous = self.last_totals.get(camera_num)
+            self.last_totals[camera_num] = (frames, size)
+            if elapsed and previous and frames >= previous[0]:
+                labels = (('stream', str(camera_num)),)
+                values[('bondcam_stream_fps', labels)] = round((frames - previous[0]) / elapsed, 2)
+                values[('bondcam_stream_bitrate_bps', labels)] = int((size - previous[1]) * 8 / elapsed)
+
+        for camera_num, counters in list(self.recording_counters.items()):
+            labels = (('stream', str(camera_num)),)
+            live.add(labels[0])
+            written = counters['written']
+            previous = self.last_totals.get(('recording', camera_num))
+            self.last_totals[('recording', camera_num)] = written
+            values[('bondcam_recording_bytes_written_total', labels)] = written
+            if elapsed and previous is not None:
+                values[('bondcam_recording_write_bytes_per_second', labels)] = int((written - previous) / elapsed)
+            for name, level in list(counters['high_water'].items()):
+                live.add(('queue', name))
+                values[('bondcam_recording_queue_high_water_bytes', (('queue', name),))] = level
+
+        if pipeline:
+            for element in self._elements(pipeline):
+                factory = element.get_factory()
+                if factory is None or factory.get_name() != 'queue':
+                    continue
+                if element not in self.watched_queues:
+                    self.watched_queues.add(element)
+                    element.connect('overrun', self._on_overrun)
+                name = element.get_name()
+                labels = (('queue', name),)
+                live.add(labels[0])
+                values[('bondcam_queue_level_seconds', labels)] = element.get_property('current-level-time') / Gst.SECOND
+                values[('bondcam_queue_drops_total', labels)] = self.queue_drops.get(name, 0)
+            # Forget the queues of removed bins
+            self.watched_queues = {queue for queue in self.watched_queues if queue.get_parent() is not None}
+
+            query = Gst.Query.new_latency()
+            if pipeline.query(query):
+                ok, minimum, _ = query.parse_latency()
+                values[('bondcam_pipeline_latency_seconds', ())] = minimum / Gst.SECOND
+
+        for output_num, sink in rtmp_sinks.items():
+            labels = (('output', str(output_num)),)
+            live.add(labels[0])
+            for stat, value in sink_stats(sink).items():
+                if value is not None:
+                    values[(SINK_METRICS[stat], labels)] = value
+
+        for output_num, bonder in list(self.bonders.items()):
+            for name, link in bonder.stats().items():
+                labels = (('link', name), ('output', str(output_num)))
+                live.update(labels)
+                if link['rtt'] is not None:
+                    values[('bondcam_link_rtt_seconds', labels)] = round(link['rtt'], 4)
+                values[('bondcam_link_throughput_bps', labels)] = link['throughput']
+                values[('bondcam_link_loss_ratio', labels)] = link['loss']
+                values[('bondcam_link_weight', labels)] = link['weight']
+
+        if self.tracing and pipeline:
+            # Drop the elements of removed bins, then pick up the new ones
+            self.traced = {element: data for element, data in self.traced.items() if element.get_parent() is not None}
+            self._trace_new_elements(pipeline)
+            for element, (probes, pending, totals) in self.traced.items():
+                live.add(('element', element.get_name()))
+                if totals[1]:
+                    labels = (('element', element.get_name()),)
+                    values[('bondcam_element_proctime_seconds', labels)] = totals[0] / totals[1]
+                    totals[0], totals[1] = 0.0, 0
+
+        for key, value in values.items():
+            ring = self.rings.get(key)
+            if ring is None:
+                ring = self.rings[key] = MetricRing()
+            ring.add(value, now)
+        # A series missing one sample keeps its history, only those of removed elements go
+        self.rings = {key: ring for key, ring in self.rings.items() if all(label in live for label in key[1])}
+        self.snapshot = values
+
+    def history(self, metric, labels=()):
+        """Get the recent (timestamp, value) samples of one series."""
+        ring = self.rings.get((metric, tuple(labels)))
+        return list(ring.samples) if ring else []
+
+    def render_prometheus(self):
+        """Render the latest samples in the Prometheus text exposition format."""
+        snapshot = self.snapshot
+        lines = []
+        for metric, (help_text, counter) in METRICS.items():
+            series = [(labels, value) for (name, labels), value in snapshot.items() if name == metric]
+            if not series:
+                continue
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f"# TYPE {metric} {'counter' if counter else 'gauge'}")
+            for labels, value in sorted(series):
+                label_text = ','.join(f'{key}="{label}"' for key, label in labels)
+                lines.append(f'{metric}{{{label_text}}} {value}' if label_text else f'{metric} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """Get a compact view of the latest samples for the device heartbeat."""
+        snapshot = self.snapshot
+        streams = {}
+        for (metric, labels), value in snapshot.items():
+            label = dict(labels)
+            number = label.get('stream') or label.get('output')
+            if number and metric in SUMMARY_KEYS:
+                streams.setdefault(number, {})[SUMMARY_KEYS[metric]] = value
+        return {
+            'cpuPercent': snapshot.get(('bondcam_process_cpu_percent', ())),
+            'queueDrops': sum(value for (metric, labels), value in snapshot.items()
+                              if metric == 'bondcam_queue_drops_total'),
+            'streams': streams,
+        }
+
+
+class MetricsServer:
+    """Local HTTP endpoint serving /metrics, and /tracing to toggle element tracing."""
+
+    def __init__(self, telemetry, listen, set_tracing):
+        """Initialize MetricsServer.
+
+        Args:
+            telemetry: PipelineTelemetry to serve
+            listen: 'host:port' to listen on
+            set_tracing: Callable(enabled) run on the main loop
+        """
+        host, port = listen.rsplit(':', 1)
+        self.telemetry = telemetry
+        self.set_tracing = set_tracing
+        self.server = ThreadingHTTPServer((host, int(port)), self._handler())
+        self.server.daemon_threads = True
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = urlparse(self.path).path
+                if path == '/metrics':
+                    self._reply(200, server.telemetry.render_prometheus(), 'text/plain; version=0.0.4')
+                elif path == '/tracing':
+                    self._reply(200, f'{int(server.telemetry.tracing)}\n')
+                else:
+                    self._reply(404, 'not found\n')
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                if url.path != '/tracing':
+                    self._reply(404, 'not found\n')
+                    return
+                enabled = parse_qs(url.query).get('enabled', ['1'])[0] in ('1', 'true', 'on')
+                # Probes are installed from the main loop, never from this thread
+                GLib.idle_add(server.set_tracing, enabled)
+                self._reply(202, f'{int(enabled)}\n')
+
+            def _reply(self, status, body, content_type='text/plain'):
+                data = body.encode()
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                # Scrapes every few seconds would flood the log
+                pass
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name='metrics', daemon=True).start()
+        logger.info(f"Serving pipeline metrics on http://{self.server.server_address[0]}:{self.server.server_address[1]}/metrics")
@@ -0,0 +1,144 @@
+"""Output transports: RTMP over TCP, or SRT and RIST over UDP for lossy uplinks.
+
+The scheme of a stream's ``streamEndpoint`` picks the transport. ``rtmp://``
+and ``rtmps://`` send FLV through rtmp2sink. On a cellular or WiFi link, a
+single lost TCP segment holds back everything sent after it until it is
+retransmitted, and throughput collapses as loss grows. ``srt://`` and
+``rist://`` endpoints send MPEG-TS over UDP instead: lost packets are
+retransmitted within a fixed latency window while the packets behind them keep
+flowing.
+
+The optional ``transport`` channel setting tunes SRT and RIST:
+
+- ``latency``: milliseconds the receiver waits for retransmissions, about four
+  times the uplink round trip; defaults from the stream's latency profile
+- ``overhead``: bandwidth retransmissions may use on top of the stream, as a
+  percentage of its bitrate (SRT only)
+- ``passphrase`` and ``keyLength`` (16, 24 or 32 bytes): AES encryption (SRT
+  only, GStreamer's RIST sink sends in the clear)
+"""
+
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from bondcam.utils.logger import get_logger
+
+logger = get_logger()
+
+RTMP = 'rtmp'
+SRT = 'srt'
+RIST = 'rist'
+
+# Muxer, its video and audio pads, the payloader between muxer and sink, and the sink of each transport
+TRANSPORTS = {
+    RTMP: {'muxer': 'flvmux', 'mux_pads': ('video', 'audio'), 'payloader': None, 'sink': 'rtmp2sink'},
+    SRT: {'muxer': 'mpegtsmux', 'mux_pads': ('sink_%d', 'sink_%d'), 'payloader': None, 'sink': 'srtsink'},
+    RIST: {'muxer': 'mpegtsmux', 'mux_pads': ('sink_%d', 'sink_%d'), 'payloader': 'rtpmp2tpay', 'sink': 'ristsink'},
+}
+
+# MPEG-TS packets per buffer: 7 x 188 bytes fill a UDP datagram without IP fragmentation
+TS_ALIGNMENT = 7
+
+# Defaults for the per-stream 'transport' channel setting
+DEFAULT_OVERHEAD_PERCENT = 25
+DEFAULT_KEY_LENGTH = 16
+KEY_LENGTHS = (16, 24, 32)
+
+
+def transport_name(endpoint):
+    """Get the transport of an endpoint URL, RTMP for anything but srt:// and rist://."""
+    scheme = urlsplit(endpoint or '').scheme.lower()
+    return scheme if scheme in (SRT, RIST) else RTMP
+
+
+def transport_settings(channel, latency_profile):
+    """Get the SRT/RIST settings of a channel, with their defaults.
+
+    Args:
+        channel: Channel settings
+        latency_profile: The stream's latency profile, for the default latency
+
+    Returns:
+        Dictionary with latency (ms), overhead (%), passphrase (or None) and keyLength
+    """
+    transport = channel.get('transport') or {}
+    key_length = transport.get('keyLength', DEFAULT_KEY_LENGTH)
+    if key_length not in KEY_LENGTHS:
+        logger.warning(f"Unsupported key length {key_length}, using {DEFAULT_KEY_LENGTH}")
+        key_length = DEFAULT_KEY_LENGTH
+    return {
+        'latency': transport.get('latency', latency_profile['transport_latency']),
+        'overhead': transport.get('overhead', DEFAULT_OVERHEAD_PERCENT),
+        'passphrase': transport.get('passphrase') or None,
+        'keyLength': key_length,
+    }
+
+
+def muxer_properties(name, latency_profile):
+    """Get the properties of a transport's muxer."""
+    if name == RTMP:
+        return {'streamable': True, 'latency': latency_profile['mux_latency']}
+    return {'alignment': TS_ALIGNMENT, 'latency': latency_profile['mux_latency']}
+
+
+def sink_properties(name, channel, latency_profile):
+    """Get the properties of a transport's sink for a channel's endpoint."""
+    endpoint = channel.get('streamEndpoint', '')
+    if name == RTMP:
+        return {'sync': False, 'chunk-size': latency_profile['chunk_size'], 'location': endpoint}
+    settings = transport_settings(channel, latency_profile)
+    if name == SRT:
+        properties = {'sync': False, 'uri': srt_uri(endpoint, settings['overhead']), 'latency': settings['latency']}
+        if settings['passphrase']:
+            properties['passphrase'] = settings['passphrase']
+            properties['pbkeylen'] = settings['keyLength']
+        return properties
+    if settings['passphrase']:
+        logger.warning(f"RIST output {endpoint} is not encrypted, the passphrase only applies to SRT")
+    url = urlsplit(endpoint)
+    # ristsink is a bin, it has no sync property
+    return {'address': url.hostname or '', 'port': url.port or 0, 'sender-buffer': settings['latency']}
+
+
+def srt_uri(endpoint, overhead):
+    """Add the retransmission overhead to an SRT URI, unless the URI sets its own."""
+    url = urlsplit(endpoint)
+    if {'maxbw', 'oheadbw'} & {key for key, value in parse_qsl(url.query)}:
+        return endpoint
+    # maxbw=0 caps the send rate at the measured input rate plus oheadbw percent.
+    # The query is appended to as it is, stream ids and the like keep their encoding.
+    extra = urlencode({'maxbw': 0, 'oheadbw': overhead})
+    query = f'{url.query}&{extra}' if url.query else extra
+    return urlunsplit((url.scheme, url.netloc, url.path, query, url.fragment))
+
+
+def _field(stats, name):
+    if stats is None or not stats.has_field(name):
+        return None
+    return stats.get_value(name)
+
+
+def sink_stats(sink):
+    """Read the statistics of an output sink, whatever its transport.
+
+    Returns:
+        Dictionary with bytes_sent, rtt (seconds), retransmitted and lost (packets),
+        None for the ones the sink does not report
+    """
+    stats = sink.get_property('stats') if sink.find_property('stats') else None
+    factory = sink.get_factory()
+    factory_name = factory.get_name() if factory else None
+    if factory_name == 'srtsink':
+        rtt = _field(stats, 'rtt-ms')
+        return {
+            'bytes_sent': _field(stats, 'bytes-sent'),
+            'rtt': rtt / 1000 if rtt is not None else None,
+            'retransmitted': _field(stats, 'packets-retransmitted'),
+            'lost': _field(stats, 'packets-sent-lost'),
+        }
+    if factory_name == 'ristsink':
+        return {
+            'bytes_sent': None,
+            'rtt': None,
+            'retransmitted': _field(stats, 'sent-retransmitted-packets'),
+            'lost': None,
+        }
+    return {'bytes_sent': _field(stats, 'out-bytes-total'), 'rtt': None, 'retransmitted': None, 'lost': None}
@@ -0,0 +1,36 @@
+"""Exponential backoff with jitter for retry loops."""
+
+import random
+
+
+class Backoff:
+    """Computes growing, randomized delays between retries.
+
+    Each delay is the exponential step scaled by a random factor in
+    [1 - jitter, 1], so that many devices retrying at once spread out.
+    """
+
+    def __init__(self, initial=1.0, maximum=60.0, factor=2.0, jitter=0.5):
+        """Initialize Backoff.
+
+        Args:
+            initial: Delay before the first retry, in seconds
+            maximum: Upper bound of the delay, in seconds
+            factor: Growth factor between consecutive retries
+            jitter: Fraction of the delay that is randomized (0 disables jitter)
+        """
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+        self.attempt = 0
+
+    def next_delay(self) -> float:
+        """Get the delay before the next retry and advance the attempt counter."""
+        delay = min(self.maximum, self.initial * (self.factor ** self.attempt))
+        self.attempt += 1
+        return delay * (1 - self.jitter * random.random())
+
+    def reset(self):
+        """Start over from the initial delay, after a successful attempt."""
+        self.attempt = 0
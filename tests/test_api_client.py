@@ -0,0 +1,33 @@
+"""Bus message latency stays flat while the backend answers slowly."""
+
+import pytest
+
+gi = pytest.importorskip('gi')
+pytest.importorskip('requests')
+gi.require_version('Gst', '1.0')
+
+from bondcam.bench.api import measure_bus_latency
+
+# Seconds the slow stand-in takes to answer, longer than any bus latency tolerated
+SLOW_DELAY = 2.0
+
+# Seconds each run sends updates and messages
+DURATION = 5.0
+
+# Most the p99 bus latency may grow with the slow backend, in ms
+MAX_P99_GROWTH_MS = 100
+
+
+def test_slow_backend_does_not_block_bus():
+    fast = measure_bus_latency(0.0, DURATION)
+    slow = measure_bus_latency(SLOW_DELAY, DURATION)
+    assert slow['backend_requests'] >= 1
+    assert slow['bus_latency_ms']['p99'] <= fast['bus_latency_ms']['p99'] + MAX_P99_GROWTH_MS
+    # A main loop waiting for the backend would hold messages back for the whole delay
+    assert slow['bus_latency_ms']['max'] < SLOW_DELAY * 1000 / 2
+
+
+def test_blocking_client_is_detected():
+    # The check above would catch a regression to the synchronous client
+    slow = measure_bus_latency(SLOW_DELAY, DURATION, blocking=True)
+    assert slow['bus_latency_ms']['max'] >= SLOW_DELAY * 1000 / 2
@@ -0,0 +1,22 @@
+"""Audio capture devices read from captured /proc/asound trees."""
+
+import os
+
+from bondcam.devices.audio import get_audio_devices
+
+FIXTURES = os.path.join(os.path.dirname(__file__), os.pardir, 'bondcam', 'bench', 'fixtures', 'asound')
+
+
+def test_discrete_rates():
+    devices = get_audio_devices(os.path.join(FIXTURES, 'orangepi5b-usb-mic'))
+    assert [device['path'] for device in devices] == ['hw:0,0', 'hw:2,0']
+    usb = devices[1]
+    assert usb['name'] == 'Device'
+    assert usb['channels'] == [1]
+    assert usb['rates'] == [44100, 48000]
+
+
+def test_continuous_rates_as_standard_rates():
+    devices = get_audio_devices(os.path.join(FIXTURES, 'unusual-names'))
+    assert [device['name'] for device in devices] == ['Mic: Pro X', 'Mic: Pro X']
+    assert devices[0]['rates'] == [8000, 11025, 16000, 22050, 32000, 44100, 48000, 88200, 96000]
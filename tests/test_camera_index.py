@@ -0,0 +1,99 @@
+"""CameraIndex fed with synthetic udev events through a fake monitor."""
+
+import pytest
+
+pytest.importorskip('pyudev')
+pytest.importorskip('gi')
+
+from bondcam.devices.video import CameraIndex
+
+CAPTURE = ':capture:'
+METADATA = ':'
+
+
+class FakeDevice(dict):
+    """pyudev Device stand-in: udev properties plus the attributes CameraIndex reads."""
+
+    def __init__(self, number, id_path='platform-xhci-usb-0:1:1.0', model='C920', capabilities=CAPTURE,
+                 action='add'):
+        super().__init__(DEVNAME=f'/dev/video{number}', ID_PATH=id_path, ID_MODEL=model,
+                         ID_V4L_CAPABILITIES=capabilities)
+        self.sys_path = f'/sys/devices/{id_path}/video4linux/video{number}'
+        self.sys_number = str(number)
+        self.device_node = f'/dev/video{number}'
+        self.action = action
+
+
+class FakeMonitor:
+    """pyudev Monitor stand-in handing out queued devices."""
+
+    def __init__(self, devices=()):
+        self.devices = list(devices)
+
+    def poll(self, timeout=None):
+        return self.devices.pop(0) if self.devices else None
+
+
+class FakeContext:
+    def __init__(self, devices=()):
+        self.devices = list(devices)
+
+    def list_devices(self, subsystem=None):
+        return list(self.devices)
+
+
+def feed(index, *devices):
+    index.monitor = FakeMonitor(devices)
+    assert index._on_monitor_readable(None, None)
+
+
+@pytest.fixture
+def index():
+    index = CameraIndex(FakeContext())
+    index.refresh()
+    index.events = []
+    index.add_listener(lambda action, camera: index.events.append((action, camera['path'])))
+    return index
+
+
+def test_add_and_remove(index):
+    feed(index, FakeDevice(0), FakeDevice(1, capabilities=METADATA))
+    assert index.events == [('add', '/dev/video0')]
+    assert index.cameras() == [{'name': 'C920 (platform-xhci-usb-0:1:1.0)', 'path': '/dev/video0'}]
+
+    feed(index, FakeDevice(1, capabilities=METADATA, action='remove'), FakeDevice(0, action='remove'))
+    assert index.events == [('add', '/dev/video0'), ('remove', '/dev/video0')]
+    assert index.cameras() == []
+
+
+def test_metadata_node_first(index):
+    feed(index, FakeDevice(2, capabilities=METADATA))
+    feed(index, FakeDevice(3))
+    # The capture node replaces the metadata node even though its number is higher
+    assert index.events == [('add', '/dev/video2'), ('change', '/dev/video3')]
+    assert index.cameras()[0]['path'] == '/dev/video3'
+
+
+def test_capture_node_removed_first(index):
+    feed(index, FakeDevice(0), FakeDevice(1, capabilities=METADATA))
+    feed(index, FakeDevice(0, action='remove'))
+    assert index.events[-1] == ('change', '/dev/video1')
+    feed(index, FakeDevice(1, capabilities=METADATA, action='remove'))
+    assert index.events[-1] == ('remove', '/dev/video1')
+
+
+def test_cameras_keyed_by_id_path(index):
+    feed(index, FakeDevice(0), FakeDevice(2, id_path='platform-xhci-usb-0:2:1.0', model='Brio'))
+    assert [action for action, path in index.events] == ['add', 'add']
+    assert sorted(camera['path'] for camera in index.cameras()) == ['/dev/video0', '/dev/video2']
+
+
+def test_ignored_events(index):
+    feed(index, FakeDevice(0, action='change'), FakeDevice(5, action='remove'))
+    assert index.events == []
+
+
+def test_refresh_prefers_capture_node():
+    index = CameraIndex(FakeContext([FakeDevice(4, capabilities=METADATA), FakeDevice(5)]))
+    index.refresh()
+    assert index.cameras()[0]['path'] == '/dev/video5'
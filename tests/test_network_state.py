@@ -0,0 +1,134 @@
+"""Network state snapshot, D-Bus signal handling and roaming hysteresis."""
+
+import pytest
+
+pytest.importorskip('gi')
+pytest.importorskip('nmcli')
+
+from bondcam.network.state import (ACCESS_POINT_INTERFACE, NM_INTERFACE, ROAM_COOLDOWN, ROAM_HOLD,
+                                   NetworkStateService)
+
+PREFERRED = [{'ssid': 'home', 'password': 'a'}, {'ssid': 'office', 'password': 'b'}]
+
+
+class FakeBackend:
+    """Scripted nmcli: networks in range as ssid -> (signal, rate), and the connected one."""
+
+    def __init__(self, networks, connected):
+        self.networks = networks
+        self.connected = connected
+        self.calls = 0
+
+    def scan_results(self, rescan):
+        self.calls += 1
+        return [(ssid, signal, rate, ssid == self.connected) for ssid, (signal, rate) in self.networks.items()]
+
+    def wifi_interface(self):
+        return ('wlan0', self.connected) if self.connected else (None, None)
+
+
+class FakeVariant:
+    def __init__(self, *values):
+        self.values = values
+
+    def unpack(self):
+        return self.values
+
+
+@pytest.fixture
+def service():
+    backend = FakeBackend({'home': (70, 130), 'office': (40, 130)}, 'home')
+    connects = []
+
+    def connect(ssid, password):
+        connects.append(ssid)
+        backend.connected = ssid
+        return True
+
+    service = NetworkStateService(connect, backend=backend, probe_address=('127.0.0.1', 9))
+    service.connects = connects
+    service.set_preferred(PREFERRED)
+    service.refresh()
+    return service
+
+
+def signal(service, path, interface, changed):
+    service._on_signal(None, None, path, 'org.freedesktop.DBus.Properties', 'PropertiesChanged',
+                       FakeVariant(interface, changed, []))
+
+
+def test_snapshot(service):
+    assert service.connected_network() == 'home'
+    assert service.available_networks() == ['home', 'office']
+
+
+def test_strength_signals_do_not_refresh(service, monkeypatch):
+    monkeypatch.setattr(service, 'access_point_ssid', lambda path: {'/ap/1': 'home', '/ap/2': 'office'}[path])
+    signal(service, '/ap/1', ACCESS_POINT_INTERFACE, {'Strength': 20})
+    signal(service, '/ap/2', ACCESS_POINT_INTERFACE, {'Strength': 80})
+    signal(service, '/ap/2', ACCESS_POINT_INTERFACE, {'LastSeen': 5})
+    assert not service.refresh_requested
+    service.apply_strengths()
+    assert service.backend.calls == 1
+    assert service.snapshot['signal'] == 20
+    assert service.snapshot['networks']['office']['signal'] == 80
+
+    service._on_signal(None, None, '/dev/wlan0', 'org.freedesktop.NetworkManager.Device.Wireless',
+                       'AccessPointRemoved', FakeVariant('/ap/2'))
+    service.apply_strengths()
+    assert '/ap/2' not in service.access_points
+
+
+def test_state_signals_refresh(service):
+    signal(service, '/org/freedesktop/NetworkManager', NM_INTERFACE, {'Connectivity': 4})
+    assert not service.refresh_requested
+    signal(service, '/org/freedesktop/NetworkManager', NM_INTERFACE, {'PrimaryConnection': '/ac/1'})
+    assert service.refresh_requested
+
+
+def test_roams_after_hold(service):
+    service.backend.networks['office'] = (100, 300)
+    service.refresh()
+    service.evaluate(1000)
+    assert service.connects == []
+    service.evaluate(1000 + ROAM_HOLD)
+    assert service.connects == ['office']
+
+
+def test_no_roam_within_margin(service):
+    service.backend.networks['office'] = (75, 130)
+    service.refresh()
+    service.evaluate(1000)
+    service.evaluate(1000 + ROAM_HOLD)
+    assert service.connects == []
+
+
+def test_weak_signal_roams_at_once(service):
+    service.backend.networks.update({'home': (20, 130), 'office': (60, 130)})
+    service.refresh()
+    service.evaluate(1000)
+    assert service.connects == ['office']
+
+
+def test_roam_cooldown(service):
+    service.backend.networks.update({'home': (20, 130), 'office': (60, 130)})
+    service.refresh()
+    service.evaluate(1000)
+    service.backend.networks.update({'home': (90, 130), 'office': (10, 130)})
+    service.refresh()
+    service.evaluate(1001)
+    assert service.connects == ['office']
+    service.evaluate(1000 + ROAM_COOLDOWN)
+    assert service.connects == ['office', 'home']
+
+
+def test_connects_to_preferred_network(service):
+    service.backend.connected = 'cafe'
+    service.backend.networks['cafe'] = (90, 300)
+    service.refresh()
+    service.evaluate(1000)
+    assert service.connects == ['home']
+
+
+def test_rtt_penalty(service):
+    assert service.score('home', 0.5) < service.score('home', 0.05)
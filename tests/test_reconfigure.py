@@ -0,0 +1,71 @@
+"""Streams keep flowing while another stream is added or removed."""
+
+import copy
+import time
+import pytest
+
+gi = pytest.importorskip('gi')
+gi.require_version('Gst', '1.0')
+from gi.repository import GLib, Gst
+
+Gst.init(None)
+if not all(Gst.ElementFactory.find(name) for name in ('videotestsrc', 'x264enc', 'flvmux', 'fakesink')):
+    pytest.skip('stock GStreamer plugins (base, good, ugly) are not installed', allow_module_level=True)
+
+from bondcam.bench.reconfigure import BenchStreamManager, downtime, make_stream
+
+# Seconds the pipeline runs before and after each change
+SETTLE_TIME = 3
+
+# Longest gap allowed in a stream the change does not touch, in ms
+MAX_GAP_MS = 500
+
+
+def run_loop(seconds):
+    loop = GLib.MainLoop()
+    GLib.timeout_add(int(seconds * 1000), loop.quit)
+    loop.run()
+
+
+@pytest.fixture
+def streams():
+    settings = {'isEnabled': True, 'videoStreams': [make_stream(0), make_stream(1)], 'audioDevice': None}
+    manager = BenchStreamManager(lambda: copy.deepcopy(settings), 'software')
+    run_loop(SETTLE_TIME)
+    yield settings, manager
+    if manager.pipeline:
+        manager.pipeline.set_state(Gst.State.NULL)
+
+
+def apply(settings, manager, change):
+    pipeline = manager.pipeline
+    change(settings)
+    changed_at = time.monotonic()
+    manager.check_stream_info()
+    run_loop(SETTLE_TIME)
+    # Only the branches of the changed stream were rebuilt
+    assert manager.pipeline is pipeline
+    return changed_at
+
+
+def assert_flowing(manager, camera_nums, changed_at):
+    for camera_num in camera_nums:
+        gap = downtime(manager.arrivals.get(camera_num, []), changed_at - 0.5, changed_at + SETTLE_TIME)
+        assert gap is not None, f'stream {camera_num} stopped'
+        assert gap < MAX_GAP_MS, f'stream {camera_num} stalled for {gap} ms'
+
+
+def test_add_stream(streams):
+    settings, manager = streams
+    changed_at = apply(settings, manager, lambda settings: settings['videoStreams'].append(make_stream(2)))
+    assert_flowing(manager, (1, 2), changed_at)
+    assert any(arrival > changed_at for arrival in manager.arrivals.get(3, []))
+
+
+def test_remove_stream(streams):
+    settings, manager = streams
+    changed_at = apply(settings, manager, lambda settings: settings['videoStreams'].pop())
+    assert_flowing(manager, (1,), changed_at)
+    removed_at = time.monotonic()
+    run_loop(1)
+    assert not [arrival for arrival in manager.arrivals.get(2, []) if arrival > removed_at]
@@ -0,0 +1,62 @@
+"""Disk quota of the local recordings."""
+
+import os
+import pytest
+
+pytest.importorskip('requests')
+
+from bondcam.streaming import recording
+from bondcam.streaming.recording import RecordingRing
+
+
+def write(directory, name, size):
+    path = os.path.join(directory, name)
+    with open(path, 'wb') as f:
+        f.write(b'\0' * size)
+    return path
+
+
+@pytest.fixture
+def directory(tmp_path):
+    for number in range(3):
+        write(tmp_path, f'{1000 + number}-{number:06d}.mp4', 100)
+    return str(tmp_path)
+
+
+def names(ring):
+    return [os.path.basename(segment.path) for segment in ring.segments]
+
+
+def test_quota_deletes_oldest(directory, monkeypatch):
+    monkeypatch.setattr(recording, 'free_bytes', lambda directory: 10 ** 12)
+    ring = RecordingRing(directory, '.mp4', max_bytes=250, min_free_bytes=0)
+    assert names(ring) == ['1001-000001.mp4', '1002-000002.mp4']
+    assert ring.evictions == 1
+
+
+def test_open_file_counts_towards_quota(directory, monkeypatch):
+    monkeypatch.setattr(recording, 'free_bytes', lambda directory: 10 ** 12)
+    ring = RecordingRing(directory, '.mp4', max_bytes=350, min_free_bytes=0)
+    assert len(ring.segments) == 3
+    location = ring.next_location(3)
+    write(directory, os.path.basename(location), 100)
+    ring.enforce_limits()
+    assert names(ring) == ['1001-000001.mp4', '1002-000002.mp4']
+
+
+def test_unreadable_free_space_deletes_nothing(directory, monkeypatch):
+    def statvfs(path):
+        raise OSError('I/O error')
+
+    monkeypatch.setattr(os, 'statvfs', statvfs)
+    ring = RecordingRing(directory, '.mp4', max_bytes=10 ** 6, min_free_bytes=10 ** 12)
+    assert len(ring.segments) == 3
+    assert ring.evictions == 0
+
+
+def test_low_disk_keeps_newest(directory, monkeypatch):
+    # Someone else filled the disk, deleting recordings does not bring it back above the minimum
+    monkeypatch.setattr(recording, 'free_bytes', lambda directory: 0)
+    ring = RecordingRing(directory, '.mp4', max_bytes=10 ** 6, min_free_bytes=10 ** 9)
+    assert names(ring) == ['1002-000002.mp4']
+    assert os.path.exists(ring.segments[0].path)
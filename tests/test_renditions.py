@@ -0,0 +1,31 @@
+"""Streams sharing a camera capture and encoder."""
+
+from bondcam.streaming.renditions import expand_renditions
+
+
+def stream(camera, backups, bitrate=4000):
+    return {'camera': camera, 'backupCameras': backups,
+            'channel': {'bitrate': bitrate, 'streamEndpoint': 'rtmp://example/live'}}
+
+
+def test_camera_opened_once_whatever_the_backups():
+    flat = expand_renditions([stream('/dev/video0', ['/dev/video2']), stream('/dev/video0', ['/dev/video4'])])
+    assert [s['capture'] for s in flat] == [0, 0]
+    # Different failover sets cannot share a picture
+    assert [s['encode'] for s in flat] == [0, 1]
+    assert flat[0]['captureCameras'] == ['/dev/video0', '/dev/video2', '/dev/video4']
+    assert [s['backupCameras'] for s in flat] == [['/dev/video2'], ['/dev/video4']]
+    assert 'captureCameras' not in flat[1]
+
+
+def test_same_backups_share_encoder():
+    flat = expand_renditions([stream('/dev/video0', [None, '/dev/video2']), stream('/dev/video0', [None, '/dev/video2'])])
+    assert [s['encode'] for s in flat] == [0, 0]
+    # Disconnected backups keep their place in the stream's own list only
+    assert flat[0]['captureCameras'] == ['/dev/video0', None, '/dev/video2']
+
+
+def test_camera_without_device_not_shared():
+    flat = expand_renditions([stream(None, ['/dev/video2']), stream(None, ['/dev/video2'])])
+    assert [s['capture'] for s in flat] == [0, 1]
+    assert 'captureCameras' not in flat[0]
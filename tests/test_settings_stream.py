@@ -0,0 +1,82 @@
+"""Settings pushed by a local server-sent events stand-in reach the main loop right away."""
+
+import json
+import threading
+import time
+import pytest
+
+pytest.importorskip('gi')
+pytest.importorskip('requests')
+
+from http.server import ThreadingHTTPServer
+from gi.repository import GLib
+from bondcam.api.client import SettingsStream
+from bondcam.bench.settings_push import EventStreamHandler
+from bondcam.utils.backoff import Backoff
+
+# Most time a pushed event may take to reach the main loop, in seconds
+MAX_LATENCY = 0.5
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), EventStreamHandler)
+    server.clients = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.url = f'http://127.0.0.1:{server.server_address[1]}/devices/stream'
+    yield server
+    server.shutdown()
+
+
+def run_until(condition, timeout):
+    # Run the main loop until condition() holds, False on timeout
+    context = GLib.MainContext.default()
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        context.iteration(False)
+        time.sleep(0.005)
+    return True
+
+
+def push(server, event_id, bitrate):
+    # Well under the 512 bytes requests reads by default
+    device = {'streamSettings': {'videoStreams': [{'channel': {'bitrate': bitrate}}]}}
+    for client in list(server.clients):
+        client.put(f'id: {event_id}\ndata: {json.dumps({"data": device})}\n\n')
+
+
+def test_small_events_arrive_one_by_one(server):
+    received = []
+    stream = SettingsStream('test', lambda device: received.append(time.monotonic()), url=server.url)
+    stream.start()
+    try:
+        assert run_until(lambda: server.clients and stream.connected, 5)
+        for event_id in range(5):
+            pushed_at = time.monotonic()
+            push(server, event_id, 1000 + event_id)
+            assert run_until(lambda: len(received) == event_id + 1, MAX_LATENCY), f'event {event_id} held back'
+            assert received[-1] - pushed_at < MAX_LATENCY
+        assert stream.last_event_id == '4'
+    finally:
+        stream.stop()
+
+
+def test_reconnects_after_drop(server):
+    states = []
+    devices = []
+    stream = SettingsStream('test', devices.append, states.append, url=server.url)
+    stream.backoff = Backoff(initial=0.1, maximum=0.5)
+    stream.start()
+    try:
+        assert run_until(lambda: server.clients and states == [True], 5)
+        for client in list(server.clients):
+            client.put(None)
+        assert run_until(lambda: states[-1] is False, 5)
+        assert run_until(lambda: server.clients and states[-1] is True, 5)
+        push(server, 7, 2000)
+        assert run_until(lambda: devices, MAX_LATENCY)
+        assert devices[0]['streamSettings']['videoStreams'][0]['channel']['bitrate'] == 2000
+    finally:
+        stream.stop()
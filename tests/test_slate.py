@@ -0,0 +1,31 @@
+"""Slates that cannot be decoded fail fast."""
+
+import time
+import pytest
+
+gi = pytest.importorskip('gi')
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+Gst.init(None)
+if not all(Gst.ElementFactory.find(name) for name in ('filesrc', 'decodebin', 'appsink')):
+    pytest.skip('stock GStreamer plugins (base) are not installed', allow_module_level=True)
+
+from bondcam.streaming import slate
+from bondcam.streaming.slate import SLATE_DECODE_TIMEOUT, decode_slate
+
+
+def test_missing_slate(tmp_path):
+    assert decode_slate(str(tmp_path / 'missing.png'), 320, 240, 30) == []
+
+
+def test_undecodable_slate(tmp_path, monkeypatch):
+    path = tmp_path / 'slate.png'
+    path.write_bytes(b'not an image' * 100)
+    started = time.monotonic()
+    assert decode_slate(str(path), 320, 240, 30) == []
+    assert time.monotonic() - started < SLATE_DECODE_TIMEOUT / 2
+
+    # The failure is remembered until the file changes
+    monkeypatch.setattr(slate.Gst, 'parse_launch', None)
+    assert decode_slate(str(path), 320, 240, 30) == []
@@ -0,0 +1,35 @@
+"""Telemetry samples of a running pipeline."""
+
+import pytest
+
+gi = pytest.importorskip('gi')
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+Gst.init(None)
+if not all(Gst.ElementFactory.find(name) for name in ('videotestsrc', 'fakesink')):
+    pytest.skip('stock GStreamer plugins (base) are not installed', allow_module_level=True)
+
+from bondcam.streaming.telemetry import PipelineTelemetry
+
+
+@pytest.fixture
+def pipeline():
+    pipeline = Gst.parse_launch('videotestsrc is-live=true ! queue name=q ! fakesink name=out sync=true')
+    pipeline.set_state(Gst.State.PLAYING)
+    pipeline.get_state(5 * Gst.SECOND)
+    yield pipeline
+    pipeline.set_state(Gst.State.NULL)
+
+
+def test_sample_running_pipeline(pipeline):
+    telemetry = PipelineTelemetry()
+    telemetry.watch_stream(1, pipeline.get_by_name('out').get_static_pad('sink'))
+    sinks = {1: pipeline.get_by_name('out')}
+    # The latency query succeeds on a running pipeline
+    assert pipeline.query(Gst.Query.new_latency())
+    telemetry.sample(pipeline, sinks)
+    telemetry.sample(pipeline, sinks)
+    assert ('bondcam_pipeline_latency_seconds', ()) in telemetry.snapshot
+    assert ('bondcam_queue_level_seconds', (('queue', 'q'),)) in telemetry.rings
+    assert ('bondcam_stream_fps', (('stream', '1'),)) in telemetry.rings
@@ -0,0 +1,26 @@
+"""Output graphs of the SRT and RIST transports."""
+
+import pytest
+
+gi = pytest.importorskip('gi')
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+Gst.init(None)
+
+from bondcam.streaming.manager import StreamManager
+
+
+@pytest.fixture
+def manager():
+    return StreamManager('Test', lambda: {'isEnabled': False}, 'software')
+
+
+def test_rist_output_graph(manager):
+    if not all(Gst.ElementFactory.find(name) for name in ('mpegtsmux', 'rtpmp2tpay', 'ristsink')):
+        pytest.skip('ristsink (plugins-bad) is not installed')
+    output_bin = manager.output_graph(1, {'streamEndpoint': 'rist://127.0.0.1:5004'})
+    sink = output_bin.get_by_name(f'rtmpsink1{manager.label}')
+    assert sink.get_factory().get_name() == 'ristsink'
+    assert sink.get_property('address') == '127.0.0.1'
+    assert sink.get_property('port') == 5004